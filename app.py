@@ -3,14 +3,31 @@
 JY图书管理系统 - Flask主应用
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for, flash, send_file
-from models.db import BookDB, DatabaseError
+from flask import Flask, Response, g, render_template, request, jsonify, redirect, url_for, flash, stream_with_context
+from models.aio import AsyncBookDB
+from models.db import FILTER_OPTION_FIELDS, BookDB, DatabaseError, InvalidCursorError, InvalidWatermarkError
+from models.export import FORMATS as EXPORT_FORMATS, export_stream
+from models.csv_import import SNIFF_SIZE, ImportErrors, detect_encoding, iter_books, open_csv
+from jobs import JobManager, JobQueueFullError
+from profiler import ProfilerBusyError, SamplingProfiler
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, DEFAULT_BUCKETS, MetricsRegistry, count_rows, instrument_methods
+import click
+import hmac
 import json
 import csv
+import hashlib
 import io
+import itertools
+import math
+import shutil
+import tempfile
+import time
 from datetime import datetime
 from werkzeug.utils import secure_filename
 import os
+import urllib.error
+import urllib.parse
+import urllib.request
 
 app = Flask(__name__)
 app.secret_key = 'jy_book_manager_secret_key_2024'  # 用于flash消息
@@ -19,16 +36,209 @@ app.config['JSON_AS_ASCII'] = False  # 确保JSON支持中文
 # 初始化数据库操作对象
 db = BookDB()
 
+# 采样分析（管理员按需开启，见 /api/admin/profile 和 flask profile）
+_profiler_config = db.config.get('profiler', {})
+profiler = SamplingProfiler(
+    interval=_profiler_config.get('interval', 0.01),
+    max_seconds=_profiler_config.get('max_seconds', 60)
+)
+
+# 统计、分页、相关图书接口中彼此独立的查询在有界线程池中并发执行（见 AsyncBookDB.call）
+adb = AsyncBookDB(db, max_workers=db.config.get('async', {}).get('db_workers'), profiler=profiler)
+
+# 进程状态（/healthz）：预热耗时由 server.py 在工作进程启动后填入，draining 为 True 时负载均衡应停止转发
+process_status = {'started_at': time.time(), 'warm_up': None, 'draining': False}
+
+# 首页服务端渲染的每页图书数（与页面“每页显示”的默认值一致）
+INDEX_PER_PAGE = 12
+
+# CSV导入后台任务
+_import_config = db.config.get('import', {})
+import_jobs = JobManager(
+    workers=_import_config.get('workers', 2),
+    max_queued=_import_config.get('max_queued', 8),
+    retention=_import_config.get('job_retention', 3600)
+)
+
+
+def enable_shared_state(directory):
+    """
+    多进程部署：写入通知和导入任务状态通过共享目录在进程间传递
+    
+    各进程的内存索引、统计聚合和缓存随其他进程的写入更新，导入任务可由任意进程查询和取消。
+    应在构建内存索引前调用（server.py 在主进程预热前调用；uvicorn --workers 需配置 serving.state_dir）。
+    """
+    db.enable_change_feed(os.path.join(directory, 'changes'))
+    import_jobs.enable_store(os.path.join(directory, 'jobs'))
+
+
+if db.config.get('serving', {}).get('state_dir'):
+    enable_shared_state(db.config['serving']['state_dir'])
+
+# 指标（/metrics，Prometheus 文本格式）
+_metrics_config = db.config.get('metrics', {})
+metrics = MetricsRegistry()
+_buckets = _metrics_config.get('buckets') or DEFAULT_BUCKETS
+http_requests = metrics.counter('jy_http_requests_total', 'HTTP 请求数', ('route', 'method', 'status'))
+http_duration = metrics.histogram('jy_http_request_duration_seconds', 'HTTP 请求处理耗时（秒，流式响应不含响应体）',
+                                  ('route', 'method'), _buckets)
+db_duration = metrics.histogram('jy_db_method_duration_seconds', 'BookDB 方法耗时（秒）', ('method',), _buckets)
+db_errors = metrics.counter('jy_db_errors_total', 'BookDB 方法抛出 DatabaseError 的次数（按错误类别）', ('method', 'error'))
+import_rows = metrics.counter('jy_import_rows_total', 'CSV 导入处理的行数', ('result',))
+export_rows = metrics.counter('jy_export_rows_total', '导出的行数', ('format',))
+if _metrics_config.get('enabled', True):
+    instrument_methods(db, db_duration, db_errors, DatabaseError,
+                       exclude=('add_write_listener', 'get_pool_status', 'get_replica_status',
+                                'get_cache_status', 'get_query_status', 'enable_change_feed', 'sync_changes'))
+
+
+def _pool_gauges():
+    pools = {'primary': db.get_pool_status()}
+    for replica in (db.get_replica_status() or {}).get('replicas', []):
+        pools[replica['name']] = replica['pool']
+    return pools
+
+
+def _cache_gauges():
+    return {name: stats for name, stats in db.get_cache_status().items() if 'hits' in stats}
+
+
+metrics.gauge('jy_db_pool_connections', '连接池中的连接数', ('pool', 'state'), lambda: {
+    (pool, state): stats[state] for pool, stats in _pool_gauges().items() for state in ('in_use', 'idle', 'max_size')
+})
+metrics.gauge('jy_db_pool_events_total', '连接池累计事件数', ('pool', 'event'), lambda: {
+    (pool, event): stats[event] for pool, stats in _pool_gauges().items()
+    for event in ('creates', 'checkouts', 'waits', 'timeouts', 'recycled', 'discarded', 'health_check_failures')
+}, type='counter')
+metrics.gauge('jy_db_pool_wait_seconds_total', '借出连接累计等待时间（秒）', ('pool',), lambda: {
+    (pool,): stats['wait_time'] for pool, stats in _pool_gauges().items()
+}, type='counter')
+metrics.gauge('jy_replica_healthy', '只读副本是否可用（1 可用，0 暂停使用）', ('replica',), lambda: {
+    (replica['name'],): int(replica['healthy']) for replica in (db.get_replica_status() or {}).get('replicas', [])
+})
+metrics.gauge('jy_cache_requests_total', '缓存命中/未命中次数', ('cache', 'result'), lambda: {
+    (cache, result): stats[result] for cache, stats in _cache_gauges().items() for result in ('hits', 'misses')
+}, type='counter')
+metrics.gauge('jy_cache_entries', '缓存的条目数', ('cache',), lambda: {
+    (cache,): stats.get('size', stats.get('statements')) for cache, stats in _cache_gauges().items()
+})
+metrics.gauge('jy_db_slow_queries_total', '慢查询次数', (), lambda: {
+    (): db.get_query_status(limit=0)['slow_queries']
+}, type='counter')
+metrics.gauge('jy_import_jobs', '本进程各状态的导入任务数', ('status',), lambda: {
+    (status,): count for status, count in import_jobs.stats().items()
+})
+# 指标按进程统计：多进程部署时每次抓取由其中一个工作进程响应，以 pid 区分
+metrics.gauge('jy_process_info', '响应本次抓取的进程（值恒为 1）', ('pid',), lambda: {
+    (str(os.getpid()),): 1
+})
+metrics.gauge('jy_change_feed_events_total', '跨进程写入通知的发布/接收数', ('direction',), lambda: {
+    (direction,): db.change_feed.stats()[direction] for direction in ('published', 'received')
+} if db.change_feed is not None else {}, type='counter')
+
+# 读到自己的写入：记录写入后读取主库截止时间的 Cookie
+PRIMARY_COOKIE = 'db_primary_until'
+
+
+@app.before_request
+def sync_changes():
+    """多进程部署时先应用其他进程提交的写入，本进程的索引和缓存不返回过期数据"""
+    db.sync_changes()
+
+
+@app.before_request
+def begin_query_stats():
+    """开始统计本次请求的数据库访问"""
+    g.query_started = time.perf_counter()
+    g.query_token = db.instrumentation.begin()
+
+
+@app.after_request
+def record_request_metrics(response):
+    """按路由记录请求数和耗时（路由取 URL 规则，如 /api/books/<book_id>，避免标签随参数增长）"""
+    if 'query_started' in g and _metrics_config.get('enabled', True):
+        route = request.url_rule.rule if request.url_rule is not None else '(unmatched)'
+        http_requests.inc(route, request.method, response.status_code)
+        http_duration.observe(time.perf_counter() - g.query_started, route, request.method)
+    return response
+
+
+@app.after_request
+def add_server_timing(response):
+    """通过 Server-Timing 响应头返回本次请求的连接数、语句数和数据库耗时（流式响应只含首批数据之前的部分）"""
+    stats = db.instrumentation.current()
+    if stats is not None and 'query_started' in g:
+        response.headers.add('Server-Timing', stats.server_timing(time.perf_counter() - g.query_started))
+    return response
+
+
+@app.before_request
+def mark_profiler_activity():
+    """标记本线程正在处理的路由，供采样分析归类调用栈并统计 CPU / 等待时间"""
+    route = request.url_rule.rule if request.url_rule is not None else '(unmatched)'
+    g.profiler_token = profiler.enter(f'{request.method} {route}')
+
+
+@app.teardown_request
+def clear_profiler_activity(exc):
+    token = g.pop('profiler_token', None)
+    if token is not None:
+        profiler.leave(token)
+
+
+@app.teardown_request
+def end_query_stats(exc):
+    token = g.pop('query_token', None)
+    if token is not None:
+        db.instrumentation.end(token)
+
+
+@app.before_request
+def pin_primary_after_write():
+    """本客户端最近写入过时，本次请求的读取继续走主库（只读副本可能尚未同步）"""
+    if db.router is None:
+        return
+    try:
+        until = float(request.cookies.get(PRIMARY_COOKIE, 0))
+    except ValueError:
+        until = 0.0
+    g.primary_token = db.router.pin_primary(until)
+
+
+@app.after_request
+def remember_write(response):
+    """本次请求发生写入时，通过 Cookie 告知后续请求在截止时间前读取主库"""
+    if db.router is not None:
+        until = db.router.primary_until()
+        try:
+            previous = float(request.cookies.get(PRIMARY_COOKIE, 0))
+        except ValueError:
+            previous = 0.0
+        if until > previous:
+            response.set_cookie(
+                PRIMARY_COOKIE, f'{until:.3f}', max_age=math.ceil(db.router.read_your_writes),
+                httponly=True, samesite='Lax'
+            )
+    return response
+
+
+@app.teardown_request
+def unpin_primary(exc):
+    token = g.pop('primary_token', None)
+    if token is not None:
+        db.router.reset(token)
+
 
 @app.route('/')
 def index():
-    """首页 - 显示所有图书列表"""
+    """首页 - 服务端渲染第一页图书，同时内嵌为JSON供前端直接使用"""
     try:
-        books = db.get_all_books()
-        return render_template('index.html', books=books)
+        result = db.get_books_page(1, INDEX_PER_PAGE, '', 'book_id', 'ASC')
+        initial_data = {'books': result['books'], 'pagination': _build_pagination(result, None)}
+        return render_template('index.html', books=result['books'], initial_data=initial_data)
     except DatabaseError as e:
         flash(f'加载图书列表失败: {str(e)}', 'error')
-        return render_template('index.html', books=[])
+        return render_template('index.html', books=[], initial_data=None)
 
 
 @app.route('/api/books', methods=['GET'])
@@ -146,54 +356,208 @@ def api_delete_book(book_id):
 
 @app.route('/api/statistics', methods=['GET'])
 def api_statistics():
-    """API: 获取统计数据"""
+    """API: 获取统计数据（未命中缓存时两条统计查询并发执行）"""
     try:
-        stats = db.get_statistics()
-        return jsonify({'success': True, 'data': stats})
+        stats = adb.call('get_statistics')
+        return _conditional_json({'success': True, 'data': stats})
     except DatabaseError as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+@app.route('/api/cache/status', methods=['GET'])
+def api_cache_status():
+    """API: 获取缓存命中/未命中等指标"""
+    return jsonify({'success': True, 'data': db.get_cache_status()})
+
+
+@app.route('/api/queries/status', methods=['GET'])
+def api_query_status():
+    """
+    API: 按语句汇总的执行次数、耗时和慢查询次数（limit 为返回的语句数；按进程统计，pid 为响应的进程）
+    
+    语句文本暴露表结构和访问模式，需要管理令牌（X-Admin-Token）。
+    """
+    denied = _check_admin_token('语句统计')
+    if denied:
+        return denied
+    limit = request.args.get('limit', 20, type=int)
+    data = db.get_query_status(limit)
+    data['pid'] = os.getpid()
+    return jsonify({'success': True, 'data': data})
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus 指标（本进程的计数，多进程部署时见 jy_process_info 的 pid）"""
+    if not _metrics_config.get('enabled', True):
+        return jsonify({'success': False, 'message': '指标未开启'}), 404
+    if _metrics_config.get('require_token', True):
+        denied = _check_admin_token('指标')
+        if denied:
+            return denied
+    return Response(metrics.expose(), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    """健康检查：不访问数据库，给出进程号、运行时长、预热耗时和连接池状态；关闭前的排空期间返回 503"""
+    data = {
+        'pid': os.getpid(),
+        'uptime': round(time.time() - process_status['started_at'], 3),
+        'warm_up': process_status['warm_up'],
+        'draining': process_status['draining'],
+        'pool': db.get_pool_status(),
+    }
+    return jsonify({'success': not process_status['draining'], 'data': data}), 503 if process_status['draining'] else 200
+
+
+def _admin_token():
+    return _profiler_config.get('token') or os.environ.get('JY_ADMIN_TOKEN')
+
+
+def _check_admin_token(feature):
+    """
+    校验管理令牌，不通过时返回错误响应，通过时返回 None
+    
+    令牌放在请求头 X-Admin-Token 中，或 Authorization: Bearer <令牌>（Prometheus 抓取配置的 authorization）；
+    未配置令牌（profiler.token 或环境变量 JY_ADMIN_TOKEN）时 feature 不可用。
+    """
+    token = _admin_token()
+    if not token:
+        return jsonify({'success': False, 'message': f'未配置管理令牌，{feature}不可用'}), 404
+    provided = request.headers.get('X-Admin-Token', '')
+    if not provided:
+        scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'bearer':
+            provided = credentials.strip()
+    # WSGI 请求头按 latin-1 解码，还原为原始字节后与令牌的 UTF-8 编码比较
+    provided = provided.encode('latin-1')
+    if not hmac.compare_digest(provided, token.encode('utf-8')):
+        return jsonify({'success': False, 'message': '管理令牌无效'}), 403
+    return None
+
+
+@app.route('/api/admin/profile', methods=['POST'])
+def api_admin_profile():
+    """
+    API: 采样分析 seconds 秒（默认 10，不超过 profiler.max_seconds）后返回结果
+    
+    需要在请求头 X-Admin-Token 中提供 profiler.token（或环境变量 JY_ADMIN_TOKEN），未配置令牌时不可用。
+    format=collapsed 返回折叠栈文本（火焰图输入），否则返回各路由的 CPU / 等待时间和最热的调用栈。
+    """
+    denied = _check_admin_token('采样分析')
+    if denied:
+        return denied
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = request.args.get('interval', type=float)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'seconds 参数格式错误'}), 400
+    if seconds <= 0:
+        return jsonify({'success': False, 'message': 'seconds 必须大于 0'}), 400
+    # 本请求只是在等待采样结束，不计入结果
+    clear_profiler_activity(None)
+    try:
+        session = profiler.run(seconds, interval)
+    except ProfilerBusyError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
+    if request.args.get('format') == 'collapsed':
+        return Response(session.collapsed(), mimetype='text/plain')
+    return jsonify({'success': True, 'data': session.report(top=request.args.get('top', 20, type=int))})
+
+
+@app.route('/api/replicas/status', methods=['GET'])
+def api_replica_status():
+    """API: 获取只读副本的健康状态和读取次数（未配置副本时 data 为 null）"""
+    return jsonify({'success': True, 'data': db.get_replica_status()})
+
+
+@app.route('/api/statistics/reconcile', methods=['GET', 'POST'])
+def api_statistics_reconcile():
+    """API: 增量统计对账（GET 返回最近一次报告，POST 立即对账，需要管理令牌）"""
+    if request.method == 'POST':
+        # 对账扫描全表，不允许匿名触发
+        denied = _check_admin_token('立即对账')
+        if denied:
+            return denied
+    try:
+        if request.method == 'POST':
+            report = db.reconcile_statistics()
+        else:
+            report = db.get_statistics_drift()
+        return jsonify({'success': True, 'data': report})
+    except DatabaseError as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+def _conditional_json(payload):
+    """
+    返回带 ETag 的JSON响应
+    
+    ETag 由内容计算，多进程部署下同样的数据得到同样的 ETag；
+    Cache-Control: no-cache 要求浏览器每次校验，数据未变化时返回 304 而不重传内容。
+    """
+    body = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(hashlib.md5(body.encode('utf-8')).hexdigest())
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+
 @app.route('/api/books/paginated', methods=['GET'])
 def api_get_books_paginated():
-    """API: 分页获取图书"""
+    """API: 分页获取图书（键集分页需要总数时，当前页和计数并发查询）"""
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
         search = request.args.get('search', '').strip()
         sort_by = request.args.get('sort_by', 'book_id')
         sort_order = request.args.get('sort_order', 'ASC')
+        # 传入游标时使用键集分页（深度翻页耗时不随页码增长），否则使用页码分页
+        cursor = request.args.get('cursor', '').strip() or None
+        with_total = request.args.get('with_total', '0').lower() in ('1', 'true')
         
-        # 获取总数
-        total = db.get_books_count()
-        if search:
-            # 如果有搜索条件，需要重新计算总数
-            search_books = db.search_books(search)
-            total = len(search_books)
-        
-        # 获取分页数据
-        books = db.get_books_paginated(
+        # 一次查询同时获取当前页数据和总数
+        result = adb.call(
+            'get_books_page',
             page=page,
             per_page=per_page,
             search=search if search else None,
             sort_by=sort_by,
-            sort_order=sort_order
+            sort_order=sort_order,
+            cursor=cursor,
+            with_total=with_total
         )
         
         return jsonify({
             'success': True,
-            'data': books,
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': total,
-                'pages': (total + per_page - 1) // per_page if total > 0 else 0
-            }
+            'data': result['books'],
+            'pagination': _build_pagination(result, cursor)
         })
+    except InvalidCursorError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except DatabaseError as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
+def _build_pagination(result, cursor):
+    """构建分页信息；键集分页模式下 page/pages 为 None，total 仅在请求计数时返回"""
+    per_page = result['per_page']
+    total = result['total']
+    pages = None
+    if total is not None:
+        pages = (total + per_page - 1) // per_page if total > 0 else 0
+    return {
+        'mode': 'cursor' if cursor else 'offset',
+        'page': result['page'],
+        'per_page': per_page,
+        'total': total,
+        'pages': pages,
+        'next_cursor': result['next_cursor'],
+        'prev_cursor': result['prev_cursor']
+    }
+
+
 @app.route('/api/books/batch', methods=['DELETE'])
 def api_delete_books_batch():
     """API: 批量删除图书"""
@@ -218,41 +582,65 @@ def api_delete_books_batch():
 
 @app.route('/api/export/csv', methods=['GET'])
 def api_export_csv():
-    """API: 导出CSV"""
+    """API: 导出CSV（边查询边输出，内存占用与图书数量无关）"""
+    return _export_response({}, 'csv', compress=False, since=None)
+
+
+@app.route('/api/export', methods=['GET'])
+def api_export():
+    """
+    API: 导出图书
+    
+    参数：format（csv / jsonl / columnar）、gzip=1 压缩、since 增量水位，
+    以及与高级筛选相同的条件 price_min、price_max、borrow_min、borrow_max、
+    publisher、author、field + keyword。响应头 X-Export-Watermark 为下次增量导出的 since。
+    """
+    filters = {}
     try:
-        books = db.get_all_books()
-        
-        # 创建CSV内容
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # 写入表头
-        writer.writerow(['图书ID', '图书名称', 'ISBN', '作者', '出版社', '价格', '借阅次数'])
-        
-        # 写入数据
-        for book in books:
-            writer.writerow([
-                book['book_id'],
-                book['book_name'],
-                book['book_isbn'],
-                book['book_author'],
-                book['book_publisher'],
-                book['book_price'],
-                book['interview_times']
-            ])
-        
-        # 创建响应
-        output.seek(0)
-        filename = f'books_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-        
-        return send_file(
-            io.BytesIO(output.getvalue().encode('utf-8-sig')),
-            mimetype='text/csv',
-            as_attachment=True,
-            download_name=filename
-        )
+        for name, convert in (('price_min', float), ('price_max', float),
+                              ('borrow_min', int), ('borrow_max', int)):
+            if request.args.get(name, '').strip():
+                filters[name] = convert(request.args[name])
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'筛选参数格式错误: {str(e)}'}), 400
+    for name in ('publisher', 'author'):
+        if request.args.get(name):
+            filters[name] = request.args[name]
+    if request.args.get('field') and request.args.get('keyword'):
+        filters['field_search'] = {'field': request.args['field'], 'keyword': request.args['keyword']}
+    
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'message': f'不支持的导出格式: {fmt}'}), 400
+    compress = request.args.get('gzip', '').lower() in ('1', 'true', 'yes')
+    return _export_response(filters, fmt, compress, request.args.get('since') or None)
+
+
+def _export_response(filters, fmt, compress, since):
+    """流式导出响应：先取第一批，查询出错时还能返回错误信息而不是中断的文件"""
+    try:
+        watermark = db.get_export_watermark()
+        batches = db.iter_books(filters=filters, since=since, until=watermark if since else None)
+        first = next(batches, [])
+    except InvalidWatermarkError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except DatabaseError as e:
         return jsonify({'success': False, 'message': str(e)}), 500
+    
+    rows = count_rows(itertools.chain([first], batches), export_rows, fmt)
+    chunks, mimetype, extension = export_stream(rows, fmt, compress)
+    
+    def generate():
+        try:
+            yield from chunks
+        finally:
+            batches.close()
+    
+    filename = f'books_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+    headers = {'Content-Disposition': f'attachment; filename={filename}'}
+    if watermark:
+        headers['X-Export-Watermark'] = watermark
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers=headers)
 
 
 @app.route('/book/new')
@@ -295,9 +683,9 @@ def book_detail(book_id):
 
 @app.route('/api/books/<book_id>/related', methods=['GET'])
 def api_get_related_books(book_id):
-    """API: 获取相关图书"""
+    """API: 获取相关图书（未启用相关图书索引时同作者、同出版社并发查询）"""
     try:
-        related_books = db.get_related_books(book_id, limit=5)
+        related_books = adb.call('get_related_books', book_id, limit=5)
         return jsonify({'success': True, 'data': related_books})
     except DatabaseError as e:
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -305,10 +693,27 @@ def api_get_related_books(book_id):
 
 @app.route('/api/filter/options', methods=['GET'])
 def api_get_filter_options():
-    """API: 获取筛选选项"""
+    """API: 获取筛选选项（limit 限制每个字段的数量，counts=1 返回图书数量；带 ETag）"""
     try:
-        options = db.get_filter_options()
-        return jsonify({'success': True, 'data': options})
+        limit = request.args.get('limit', type=int)
+        with_counts = request.args.get('counts', '').lower() in ('1', 'true', 'yes')
+        options = db.get_filter_options(limit=limit, with_counts=with_counts)
+        return _conditional_json({'success': True, 'data': options})
+    except DatabaseError as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+
+@app.route('/api/filter/suggest', methods=['GET'])
+def api_suggest_filter_values():
+    """API: 筛选选项联想（field 为 publisher 或 author，q 为前缀）"""
+    field = request.args.get('field', '')
+    if field not in FILTER_OPTION_FIELDS:
+        return jsonify({'success': False, 'message': f'不支持联想的字段: {field}'}), 400
+    prefix = request.args.get('q', '').strip()
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    try:
+        values = db.suggest_filter_values(field, prefix, limit=limit) if prefix else []
+        return jsonify({'success': True, 'data': values})
     except DatabaseError as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -330,32 +735,34 @@ def api_filter_books():
             per_page = 12
         sort_by = data.get('sort_by', 'book_id')
         sort_order = data.get('sort_order', 'ASC')
+        cursor = data.get('cursor') or None
+        with_total = bool(data.get('with_total', False))
         
         result = db.get_books_advanced_filter(
             filters=filters,
             page=page,
             per_page=per_page,
             sort_by=sort_by,
-            sort_order=sort_order
+            sort_order=sort_order,
+            cursor=cursor,
+            with_total=with_total
         )
         
         return jsonify({
             'success': True,
             'data': result['books'],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': result['total'],
-                'pages': (result['total'] + per_page - 1) // per_page if result['total'] > 0 else 0
-            }
+            'pagination': _build_pagination(result, cursor)
         })
+    except InvalidCursorError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except DatabaseError as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
 
 @app.route('/api/import/csv', methods=['POST'])
 def api_import_csv():
-    """API: 导入CSV文件"""
+    """API: 导入CSV文件（后台执行，立即返回任务ID）"""
+    upload = None
     try:
         if 'file' not in request.files:
             return jsonify({'success': False, 'message': '没有上传文件'}), 400
@@ -367,106 +774,218 @@ def api_import_csv():
         if not file.filename.endswith('.csv'):
             return jsonify({'success': False, 'message': '只支持CSV文件'}), 400
         
-        # 读取文件内容（二进制）
+        # 请求结束后上传流即被关闭，先转存到临时文件再交给后台任务
+        upload = tempfile.TemporaryFile()
         file.stream.seek(0)
-        file_content = file.stream.read()
+        shutil.copyfileobj(file.stream, upload)
+        upload.seek(0)
         
-        # 尝试多种编码方式读取CSV文件
-        encodings = ['utf-8-sig', 'utf-8', 'gbk', 'gb2312', 'gb18030']
-        reader = None
-        used_encoding = None
-        
-        for encoding in encodings:
-            try:
-                # 使用BytesIO重新创建流，避免文件流被消耗
-                stream = io.TextIOWrapper(io.BytesIO(file_content), encoding=encoding)
-                test_reader = csv.DictReader(stream)
-                
-                # 尝试读取表头来验证编码是否正确
-                try:
-                    headers = test_reader.fieldnames
-                    if headers:
-                        # 验证是否能正确读取中文列名或英文列名
-                        header_str = ','.join(headers)
-                        if '图书ID' in header_str or 'book_id' in header_str:
-                            # 编码正确，重新创建reader（从头开始）
-                            stream.close()
-                            stream = io.TextIOWrapper(io.BytesIO(file_content), encoding=encoding)
-                            reader = csv.DictReader(stream)
-                            used_encoding = encoding
-                            break
-                except Exception:
-                    pass
-                
-                stream.close()
-            except (UnicodeDecodeError, UnicodeError):
-                try:
-                    stream.close()
-                except:
-                    pass
-                continue
-            except Exception as e:
-                try:
-                    stream.close()
-                except:
-                    pass
-                continue
-        
-        if reader is None:
+        # 编码无法识别时直接返回错误，不创建任务
+        if detect_encoding(upload.read(SNIFF_SIZE)) is None:
             return jsonify({'success': False, 'message': '无法识别CSV文件编码，请确保文件为UTF-8或GBK编码'}), 400
+        upload.seek(0)
         
-        books_data = []
-        errors = []
-        
-        try:
-            # 解析CSV数据
-            for idx, row in enumerate(reader, 2):  # 从第2行开始（第1行是表头）
-                try:
-                    # 映射CSV列名到数据库字段
-                    book_data = {
-                        'book_id': row.get('图书ID', row.get('book_id', '')).strip(),
-                        'book_name': row.get('图书名称', row.get('book_name', '')).strip(),
-                        'book_isbn': row.get('ISBN', row.get('book_isbn', '')).strip(),
-                        'book_author': row.get('作者', row.get('book_author', '')).strip(),
-                        'book_publisher': row.get('出版社', row.get('book_publisher', '')).strip(),
-                        'book_price': float(row.get('价格', row.get('book_price', 0))),
-                        'interview_times': int(row.get('借阅次数', row.get('interview_times', 0)))
-                    }
-                    
-                    # 验证必填字段
-                    if not book_data['book_id'] or not book_data['book_name']:
-                        errors.append(f"第{idx}行: 图书ID或图书名称为空")
-                        continue
-                    
-                    books_data.append(book_data)
-                except (ValueError, KeyError) as e:
-                    errors.append(f"第{idx}行: 数据格式错误 - {str(e)}")
-        finally:
-            # 确保流被关闭
-            try:
-                if reader and hasattr(reader, 'close'):
-                    reader.close()
-            except:
-                pass
-        
-        if not books_data:
-            return jsonify({
-                'success': False,
-                'message': '没有有效数据',
-                'errors': errors
-            }), 400
-        
-        # 批量导入
-        result = db.import_books_from_data(books_data)
-        result['errors'] = errors + result['errors']
-        
+        job = import_jobs.submit('import_csv', _run_import_job, upload)
+        upload = None
         return jsonify({
             'success': True,
-            'message': f'成功导入 {result["success_count"]} 本图书',
-            'data': result
-        })
+            'message': '导入任务已提交',
+            'data': job.to_dict()
+        }), 202
+    except JobQueueFullError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
     except Exception as e:
         return jsonify({'success': False, 'message': f'导入失败: {str(e)}'}), 500
+    finally:
+        if upload is not None:
+            upload.close()
+
+
+def _run_import_job(job, upload):
+    """后台执行CSV导入：边解析边分批写入，每批提交后更新任务进度"""
+    with profiler.activity('job import_csv'):
+        return _import_csv(job, upload)
+
+
+def _import_csv(job, upload):
+    try:
+        text_stream, encoding = open_csv(upload)
+        errors = ImportErrors(db.config.get('import', {}).get('max_errors', 1000))
+        job.update(encoding=encoding, rows_parsed=0, inserted=0, failed=0, rows_per_second=None)
+        counted = {'success': 0, 'failed': 0}
+        
+        def report(result):
+            # 进度为累计值，指标按增量累加
+            for name, total in (('success', result['success_count']),
+                                ('failed', result['error_count'] + errors.count)):
+                if total > counted[name]:
+                    import_rows.inc(name, amount=total - counted[name])
+                    counted[name] = total
+            job.update(
+                rows_parsed=result['total_rows'] + errors.count,
+                inserted=result['success_count'],
+                failed=result['error_count'] + errors.count,
+                rows_per_second=result['rows_per_second']
+            )
+        
+        result = db.import_books_from_data(
+            iter_books(text_stream, errors),
+            numbered=True,
+            progress=report,
+            cancel_event=job.cancel_event
+        )
+        report(result)
+        result['errors'] = (errors.messages + result['errors'])[:errors.limit]
+        result['parse_error_count'] = errors.count
+        return result
+    finally:
+        upload.close()
+
+
+@app.route('/api/import/jobs/<job_id>', methods=['GET'])
+def api_import_job(job_id):
+    """API: 查询导入任务进度（任务结束后包含最终结果和错误报告）"""
+    job = import_jobs.get(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': '任务不存在或已过期'}), 404
+    return jsonify({'success': True, 'data': job.to_dict()})
+
+
+@app.route('/api/import/jobs/<job_id>/cancel', methods=['POST'])
+def api_cancel_import_job(job_id):
+    """API: 取消导入任务（已提交的批次保留）"""
+    job = import_jobs.cancel(job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': '任务不存在或已过期'}), 404
+    return jsonify({'success': True, 'message': '已请求取消', 'data': job.to_dict()})
+
+
+@app.cli.command('ensure-indexes')
+@click.option('--check-only', is_flag=True, help='只检查，不创建缺失的索引')
+def ensure_indexes_command(check_only):
+    """创建并校验 book 表的覆盖索引，随后输出各索引的使用统计"""
+    try:
+        report = db.ensure_indexes(create=not check_only)
+    except DatabaseError as e:
+        raise click.ClickException(str(e))
+    for item in report:
+        click.echo(f"{item['status']:<9} {item['name']}")
+        if item['status'] in ('missing', 'mismatch'):
+            click.echo(f"          {item['sql']}")
+    _echo_index_usage()
+    if any(item['status'] == 'mismatch' for item in report):
+        raise click.ClickException('存在定义不一致的同名索引，请人工确认后重建')
+
+
+@app.cli.command('index-usage')
+def index_usage_command():
+    """输出 book 表各索引的使用统计"""
+    _echo_index_usage()
+
+
+@app.cli.command('plan-cache')
+@click.option('--limit', default=20, show_default=True, help='输出的计划数')
+def plan_cache_command(limit):
+    """输出本进程语句模板的命中情况和服务器计划缓存中 book 表查询的复用次数"""
+    stats = db.statements.stats()
+    click.echo(f"语句模板: {stats['statements']}  命中率: {stats['hit_rate']:.1%}  "
+               f"(命中 {stats['hits']} / 未命中 {stats['misses']})")
+    try:
+        plans = db.get_plan_cache_usage(limit)
+    except DatabaseError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"\n{'类型':<10}{'复用次数':>10}  语句")
+    for plan in plans:
+        text = ' '.join(plan['text'].split())
+        click.echo(f"{plan['objtype']:<10}{plan['usecounts']:>10}  {text[:100]}")
+
+
+@app.cli.command('check-backend')
+@click.option('--backend', 'backend_name', type=click.Choice(['sqlite', 'configured']), default='sqlite',
+              show_default=True, help='sqlite：临时 SQLite 数据库；configured：config.py 中配置的数据库')
+@click.option('--yes', is_flag=True, help='对配置的数据库执行检查时不再确认')
+def check_backend_command(backend_name, yes):
+    """对数据库后端执行契约检查（读写 CT 开头的图书ID，结束时删除）"""
+    from models.backends.contract import run_contract
+    
+    if backend_name == 'configured':
+        if not yes:
+            click.confirm(f"将在 {db.backend.name} 数据库中写入并删除 CT 开头的图书，是否继续？", abort=True)
+        results = run_contract(db)
+    else:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            config = dict(db.config, backend='sqlite', replicas=[],
+                          sqlite=dict(db.config.get('sqlite', {}), path=os.path.join(tmpdir, 'contract.db')))
+            check_db = BookDB(config)
+            try:
+                results = run_contract(check_db)
+            finally:
+                check_db.pool.close()
+    
+    for result in results:
+        status = '通过' if result['passed'] else '失败'
+        click.echo(f"{status}  {result['name']:<12}{result['elapsed'] * 1000:>8.1f} ms  {result['error'] or ''}")
+    failed = sum(1 for result in results if not result['passed'])
+    if failed:
+        raise click.ClickException(f'{failed} 项检查未通过')
+
+
+@app.cli.command('profile')
+@click.option('--url', default='http://127.0.0.1:5000', show_default=True, help='正在运行的应用地址')
+@click.option('--seconds', default=10.0, show_default=True, help='采样时长（秒）')
+@click.option('--interval', type=float, help='采样间隔（秒），默认沿用 profiler.interval')
+@click.option('--token', envvar='JY_ADMIN_TOKEN', help='管理令牌（默认读取环境变量 JY_ADMIN_TOKEN）')
+@click.option('--output', type=click.Path(dir_okay=False), help='折叠栈的输出文件，可用 flamegraph.pl 或 speedscope 生成火焰图')
+def profile_command(url, seconds, interval, token, output):
+    """对正在运行的应用采样分析，输出各路由的 CPU / 等待时间和最热的调用栈"""
+    if not token:
+        raise click.ClickException('请通过 --token 或环境变量 JY_ADMIN_TOKEN 提供管理令牌')
+    
+    def fetch(fmt):
+        query = {'seconds': seconds, 'format': fmt}
+        if interval:
+            query['interval'] = interval
+        req = urllib.request.Request(
+            f"{url.rstrip('/')}/api/admin/profile?{urllib.parse.urlencode(query)}",
+            method='POST', headers={'X-Admin-Token': token}
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=seconds + 30) as response:
+                return response.read().decode('utf-8')
+        except urllib.error.HTTPError as e:
+            raise click.ClickException(f'采样失败（HTTP {e.code}）: {e.read().decode("utf-8", "replace")}')
+        except urllib.error.URLError as e:
+            raise click.ClickException(f'无法连接 {url}: {e.reason}')
+    
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(fetch('collapsed'))
+        click.echo(f'折叠栈已写入 {output}')
+        return
+    report = json.loads(fetch('json'))['data']
+    click.echo(f"采样 {report['samples']} 次，{report['duration']} 秒，间隔 {report['interval']} 秒\n")
+    click.echo(f"{'路由 / 任务':<40}{'请求数':>8}{'CPU ms':>12}{'等待 ms':>12}{'样本数':>8}")
+    for label, item in report['routes'].items():
+        click.echo(f"{label:<40}{item['requests']:>8}{item['cpu_ms']:>12}{item['wait_ms']:>12}{item['samples']:>8}")
+    for item in report['top_stacks'][:5]:
+        click.echo(f"\n{item['samples']} 个样本:")
+        for frame in item['stack'][-8:]:
+            click.echo(f'  {frame}')
+
+
+def _echo_index_usage():
+    try:
+        usage = db.get_index_usage()
+    except DatabaseError as e:
+        click.echo(f'无法读取索引使用统计: {e}', err=True)
+        return
+    click.echo(f"\n{'索引':<28}{'seeks':>10}{'scans':>10}{'lookups':>10}{'updates':>10}  最近使用")
+    for row in usage:
+        last_used = max(filter(None, (row['last_user_seek'], row['last_user_scan'])), default=None)
+        click.echo(
+            f"{row['index_name'] or '(heap)':<28}{row['user_seeks']:>10}{row['user_scans']:>10}"
+            f"{row['user_lookups']:>10}{row['user_updates']:>10}  {last_used or '-'}"
+        )
 
 
 if __name__ == '__main__':
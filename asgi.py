@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+ASGI 入口
+    uvicorn asgi:application --workers 4
+    hypercorn asgi:application
+
+Flask 应用本身是 WSGI 应用：每个请求在有界线程池中执行（DB_CONFIG['async']['request_workers']），
+统计、分页、相关图书等接口再把彼此独立的查询并发交给数据库线程池（见 models/aio.py）。
+不使用 asgiref 的 WsgiToAsgi：它把所有请求放在同一个线程中依次执行。
+"""
+
+import asyncio
+import contextvars
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app import adb, app, db, import_jobs
+
+# 请求体超过该字节数时写入临时文件（CSV上传）
+BODY_SPOOL_SIZE = 1024 * 1024
+
+
+class WSGIBridge:
+    """
+    在线程池中执行 WSGI 应用的 ASGI 应用
+    
+    请求体读完后再调用 WSGI 应用；响应逐块交给 ASGI 服务器，流式响应（CSV导出）不会整体缓冲。
+    同一请求的各步骤在同一个上下文（contextvars）中执行，请求钩子设置的上下文变量在线程间保持一致。
+    """
+    
+    def __init__(self, wsgi_app, max_workers=32, on_shutdown=None):
+        self.wsgi_app = wsgi_app
+        self.max_workers = max_workers
+        self.on_shutdown = on_shutdown
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='asgi')
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+        else:
+            raise ValueError(f"不支持的 ASGI 连接类型: {scope['type']}")
+    
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.on_shutdown is not None:
+                    self.on_shutdown()
+                self._executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    
+    async def _http(self, scope, receive, send):
+        body = tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL_SIZE)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                break
+        body.seek(0)
+        
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        
+        def run(func, *args):
+            return loop.run_in_executor(self._executor, context.run, func, *args)
+        
+        response = {}
+        written = []
+        
+        def start_response(status, headers, exc_info=None):
+            if exc_info and response.get('sent'):
+                raise exc_info[1].with_traceback(exc_info[2])
+            response['status'] = status
+            response['headers'] = headers
+            return written.append
+        
+        async def send_start():
+            if not response.get('sent'):
+                response['sent'] = True
+                await send({
+                    'type': 'http.response.start',
+                    'status': int(response['status'].split(' ', 1)[0]),
+                    'headers': [
+                        (name.lower().encode('latin-1'), value.encode('latin-1'))
+                        for name, value in response['headers']
+                    ],
+                })
+        
+        try:
+            result = await run(self.wsgi_app, _environ(scope, body), start_response)
+        except Exception:
+            body.close()
+            await send({'type': 'http.response.start', 'status': 500,
+                        'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+            await send({'type': 'http.response.body', 'body': b'Internal Server Error'})
+            raise
+        
+        iterator = iter(result)
+        try:
+            while True:
+                chunk = await run(next, iterator, None)
+                if chunk is None:
+                    break
+                if written:
+                    chunk = b''.join(written) + chunk
+                    written.clear()
+                if not chunk:
+                    continue
+                await send_start()
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send_start()
+            await send({'type': 'http.response.body', 'body': b''.join(written)})
+        finally:
+            if hasattr(result, 'close'):
+                await run(result.close)
+            body.close()
+
+
+def _environ(scope, body):
+    """由 ASGI 连接信息构建 WSGI environ（PEP 3333）"""
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]) if server[1] is not None else '80',
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        # 请求体已完整读入，没有 Content-Length（分块传输）时也可以读到结尾
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+        environ['REMOTE_PORT'] = str(scope['client'][1])
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = name
+        else:
+            key = 'HTTP_' + name
+        # 重复的请求头按逗号合并
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _shutdown():
+    import_jobs.shutdown(wait=True)
+    adb.close(wait=False)
+    db.close_connections()
+
+
+application = WSGIBridge(
+    app,
+    max_workers=db.config.get('async', {}).get('request_workers', 32),
+    on_shutdown=_shutdown
+)
@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+"""
+基准测试
+在本地 SQLite 数据库上灌入 1 万 / 10 万 / 100 万本合成图书，测量 BookDB 方法和 Flask 接口的
+延迟分位数、吞吐量和峰值内存，结果输出为 JSON，便于与上一次运行比较。
+
+用法：python -m benchmarks --sizes 10000 100000 --output bench.json [--baseline 上次结果.json]
+"""
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+基准测试命令行入口：python -m benchmarks
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+from .catalogue import Catalogue
+from .compare import compare, format_comparison
+from .runner import environment, run_size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='JY图书管理系统基准测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+                        help='合成目录的图书数量（默认 10000 100000 1000000）')
+    parser.add_argument('--iterations', type=int, default=100, help='每个查询场景计时执行的次数')
+    parser.add_argument('--heavy-iterations', type=int, default=3, help='导入、导出场景计时执行的次数')
+    parser.add_argument('--seed', type=int, default=20240601, help='合成目录的随机种子')
+    parser.add_argument('--search-engine', choices=['ngram', 'like', 'fts5'],
+                        help='搜索引擎（默认沿用 config.py）')
+    parser.add_argument('--only', nargs='+', help='只执行名称包含这些字符串的场景')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'jy_benchmarks'),
+                        help='合成数据库的存放目录，相同种子和规模的数据库会被复用')
+    parser.add_argument('--output', help='结果 JSON 的输出文件（默认输出到标准输出）')
+    parser.add_argument('--baseline', help='上一次运行的结果 JSON，用于比较')
+    parser.add_argument('--threshold', type=float, default=0.2, help='p50/p95 变慢超过该比例时记为退化')
+    args = parser.parse_args(argv)
+    
+    def log(message):
+        print(message, file=sys.stderr)
+    
+    catalogue = Catalogue(seed=args.seed)
+    report = {'environment': environment(catalogue, args.search_engine), 'runs': []}
+    for size in args.sizes:
+        report['runs'].append(run_size(
+            size, catalogue, args.data_dir,
+            iterations=args.iterations, heavy_iterations=args.heavy_iterations,
+            search_engine=args.search_engine, only=args.only, log=log
+        ))
+    
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        log(f'结果已写入 {args.output}')
+    else:
+        print(text)
+    
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            rows = compare(json.load(f), report, threshold=args.threshold)
+        log(format_comparison(rows))
+        if any(row['regressed'] for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+合成图书目录
+按固定随机种子生成中文书名、作者、出版社、价格和借阅次数，同一 (种子, 规模) 每次生成相同的数据。
+出版社和作者按 Zipf 分布抽取（少数大社占多数图书），借阅次数为长尾分布。
+"""
+
+import random
+from bisect import bisect
+from itertools import accumulate
+
+SURNAMES = '王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈姚卢姜崔钟谭陆汪范金石廖贾夏韦付方白邹孟熊秦邱江尹薛闫段雷侯龙史陶黎贺顾毛郝龚邵万钱严覃武戴莫孔向汤'
+GIVEN_CHARS = '伟芳娜敏静丽强磊军洋勇艳杰娟涛明超秀霞平刚桂英华建国玉兰志红文斌晨辉鹏宇浩然子涵欣怡梓轩雨泽思远嘉琪晓东海燕春梅立新永健'
+
+# 排在前面的出版社权重最大
+PUBLISHERS = [
+    '人民邮电出版社', '机械工业出版社', '清华大学出版社', '电子工业出版社', '人民文学出版社',
+    '中华书局', '商务印书馆', '北京大学出版社', '高等教育出版社', '上海译文出版社',
+    '中信出版社', '生活·读书·新知三联书店', '科学出版社', '化学工业出版社', '译林出版社',
+    '作家出版社', '中国人民大学出版社', '浙江大学出版社', '上海古籍出版社', '广西师范大学出版社',
+]
+_PROVINCES = [
+    '北京', '天津', '河北', '山西', '内蒙古', '辽宁', '吉林', '黑龙江', '上海', '江苏', '浙江', '安徽',
+    '福建', '江西', '山东', '河南', '湖北', '湖南', '广东', '广西', '海南', '重庆', '四川', '贵州',
+    '云南', '西藏', '陕西', '甘肃', '青海', '宁夏', '新疆',
+]
+_PUBLISHER_KINDS = ['人民出版社', '教育出版社', '科学技术出版社', '文艺出版社', '少年儿童出版社', '大学出版社', '美术出版社']
+PUBLISHERS += [province + kind for province in _PROVINCES for kind in _PUBLISHER_KINDS]
+
+_TOPICS = [
+    '数据结构', '算法导论', '操作系统', '计算机网络', '数据库系统', '编译原理', '机器学习', '深度学习',
+    '人工智能', '软件工程', '分布式系统', 'Python编程', 'Java程序设计', 'C语言', '线性代数', '概率论',
+    '高等数学', '离散数学', '微观经济学', '宏观经济学', '管理学', '市场营销', '会计学', '中国通史',
+    '世界史', '宋词', '唐诗', '明清小说', '红楼梦', '三国演义', '西游记', '水浒传', '史记', '论语',
+    '中医基础', '园艺', '摄影', '烹饪', '心理学', '社会学', '哲学', '法学', '天文学', '地理', '建筑设计',
+    '城市规划', '艺术史', '书法', '围棋', '音乐理论',
+]
+_PREFIXES = ['', '', '', '现代', '实用', '图解', '精通', '走进', '漫谈', '新编', '大学', '趣味', '深入理解']
+_SUFFIXES = ['', '概论', '教程', '导论', '入门', '实战', '精解', '研究', '十讲', '手册', '简史', '选读', '与实践', '原理']
+_EDITIONS = ['', '', '', '', '（第2版）', '（第3版）', '（修订版）', '（上册）', '（下册）', '（插图本）']
+
+
+def zipf_weights(count, exponent=1.1):
+    """第 k 名的权重为 1 / k^exponent"""
+    return [1.0 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+class Catalogue:
+    """
+    合成目录生成器
+    
+    book(n) 返回第 n 本图书（n 从 0 开始），只依赖种子和 n，可按任意顺序、分批生成。
+    """
+    
+    def __init__(self, seed=20240601, id_prefix='B', publisher_exponent=1.1, author_count=5000):
+        self.seed = seed
+        self.id_prefix = id_prefix
+        self._publisher_cum = list(accumulate(zipf_weights(len(PUBLISHERS), publisher_exponent)))
+        rng = random.Random(seed)
+        authors = set()
+        while len(authors) < author_count:
+            authors.add(rng.choice(SURNAMES) + ''.join(rng.choice(GIVEN_CHARS) for _ in range(rng.choice((1, 2)))))
+        self.authors = sorted(authors)
+        rng.shuffle(self.authors)
+        self._author_cum = list(accumulate(zipf_weights(len(self.authors), 0.8)))
+    
+    def _pick(self, rng, values, cum_weights):
+        return values[bisect(cum_weights, rng.random() * cum_weights[-1])]
+    
+    def book(self, n):
+        rng = random.Random(f'{self.seed}:{n}')
+        name = rng.choice(_PREFIXES) + rng.choice(_TOPICS) + rng.choice(_SUFFIXES) + rng.choice(_EDITIONS)
+        return {
+            'book_id': f'{self.id_prefix}{n:07d}',
+            'book_name': name[:50],
+            'book_isbn': f'978-7-{rng.randint(100, 999)}-{rng.randint(10000, 99999)}-{rng.randint(0, 9)}',
+            'book_author': self._pick(rng, self.authors, self._author_cum),
+            'book_publisher': self._pick(rng, PUBLISHERS, self._publisher_cum),
+            'book_price': round(min(max(rng.lognormvariate(3.7, 0.5), 5.0), 500.0), 2),
+            'interview_times': min(int(rng.paretovariate(1.3)) - 1, 32767),
+        }
+    
+    def books(self, start, stop):
+        """生成第 start 到 stop-1 本图书"""
+        return (self.book(n) for n in range(start, stop))
+    
+    def sample_keywords(self, count, seed=None):
+        """从书名词汇、作者和出版社中抽取搜索关键词（含 2 个字符的短词）"""
+        rng = random.Random(seed if seed is not None else self.seed + 1)
+        pool = [topic for topic in _TOPICS] + [topic[:2] for topic in _TOPICS] + self.authors[:50] + PUBLISHERS[:10]
+        return [rng.choice(pool) for _ in range(count)]
+    
+    def sample_filters(self, count, seed=None):
+        """生成高级筛选条件组合（价格、借阅次数、出版社、作者、指定字段）"""
+        rng = random.Random(seed if seed is not None else self.seed + 2)
+        filters = []
+        for _ in range(count):
+            item = {}
+            if rng.random() < 0.6:
+                low = rng.choice((10, 20, 30, 50))
+                item['price_min'] = low
+                item['price_max'] = low + rng.choice((10, 30, 100))
+            if rng.random() < 0.3:
+                item['borrow_min'] = rng.choice((1, 5, 20))
+            if rng.random() < 0.5:
+                item['publisher'] = self._pick(rng, PUBLISHERS, self._publisher_cum)[:4]
+            if rng.random() < 0.2:
+                item['author'] = self._pick(rng, self.authors, self._author_cum)
+            if rng.random() < 0.3:
+                item['field_search'] = {'field': 'book_name', 'keyword': rng.choice(_TOPICS)}
+            filters.append(item)
+        return filters
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+基准结果比较
+按 (规模, 场景) 对齐两次运行的结果，列出 p50/p95 的变化，超过阈值的记为退化。
+"""
+
+METRICS = ('p50_ms', 'p95_ms')
+
+
+def compare(baseline, current, threshold=0.2):
+    """
+    比较两次运行的结果（runner 输出的 JSON），返回 [{'size', 'scenario', 'metric', 'before', 'after', 'change', 'regressed'}]
+    
+    change 为相对变化（0.25 表示慢了 25%）；两次都有的场景才参与比较。
+    """
+    before = {
+        (run['size'], name): result
+        for run in baseline.get('runs', []) for name, result in run['scenarios'].items()
+    }
+    rows = []
+    for run in current.get('runs', []):
+        for name, result in run['scenarios'].items():
+            previous = before.get((run['size'], name))
+            if previous is None:
+                continue
+            for metric in METRICS:
+                old, new = previous.get(metric), result.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old
+                rows.append({
+                    'size': run['size'],
+                    'scenario': name,
+                    'metric': metric,
+                    'before': old,
+                    'after': new,
+                    'change': round(change, 4),
+                    'regressed': change > threshold,
+                })
+    return rows
+
+
+def format_comparison(rows):
+    lines = [f"{'规模':>9}  {'场景':<40}{'指标':<8}{'之前':>10}{'之后':>10}{'变化':>9}"]
+    for row in rows:
+        mark = '  退化' if row['regressed'] else ''
+        lines.append(
+            f"{row['size']:>9}  {row['scenario']:<40}{row['metric']:<8}"
+            f"{row['before']:>10.2f}{row['after']:>10.2f}{row['change']:>+9.1%}{mark}"
+        )
+    return '\n'.join(lines)
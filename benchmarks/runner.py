@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+基准测试执行
+在本地后端（默认 SQLite）上按规模灌入合成目录，分别通过 BookDB 方法和 Flask 测试客户端执行各场景，
+统计延迟分位数、吞吐量和峰值内存。
+"""
+
+import copy
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from config import DB_CONFIG
+from models.aio import AsyncBookDB
+from models.db import VALID_SORT_FIELDS, BookDB
+
+from .catalogue import Catalogue
+
+PER_PAGE = 20
+# 导入场景每次写入的行数（使用单独的ID前缀，场景结束后删除）
+IMPORT_ROWS = 2000
+DELETE_CHUNK = 1000
+
+
+def percentile(sorted_values, p):
+    """最近秩分位数（sorted_values 已升序）"""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100.0 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 3) if seconds is not None else None
+
+
+def measure(func, iterations, warmup=3):
+    """
+    执行一个场景：func(i) 执行第 i 次操作，返回处理的行数（可为 None）
+    
+    第一次调用单独计时（first_ms，含索引构建、缓存填充等冷启动开销），随后预热 warmup 次，
+    再计时执行 iterations 次；最后在 tracemalloc 下额外执行一次取峰值内存
+    （tracemalloc 会显著拖慢执行，因此不与计时混在一起）。
+    """
+    started = time.perf_counter()
+    func(0)
+    first = time.perf_counter() - started
+    for i in range(warmup):
+        func(i + 1)
+    
+    latencies = []
+    rows = 0
+    total_started = time.perf_counter()
+    for i in range(iterations):
+        started = time.perf_counter()
+        count = func(warmup + 1 + i)
+        latencies.append(time.perf_counter() - started)
+        rows += count or 0
+    elapsed = time.perf_counter() - total_started
+    
+    tracemalloc.start()
+    try:
+        func(warmup + 1 + iterations)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    
+    latencies.sort()
+    result = {
+        'iterations': iterations,
+        'first_ms': _ms(first),
+        'mean_ms': _ms(sum(latencies) / len(latencies)),
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p95_ms': _ms(percentile(latencies, 95)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+        'max_ms': _ms(latencies[-1]),
+        'ops_per_second': round(iterations / elapsed, 2) if elapsed else None,
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+    if rows:
+        result['rows_per_second'] = round(rows / elapsed, 1) if elapsed else None
+    return result
+
+
+def benchmark_config(path, search_engine=None):
+    """以 config.py 为基础，改用指定文件的 SQLite 后端，不使用只读副本"""
+    config = copy.deepcopy(DB_CONFIG)
+    config['backend'] = 'sqlite'
+    config['replicas'] = []
+    config['sqlite'] = dict(config.get('sqlite', {}), path=path)
+    if search_engine:
+        config['search'] = dict(config.get('search', {}), engine=search_engine)
+    return config
+
+
+def prepare_database(size, catalogue, data_dir, search_engine=None):
+    """
+    准备灌入 size 本图书的数据库，返回 (BookDB, 灌库信息)
+    
+    数据库文件按 (种子, 规模) 命名，已存在且行数一致时直接复用。
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f'catalogue-{catalogue.seed}-{size}.db')
+    if os.path.exists(path):
+        db = BookDB(benchmark_config(path, search_engine))
+        if db.get_books_count() == size:
+            return db, {'path': path, 'reused': True}
+        db.pool.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    
+    db = BookDB(benchmark_config(path, search_engine))
+    result = db.import_books_from_data(catalogue.books(0, size), batch_size=1000)
+    if result['error_count']:
+        raise RuntimeError(f"灌入合成目录失败: {result['errors'][:3]}")
+    return db, {
+        'path': path,
+        'reused': False,
+        'seconds': result['elapsed'],
+        'rows_per_second': result['rows_per_second'],
+    }
+
+
+def _delete_books(db, book_ids):
+    for start in range(0, len(book_ids), DELETE_CHUNK):
+        db.delete_books_batch(book_ids[start:start + DELETE_CHUNK])
+
+
+def _db_scenarios(db, size, catalogue, keywords, filters):
+    rng = random.Random(catalogue.seed)
+    sort_fields = VALID_SORT_FIELDS
+    pages = max(1, size // PER_PAGE)
+    state = {'cursor': None}
+    
+    def paginated(i):
+        return len(db.get_books_paginated(page=rng.randint(1, pages), per_page=PER_PAGE,
+                                          sort_by=sort_fields[i % len(sort_fields)]))
+    
+    def keyset(i):
+        result = db.get_books_page(per_page=PER_PAGE, sort_by='interview_times', sort_order='DESC',
+                                   cursor=state['cursor'], with_total=False)
+        state['cursor'] = result['next_cursor']
+        return len(result['books'])
+    
+    def advanced_filter(i):
+        return len(db.get_books_advanced_filter(filters[i % len(filters)], per_page=PER_PAGE)['books'])
+    
+    def statistics(i):
+        db.get_statistics()
+    
+    def search(i):
+        return len(db.search_books(keywords[i % len(keywords)]))
+    
+    return [
+        ('db.get_books_paginated', paginated, False),
+        ('db.get_books_page.keyset', keyset, False),
+        ('db.get_books_advanced_filter', advanced_filter, False),
+        ('db.get_statistics', statistics, False),
+        ('db.search_books', search, False),
+    ]
+
+
+def _import_scenario(db, catalogue):
+    # 导入的图书使用 I 前缀，放在最后执行，不影响其他场景的数据量
+    importer = Catalogue(seed=catalogue.seed, id_prefix='I')
+    
+    def import_books(i):
+        start = i * IMPORT_ROWS
+        result = db.import_books_from_data(importer.books(start, start + IMPORT_ROWS), batch_size=250)
+        return result['success_count']
+    
+    return [('db.import_books_from_data', import_books, True)]
+
+
+def _api_scenarios(client, size, catalogue, keywords, filters):
+    rng = random.Random(catalogue.seed + 3)
+    sort_fields = VALID_SORT_FIELDS
+    pages = max(1, size // PER_PAGE)
+    
+    def check(response):
+        if response.status_code != 200:
+            raise RuntimeError(f'{response.request.path} 返回 {response.status_code}: {response.get_data(as_text=True)[:200]}')
+        return response
+    
+    def paginated(i):
+        response = check(client.get('/api/books/paginated', query_string={
+            'page': rng.randint(1, pages), 'per_page': PER_PAGE, 'sort_by': sort_fields[i % len(sort_fields)]
+        }))
+        return len(response.get_json()['data'])
+    
+    def advanced_filter(i):
+        response = check(client.post('/api/books/filter', json={
+            'filters': filters[i % len(filters)], 'page': 1, 'per_page': PER_PAGE
+        }))
+        return len(response.get_json()['data'])
+    
+    def statistics(i):
+        check(client.get('/api/statistics'))
+    
+    def search(i):
+        response = check(client.get('/api/books/paginated', query_string={
+            'search': keywords[i % len(keywords)], 'per_page': PER_PAGE
+        }))
+        return len(response.get_json()['data'])
+    
+    def export_csv(i):
+        # 不缓冲响应，逐块读取，峰值内存反映服务端的流式导出
+        response = check(client.get('/api/export/csv', buffered=False))
+        rows = 0
+        try:
+            for chunk in response.response:
+                rows += chunk.count(b'\n') if isinstance(chunk, bytes) else chunk.count('\n')
+        finally:
+            response.close()
+        return max(rows - 1, 0)
+    
+    return [
+        ('api.GET /api/books/paginated', paginated, False),
+        ('api.POST /api/books/filter', advanced_filter, False),
+        ('api.GET /api/statistics', statistics, False),
+        ('api.GET /api/books/paginated?search', search, False),
+        ('api.GET /api/export/csv', export_csv, True),
+    ]
+
+
+def run_size(size, catalogue, data_dir, iterations=100, heavy_iterations=3, search_engine=None,
+             only=None, log=None):
+    """对一个规模执行全部场景，返回该规模的结果字典"""
+    log = log or (lambda message: None)
+    log(f'准备 {size} 本图书的数据库...')
+    db, seed_info = prepare_database(size, catalogue, data_dir, search_engine)
+    log(f"  {'复用' if seed_info['reused'] else '已灌入'} {seed_info['path']}")
+    # 预先构建内存索引（搜索、相关图书、筛选选项），构建耗时单独记录，不计入各场景
+    started = time.perf_counter()
+    for index in (db.search_engine, db.related_index, db.value_dictionary):
+        if hasattr(index, 'ensure_built'):
+            index.ensure_built()
+    seed_info['index_build_seconds'] = round(time.perf_counter() - started, 3)
+    
+    # 路由通过 app 模块的全局 db / adb 访问数据库，替换为本规模的实例
+    import app as web
+    web.db = db
+    web.adb = AsyncBookDB(db)
+    client = web.app.test_client()
+    
+    keywords = catalogue.sample_keywords(200)
+    filters = catalogue.sample_filters(200)
+    scenarios = (_db_scenarios(db, size, catalogue, keywords, filters)
+                 + _api_scenarios(client, size, catalogue, keywords, filters)
+                 + _import_scenario(db, catalogue))
+    
+    results = {}
+    try:
+        for name, func, heavy in scenarios:
+            if only and not any(pattern in name for pattern in only):
+                continue
+            log(f'  {name}')
+            results[name] = measure(func, heavy_iterations if heavy else iterations,
+                                    warmup=0 if heavy else 3)
+    finally:
+        _delete_books(db, [f'I{n:07d}' for n in range((heavy_iterations + 2) * IMPORT_ROWS)])
+        web.adb.close()
+        db.pool.close()
+    return {'size': size, 'seed': seed_info, 'scenarios': results}
+
+
+def environment(catalogue, search_engine=None):
+    """本次运行的环境信息，便于比较不同运行的结果"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip()
+    except OSError:
+        commit = ''
+    return {
+        'started': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit or None,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'backend': 'sqlite',
+        'sqlite_version': sqlite3.sqlite_version,
+        'search_engine': search_engine or DB_CONFIG.get('search', {}).get('engine', 'like'),
+        'catalogue_seed': catalogue.seed,
+    }
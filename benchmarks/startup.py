@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+冷启动基准测试：python -m benchmarks.startup --size 100000 --workers 2
+在合成目录的 SQLite 数据库上启动 server.py（gunicorn 预分叉），测量从启动进程到 /healthz 可用、
+到第一个接口响应的时间，各接口第一次与第二次请求的耗时，以及收到 SIGTERM 后的退出时间；
+分别测量预热（warm）和不预热（cold）两种启动方式，每种执行 --runs 次取中位数。
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from .catalogue import Catalogue
+from .runner import benchmark_config, environment, prepare_database
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 启动后依次请求的接口（第一次请求承担未预热时的索引构建、建立连接等开销）
+ENDPOINTS = [
+    ('GET /api/books/paginated?search', '/api/books/paginated?' + urllib.parse.urlencode({'search': '数据', 'per_page': 20})),
+    ('GET /api/statistics', '/api/statistics'),
+    ('GET /api/filter/options', '/api/filter/options'),
+    ('GET /api/books/<id>/related', '/api/books/B0000001/related'),
+]
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _get(url, timeout=30):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        response.read()
+        return response.status
+
+
+def _wait_ready(url, process, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'服务进程已退出（退出码 {process.returncode}）')
+        try:
+            if _get(url, timeout=1) == 200:
+                return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f'{timeout} 秒内服务未就绪')
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+def measure_startup(db_path, warm_up, workers, threads, search_engine=None, timeout=300, log_file=None):
+    """启动一次服务并测量，返回各项耗时（毫秒）"""
+    port = _free_port()
+    base = f'http://127.0.0.1:{port}'
+    command = [
+        sys.executable, '-m', 'benchmarks.startup', '--serve', db_path, '--port', str(port),
+        '--workers', str(workers), '--threads', str(threads),
+    ]
+    if search_engine:
+        command += ['--search-engine', search_engine]
+    if not warm_up:
+        command.append('--no-warm-up')
+    
+    started = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL,
+                               stderr=log_file or subprocess.DEVNULL)
+    try:
+        _wait_ready(base + '/healthz', process, timeout)
+        ready = time.perf_counter() - started
+        first = {}
+        for name, path in ENDPOINTS:
+            request_started = time.perf_counter()
+            _get(base + path)
+            first[name] = time.perf_counter() - request_started
+            if len(first) == 1:
+                first_response = time.perf_counter() - started
+        second = {}
+        for name, path in ENDPOINTS:
+            request_started = time.perf_counter()
+            _get(base + path)
+            second[name] = time.perf_counter() - request_started
+        
+        stop_started = time.perf_counter()
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=timeout)
+        shutdown = time.perf_counter() - stop_started
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+    
+    return {
+        'ready_ms': _ms(ready),
+        'first_response_ms': _ms(first_response),
+        'first_request_ms': {name: _ms(value) for name, value in first.items()},
+        'second_request_ms': {name: _ms(value) for name, value in second.items()},
+        'shutdown_ms': _ms(shutdown),
+    }
+
+
+def _median(runs):
+    """各次运行结果逐项取中位数"""
+    result = {}
+    for key, value in runs[0].items():
+        if isinstance(value, dict):
+            result[key] = {name: round(statistics.median(run[key][name] for run in runs), 1) for name in value}
+        else:
+            result[key] = round(statistics.median(run[key] for run in runs), 1)
+    return result
+
+
+def format_report(modes):
+    lines = [f"{'':<36}{'warm':>12}{'cold':>12}"]
+    warm, cold = modes['warm']['median'], modes['cold']['median']
+    for key in ('ready_ms', 'first_response_ms', 'shutdown_ms'):
+        lines.append(f'{key:<36}{warm[key]:>12}{cold[key]:>12}')
+    for key in ('first_request_ms', 'second_request_ms'):
+        for name in warm[key]:
+            label = f"{key.split('_')[0]} {name}"
+            lines.append(f'{label:<36}{warm[key][name]:>12}{cold[key][name]:>12}')
+    return '\n'.join(lines)
+
+
+def _serve(args):
+    """子进程：改用基准数据库后启动 server.py"""
+    import config
+    settings = benchmark_config(args.serve, args.search_engine)
+    config.DB_CONFIG.clear()
+    config.DB_CONFIG.update(settings)
+    import server
+    server.run({
+        'bind': f'127.0.0.1:{args.port}',
+        'workers': args.workers,
+        'threads': args.threads,
+        'warm_up': args.warm_up,
+        'drain_seconds': 0,
+    })
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.startup', description='冷启动基准测试')
+    parser.add_argument('--size', type=int, default=100000, help='合成目录的图书数量')
+    parser.add_argument('--workers', type=int, default=2, help='工作进程数')
+    parser.add_argument('--threads', type=int, default=4, help='每个工作进程的线程数')
+    parser.add_argument('--runs', type=int, default=3, help='每种启动方式执行的次数')
+    parser.add_argument('--seed', type=int, default=20240601, help='合成目录的随机种子')
+    parser.add_argument('--search-engine', choices=['ngram', 'like', 'fts5'], help='搜索引擎（默认沿用 config.py）')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'jy_benchmarks'),
+                        help='合成数据库的存放目录，相同种子和规模的数据库会被复用')
+    parser.add_argument('--output', help='结果 JSON 的输出文件（默认输出到标准输出）')
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--no-warm-up', dest='warm_up', action='store_false', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.serve:
+        return _serve(args)
+    
+    def log(message):
+        print(message, file=sys.stderr)
+    
+    catalogue = Catalogue(seed=args.seed)
+    log(f'准备 {args.size} 本图书的数据库...')
+    db, seed_info = prepare_database(args.size, catalogue, args.data_dir, args.search_engine)
+    db.pool.close()
+    
+    modes = {}
+    for mode in ('warm', 'cold'):
+        runs = []
+        for i in range(args.runs):
+            log(f'  {mode} #{i + 1}')
+            runs.append(measure_startup(seed_info['path'], mode == 'warm', args.workers, args.threads,
+                                        args.search_engine))
+        modes[mode] = {'median': _median(runs), 'runs': runs}
+    
+    env = environment(catalogue, args.search_engine)
+    env.update(workers=args.workers, threads=args.threads)
+    report = {'environment': env, 'size': args.size, 'modes': modes}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        log(f'结果已写入 {args.output}')
+    else:
+        print(text)
+    log(format_report(modes))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -12,8 +12,138 @@
 """
 
 DB_CONFIG = {
+    'backend': 'mssql',            # 数据库后端：'mssql'（SQL Server）或 'sqlite'（本地/分馆终端）
     'server': 'LAPTOP-O95VGSES',  # 请修改为你的SQL Server服务器名称
     'database': 'JY',              # 数据库名称
-    'charset': 'utf8'              # 字符编码
+    'charset': 'utf8',             # 字符编码
+    'login_timeout': 10,           # 建立连接的超时时间（秒）
+
+    # SQLite 后端配置（backend 为 'sqlite' 时生效，首次连接时自动建表和索引）
+    'sqlite': {
+        'path': 'jy_books.db',     # 数据库文件路径；':memory:' 为进程内的内存数据库
+        'timeout': 30,             # 等待写锁的超时时间（秒）
+        'fts': True                # 建立 FTS5 全文索引（search.engine 为 'fts5' 时需要）
+    },
+
+    # 连接池配置
+    'pool': {
+        'min_size': 1,             # 保留的最少空闲连接数
+        'max_size': 10,            # 最大连接数
+        'timeout': 30,             # 连接耗尽时借出连接的最长等待时间（秒）
+        'max_idle': 300,           # 多余空闲连接的回收时间（秒）
+        'max_lifetime': 3600,      # 连接最长存活时间（秒），到期后重建
+        'health_check': True,      # 借出前检查连接是否可用
+        'health_check_interval': 30  # 空闲超过该秒数的连接才执行检查
+    },
+
+    # 只读副本：只读查询（列表、分页、筛选、搜索、统计、筛选选项、相关图书）分发到副本，写入走主库
+    # 每项可指定 server、database、charset、name、weight（权重），未指定的项沿用主库配置
+    # 例如：[{'server': 'REPLICA-1', 'weight': 2}, {'server': 'REPLICA-2'}]
+    'replicas': [],
+
+    # 读写分离配置（仅在配置了只读副本时生效）
+    'routing': {
+        'read_your_writes': 5,     # 写入后该秒数内同一客户端的读取走主库（通过Cookie跨请求生效）
+        'failure_threshold': 3,    # 副本连续连接失败该次数后暂停使用
+        'retry_interval': 30       # 暂停使用的副本在该秒数后重新尝试
+    },
+
+    # 数据库访问统计（每次请求的连接数、语句数和耗时，通过 Server-Timing 响应头返回）
+    'instrumentation': {
+        'enabled': True,           # 记录每条语句的耗时（关闭后不再包装连接和游标）
+        'slow_query_ms': 500,      # 执行加取数耗时超过该毫秒数的语句写入慢查询日志；None 表示不记录
+        'log_params': False,       # 慢查询日志是否输出参数取值（默认只输出类型和长度）
+        'max_statements': 200      # 按语句汇总的最大条数，超过后计入 (other)
+    },
+
+    # 生产环境服务（python server.py，gunicorn 预分叉多进程）；命令行参数优先
+    'serving': {
+        'bind': '0.0.0.0:5000',    # 监听地址
+        'workers': None,           # 工作进程数；None 时为 CPU 核数 × 2 + 1
+        'threads': 4,              # 每个工作进程的线程数
+        'timeout': 60,             # 请求超时（秒），超时的工作进程被重启
+        'graceful_timeout': 30,    # 收到 SIGTERM 后等待请求和导入任务完成的秒数（应大于 drain_seconds）
+        'drain_seconds': 0,        # 停止接受连接前的排空秒数，期间 /healthz 返回 503；负载均衡后部署时建议 5 以上
+        'max_requests': 0,         # 工作进程处理该数量的请求后重启（0 不重启）
+        'max_requests_jitter': 0,  # max_requests 的随机偏移，避免各进程同时重启
+        'warm_up': True,           # 启动时预热内存索引、连接池和统计缓存
+        'state_dir': None          # 多进程共享状态目录（跨进程写入通知、导入任务状态）；None 时 server.py 多进程启动自动创建临时目录
+    },
+
+    # 异步访问：统计、分页、相关图书接口中彼此独立的查询并发执行；asgi.py 为 ASGI 入口
+    'async': {
+        'db_workers': None,        # 执行数据库查询的线程数；None 时等于连接池最大连接数
+        'request_workers': 32      # asgi.py 执行请求的线程数
+    },
+
+    # 指标（/metrics，Prometheus 文本格式）
+    'metrics': {
+        'enabled': True,           # 记录路由和 BookDB 方法的耗时、错误和导入导出行数
+        'buckets': None,           # 耗时直方图的分桶上限（秒）；None 使用默认分桶（5ms 到 10s）
+        'require_token': True      # /metrics 需要管理令牌（profiler.token，Authorization: Bearer 或 X-Admin-Token）；仅内网抓取时可设为 False
+    },
+
+    # 采样分析（/api/admin/profile、flask profile），按需开启，平时没有开销
+    'profiler': {
+        'token': None,             # 管理令牌（请求头 X-Admin-Token，也用于 /api/queries/status、/metrics 和 POST /api/statistics/reconcile）；None 时读取环境变量 JY_ADMIN_TOKEN，都未设置时不可用
+        'interval': 0.01,          # 采样间隔（秒）
+        'max_seconds': 60          # 单次采样的最长时间（秒）
+    },
+
+    # 语句模板缓存（分页、筛选等动态拼接的查询）
+    'statements': {
+        'parameterize': True,      # 通过 sp_executesql 参数化执行，相同筛选组合共用执行计划；False 时按原方式内联参数
+        'max_size': 256            # 最多缓存的语句模板数
+    },
+
+    # 搜索配置
+    'search': {
+        'engine': 'like',          # 'like'：数据库LIKE模糊匹配；'ngram'：内存n-gram倒排索引（需要SQL Server 2016+ 的 OPENJSON）；'fts5'：SQLite全文索引（仅SQLite后端）
+        'ngram_size': 2,           # n-gram长度（同时索引单字，支持单字搜索）
+        'max_candidates': 1000,    # ngram 索引匹配的图书超过该数量时，分页、计数改用 LIKE 条件（避免传给数据库的图书ID列表过大）；None 表示不限
+        'rebuild_interval': 600    # 定期全量重建索引的间隔（秒），用于同步其他进程的写入；None 表示不重建
+    },
+
+    # 统计数据配置
+    'statistics': {
+        'cache_ttl': 60,           # 统计结果缓存时间（秒），本进程内的写入会立即使缓存失效
+        'incremental': True,       # 在内存中增量维护统计数据，读取时不访问数据库
+        'reconcile_interval': 300  # 增量统计与数据库对账的间隔（秒），用于纠正其他进程的写入；None 表示不对账
+    },
+
+    # CSV导入配置
+    'import': {
+        'batch_size': 250,         # 每批写入并提交的行数（受SQL Server 2100个参数的限制，最多299）
+        'max_errors': 1000,        # 返回结果中最多保留的错误信息条数（错误计数不受限制）
+        'workers': 2,              # 同时执行的后台导入任务数
+        'max_queued': 8,           # 排队中的导入任务上限，超过时拒绝新的导入
+        'job_retention': 3600      # 已结束的导入任务保留时间（秒），之后不再可查询
+    },
+
+    # 相关图书配置
+    'related': {
+        'engine': 'index',         # 'index'：内存倒排列表；'sql'：每次查询数据库
+        'scoring': 'tiered',       # 'tiered'：同作者同出版社 > 同作者 > 同出版社；'weighted'：加权评分
+        'weights': {'author': 2.0, 'publisher': 1.0, 'popularity': 0.5},  # 加权评分的权重
+        'rebuild_interval': 600    # 定期全量重建的间隔（秒），用于同步其他进程的写入；None 表示不重建
+    },
+
+    # 筛选选项配置
+    'filter_options': {
+        'engine': 'index',         # 'index'：内存取值字典（随写入更新）；'sql'：每次查询数据库
+        'rebuild_interval': 600    # 定期全量重建的间隔（秒），用于同步其他进程的写入；None 表示不重建
+    },
+
+    # 单本图书读缓存（详情页、/api/books/<id>），写入时按图书ID精确失效
+    'book_cache': {
+        'max_size': 1000,          # 最多缓存的图书数，超过时淘汰最久未使用的
+        'ttl': 300                 # 缓存时间（秒），用于同步其他进程的写入
+    },
+
+    # 导出配置
+    'export': {
+        'fetch_size': 1000,        # 导出时每次从数据库读取的行数
+        'watermark_column': None   # 变更追踪列（ROWVERSION 类型，如 'row_version'），配置后支持按水位增量导出
+    }
 }
 
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+"""
+后台任务模块
+在有界线程池中执行耗时操作（如CSV导入），请求立即返回任务ID，前端轮询任务进度
+多进程部署时任务状态保存在共享目录中，轮询和取消请求可以由任意进程处理
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 状态文件的最短保存间隔（秒）；状态变化（开始、结束、取消）时立即保存
+SAVE_INTERVAL = 0.5
+
+JOB_ID_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+
+class JobQueueFullError(Exception):
+    """排队中的任务已达上限"""
+    pass
+
+
+class Job:
+    """
+    后台任务
+    
+    状态：pending（排队中）、running（执行中）、completed（完成）、
+    failed（失败）、cancelled（已取消）
+    """
+    
+    FINISHED = ('completed', 'failed', 'cancelled')
+    
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'pending'
+        self.message = ''
+        self.progress = {}
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self.on_change = None
+        self._lock = threading.Lock()
+    
+    @property
+    def finished(self):
+        return self.status in self.FINISHED
+    
+    def update(self, **progress):
+        """更新进度信息"""
+        with self._lock:
+            self.progress.update(progress)
+        if self.on_change is not None:
+            self.on_change(self)
+    
+    def to_dict(self):
+        """返回任务状态；任务结束后包含最终结果"""
+        with self._lock:
+            now = self.finished_at or time.time()
+            data = {
+                'job_id': self.id,
+                'kind': self.kind,
+                'status': self.status,
+                'message': self.message,
+                'progress': dict(self.progress),
+                'elapsed': round(now - self.started_at, 3) if self.started_at else 0.0,
+                'cancel_requested': self.cancel_event.is_set(),
+            }
+            if self.finished:
+                data['result'] = self.result
+            return data
+
+
+class StoredJob:
+    """其他进程执行的任务（由共享目录中的状态文件读取，只读）"""
+    
+    def __init__(self, data, cancel_requested=False):
+        self.id = data['job_id']
+        self.status = data['status']
+        self._data = data
+        self._cancel_requested = cancel_requested
+    
+    @property
+    def finished(self):
+        return self.status in Job.FINISHED
+    
+    def to_dict(self):
+        data = dict(self._data)
+        saved_at = data.pop('saved_at', None)
+        if self.status == 'running' and saved_at:
+            data['elapsed'] = round(data['elapsed'] + max(0.0, time.time() - saved_at), 3)
+        if self._cancel_requested:
+            data['cancel_requested'] = True
+        return data
+
+
+class JobManager:
+    """
+    后台任务管理器
+    
+    - workers：同时执行的任务数；max_queued：排队任务上限，超过时拒绝新任务（按进程计）
+    - retention：已结束任务的保留秒数，超过后不再可查询
+    - state_dir：多进程部署时的共享目录。任务状态写入 <任务ID>.json，其他进程查询时读取该文件；
+      其他进程取消任务时创建 <任务ID>.cancel，执行任务的进程在下次更新进度时发现并设置 cancel_event
+    """
+    
+    def __init__(self, workers=2, max_queued=8, retention=3600, state_dir=None):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.state_dir = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        if state_dir:
+            self.enable_store(state_dir)
+    
+    def enable_store(self, directory):
+        """在共享目录中保存任务状态（在提交任务前调用）"""
+        os.makedirs(directory, exist_ok=True)
+        self.state_dir = directory
+    
+    def submit(self, kind, func, *args):
+        """
+        提交任务，返回 Job
+        
+        func(job, *args) 在线程池中执行，返回值作为任务结果（结果字典中 cancelled 为 True
+        时任务记为已取消）；抛出的异常使任务失败，异常信息作为任务消息。
+        """
+        self._cleanup()
+        job = Job(kind)
+        with self._lock:
+            queued = sum(1 for j in self._jobs.values() if j.status == 'pending')
+            if self.max_queued is not None and queued >= self.max_queued:
+                raise JobQueueFullError(f'排队中的任务已达上限（{self.max_queued}），请稍后再试')
+            self._jobs[job.id] = job
+        if self.state_dir is not None:
+            job.on_change = self._save
+            job._saved_at = 0.0
+            job._save_lock = threading.Lock()
+            self._save(job, force=True)
+        self._executor.submit(self._run, job, func, args)
+        return job
+    
+    def get(self, job_id):
+        """查询任务（本进程的 Job，或其他进程任务的 StoredJob），不存在时返回 None"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None and self.state_dir is not None:
+            job = self._load(job_id)
+        return job
+    
+    def cancel(self, job_id):
+        """
+        请求取消任务，返回 Job（不存在时返回 None）
+        
+        排队中的任务直接取消；执行中的任务由任务函数在检查 cancel_event 后自行停止。
+        """
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if isinstance(job, StoredJob):
+            if job.finished:
+                return job
+            with open(self._path(job_id, '.cancel'), 'a'):
+                pass
+            return StoredJob(job._data, cancel_requested=True)
+        job.cancel_event.set()
+        with job._lock:
+            if job.status == 'pending':
+                job.status = 'cancelled'
+                job.message = '任务已取消'
+                job.finished_at = time.time()
+        self._save(job, force=True)
+        return job
+    
+    def shutdown(self, wait=True):
+        """
+        停止执行任务并关闭线程池
+        
+        排队中的任务直接取消；执行中的任务（如正在分批写入的导入）不取消，wait 为 True 时等待其结束。
+        """
+        with self._lock:
+            pending = [job.id for job in self._jobs.values() if job.status == 'pending']
+        for job_id in pending:
+            self.cancel(job_id)
+        self._executor.shutdown(wait=wait)
+    
+    def stats(self):
+        """返回各状态的任务数"""
+        counts = dict.fromkeys(('pending', 'running') + Job.FINISHED, 0)
+        with self._lock:
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+    
+    def _run(self, job, func, args):
+        with job._lock:
+            if job.status != 'pending':
+                return
+            job.status = 'running'
+            job.started_at = time.time()
+        self._save(job, force=True)
+        try:
+            result = func(job, *args)
+            cancelled = isinstance(result, dict) and result.get('cancelled')
+            status = 'cancelled' if cancelled else 'completed'
+            message = '任务已取消' if status == 'cancelled' else '任务完成'
+        except Exception as e:
+            logger.exception('后台任务执行失败: %s', job.id)
+            result = None
+            status = 'failed'
+            message = str(e)
+        with job._lock:
+            job.result = result
+            job.status = status
+            job.message = message
+            job.finished_at = time.time()
+        self._save(job, force=True)
+    
+    def _path(self, job_id, suffix='.json'):
+        return os.path.join(self.state_dir, job_id + suffix)
+    
+    def _save(self, job, force=False):
+        """把任务状态写入共享目录（先写临时文件再替换，读取者不会读到写了一半的文件）"""
+        if self.state_dir is None or job.on_change is None:
+            return
+        with job._save_lock:
+            if not job.cancel_event.is_set() and os.path.exists(self._path(job.id, '.cancel')):
+                job.cancel_event.set()
+                force = True
+            now = time.monotonic()
+            if not force and now - job._saved_at < SAVE_INTERVAL:
+                return
+            job._saved_at = now
+            data = job.to_dict()
+            data['saved_at'] = time.time()
+            path = self._path(job.id)
+            temp_path = f'{path}.{os.getpid()}.tmp'
+            try:
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump(data, f, ensure_ascii=False)
+                os.replace(temp_path, path)
+            except (OSError, TypeError, ValueError) as e:
+                logger.warning('保存任务状态失败: %s: %s', job.id, e)
+    
+    def _load(self, job_id):
+        if not JOB_ID_PATTERN.fullmatch(job_id):
+            return None
+        try:
+            with open(self._path(job_id), encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return StoredJob(data, cancel_requested=os.path.exists(self._path(job_id, '.cancel')))
+    
+    def _cleanup(self):
+        """移除超过保留时间的已结束任务"""
+        if self.retention is None:
+            return
+        deadline = time.time() - self.retention
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job.finished and job.finished_at < deadline]
+            for job_id in expired:
+                del self._jobs[job_id]
+            local = set(self._jobs)
+        if self.state_dir is None:
+            return
+        # 共享目录中的状态文件：最后一次保存超过保留时间的（所有进程都会清理）
+        for entry in os.scandir(self.state_dir):
+            job_id = entry.name.split('.', 1)[0]
+            if job_id in local:
+                continue
+            try:
+                if entry.stat().st_mtime < deadline:
+                    os.remove(entry.path)
+            except OSError:
+                pass
@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+"""
+指标模块
+计数器和直方图按线程分片累加（写入只访问本线程的分片，不加锁），抓取时合并各分片，
+以 Prometheus 文本格式输出；仪表盘类指标（连接池、缓存等）在抓取时通过回调读取
+"""
+
+import functools
+import inspect
+import threading
+import time
+import weakref
+
+# 默认的延迟分桶（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Shard:
+    """一个线程的累加值：{(指标名, 标签取值): 值}，直方图的值为 [各分桶计数..., 总和, 次数]"""
+    
+    __slots__ = ('values',)
+    
+    def __init__(self):
+        self.values = {}
+
+
+class _Metric:
+    def __init__(self, registry, name, help_text, labelnames):
+        self._registry = registry
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+    
+    def _key(self, labels):
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f'{self.name} 需要标签 {self.labelnames}')
+        return (self.name, tuple(str(value) for value in labels))
+
+
+class Counter(_Metric):
+    """只增不减的计数器（名称以 _total 结尾）"""
+    
+    type = 'counter'
+    
+    def inc(self, *labels, amount=1):
+        values = self._registry._shard().values
+        key = self._key(labels)
+        values[key] = values.get(key, 0) + amount
+    
+    def _merge(self, total, value):
+        return (total or 0) + value
+    
+    def _samples(self, key, value):
+        yield self.name, _format_labels(self.labelnames, key), value
+
+
+class Histogram(_Metric):
+    """累积分桶直方图"""
+    
+    type = 'histogram'
+    
+    def __init__(self, registry, name, help_text, labelnames, buckets=DEFAULT_BUCKETS):
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value, *labels):
+        values = self._registry._shard().values
+        key = self._key(labels)
+        entry = values.get(key)
+        if entry is None:
+            entry = values[key] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                entry[i] += 1
+                break
+        entry[-2] += value
+        entry[-1] += 1
+    
+    def time(self, *labels):
+        """上下文管理器：记录 with 块的耗时"""
+        return _Timer(self, labels)
+    
+    def _merge(self, total, value):
+        if total is None:
+            return list(value)
+        return [a + b for a, b in zip(total, value)]
+    
+    def _samples(self, key, value):
+        cumulative = 0
+        for bound, count in zip(self.buckets, value):
+            cumulative += count
+            yield self.name + '_bucket', _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"'), cumulative
+        yield self.name + '_bucket', _format_labels(self.labelnames, key, 'le="+Inf"'), value[-1]
+        yield self.name + '_sum', _format_labels(self.labelnames, key), value[-2]
+        yield self.name + '_count', _format_labels(self.labelnames, key), value[-1]
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self._histogram = histogram
+        self._labels = labels
+    
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self._histogram.observe(time.perf_counter() - self._started, *self._labels)
+
+
+class Gauge:
+    """
+    抓取时由回调取值的指标，回调返回 {标签取值元组: 值}
+    
+    数据来源自己维护的累计值（如连接池的等待次数）以 type='counter' 注册。
+    """
+    
+    def __init__(self, name, help_text, labelnames, callback, type='gauge'):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.callback = callback
+        self.type = type
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+    
+    每个线程第一次写入时创建自己的分片；线程结束（线程对象被回收）后，
+    其分片并入 retired 汇总，避免为每个请求新建线程的服务器上分片无限增长。
+    """
+    
+    def __init__(self):
+        self._metrics = {}
+        self._gauges = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards = set()
+        self._retired = {}
+    
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._shards.add(shard)
+            weakref.finalize(threading.current_thread(), self._retire, shard)
+        return shard
+    
+    def _retire(self, shard):
+        with self._lock:
+            self._merge_into(self._retired, shard.values)
+            self._shards.discard(shard)
+    
+    def _merge_into(self, totals, values):
+        for key, value in list(values.items()):
+            metric = self._metrics.get(key[0])
+            if metric is not None:
+                totals[key] = metric._merge(totals.get(key), value)
+    
+    def _register(self, metric):
+        if metric.name in self._metrics or any(gauge.name == metric.name for gauge in self._gauges):
+            raise ValueError(f'指标 {metric.name} 已注册')
+        self._metrics[metric.name] = metric
+        return metric
+    
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(self, name, help_text, labelnames))
+    
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, help_text, labelnames, buckets))
+    
+    def gauge(self, name, help_text, labelnames, callback, type='gauge'):
+        if name in self._metrics or any(gauge.name == name for gauge in self._gauges):
+            raise ValueError(f'指标 {name} 已注册')
+        gauge = Gauge(name, help_text, labelnames, callback, type)
+        self._gauges.append(gauge)
+        return gauge
+    
+    def collect(self):
+        """合并各线程分片，返回 {(指标名, 标签取值): 值}"""
+        with self._lock:
+            totals = {}
+            self._merge_into(totals, self._retired)
+            for shard in self._shards:
+                self._merge_into(totals, shard.values)
+        return totals
+    
+    def expose(self):
+        """Prometheus 文本格式"""
+        totals = self.collect()
+        by_metric = {}
+        for (name, labels), value in totals.items():
+            by_metric.setdefault(name, []).append((labels, value))
+        
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.append(f'# HELP {name} {metric.help}')
+            lines.append(f'# TYPE {name} {metric.type}')
+            for labels, value in sorted(by_metric.get(name, [])):
+                for sample, label_text, sample_value in metric._samples(labels, value):
+                    lines.append(f'{sample}{label_text} {_format_value(sample_value)}')
+        for gauge in self._gauges:
+            try:
+                values = gauge.callback()
+            except Exception:
+                # 数据来源不可用（如未构建的索引）时跳过，不影响其他指标
+                continue
+            lines.append(f'# HELP {gauge.name} {gauge.help}')
+            lines.append(f'# TYPE {gauge.name} {gauge.type}')
+            for labels, value in sorted(values.items()):
+                if value is None:
+                    continue
+                lines.append(f'{gauge.name}{_format_labels(gauge.labelnames, labels)} {_format_value(float(value))}')
+        return '\n'.join(lines) + '\n'
+
+
+def error_class(message):
+    """
+    DatabaseError 的消息类别：取第一个冒号之前的部分（如“获取图书失败”），
+    避免把具体的错误信息作为标签导致标签取值无限增长
+    """
+    text = str(message)
+    for separator in (':', '：'):
+        text = text.split(separator, 1)[0]
+    return text.strip()[:40] or 'unknown'
+
+
+def instrument_methods(obj, duration, errors, error_type, exclude=()):
+    """
+    为 obj 的公开方法记录耗时（duration 直方图，标签 method）和 error_type 异常次数
+    （errors 计数器，标签 method、error）
+    
+    生成器方法（如逐批导出）只在调用时返回生成器，不计时。
+    """
+    for name, method in inspect.getmembers(obj, inspect.ismethod):
+        if name.startswith('_') or name in exclude or inspect.isgeneratorfunction(method):
+            continue
+        setattr(obj, name, _instrumented(method, name, duration, errors, error_type))
+
+
+def _instrumented(method, name, duration, errors, error_type):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        except error_type as e:
+            errors.inc(name, error_class(e))
+            raise
+        finally:
+            duration.observe(time.perf_counter() - started, name)
+    return wrapper
+
+
+def count_rows(batches, counter, *labels):
+    """逐批产出的同时累加行数"""
+    for batch in batches:
+        counter.inc(*labels, amount=len(batch))
+        yield batch
@@ -4,6 +4,6 @@
 提供数据库连接和操作功能
 """
 
-from .db import BookDB, DatabaseError
+from .db import BookDB, DatabaseError, InvalidCursorError, InvalidWatermarkError
 
-__all__ = ['BookDB', 'DatabaseError']
+__all__ = ['BookDB', 'DatabaseError', 'InvalidCursorError', 'InvalidWatermarkError']
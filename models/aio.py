@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""
+异步数据库访问模块
+在有界线程池中执行 BookDB 的读取方法（pymssql 和 sqlite3 都没有异步驱动），供异步代码 await；
+统计、分页计数和相关图书中彼此独立的查询并发执行，各占一个连接。
+同步的视图通过 call() 调用：需要并发查询时才启动事件循环，否则直接在请求线程中执行同步版本
+"""
+
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .db import _summarize_statistics
+
+# 提供异步版本的读取方法（直接在线程池中执行同名的同步方法）
+READ_METHODS = (
+    'get_all_books',
+    'get_book_by_id',
+    'get_books_count',
+    'get_books_paginated',
+    'get_books_advanced_filter',
+    'get_filter_options',
+    'suggest_filter_values',
+    'search_books',
+)
+
+
+class AsyncBookDB:
+    """
+    BookDB 的异步包装
+    
+    - 每次调用在线程池中执行，并带上调用方的上下文变量（读写分离的主库固定等）；
+      数据库访问先计入任务自己的统计，完成后合并到请求的统计，并发的任务不会同时修改同一份统计
+    - 给出 profiler（见 profiler.py）时，任务线程的调用栈和 CPU 时间归入调用方正在处理的路由
+    - max_workers 默认等于连接池的最大连接数：更多的线程只会等待借出连接
+    - 线程池按需创建线程，随进程一起结束；fork 前应调用 close()
+    """
+    
+    def __init__(self, db, max_workers=None, profiler=None):
+        self.db = db
+        self.profiler = profiler
+        self.max_workers = max_workers or db.config.get('pool', {}).get('max_size', 10)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='bookdb')
+        self._lock = threading.Lock()
+        self._statistics_load = None
+    
+    def call(self, name, *args, **kwargs):
+        """
+        在请求线程中调用 name 方法并返回结果
+        
+        需要并发执行多条查询时（见 _fans_out）在新的事件循环中运行异步版本，
+        否则直接调用 BookDB 的同步方法，省去事件循环和线程切换的开销。
+        """
+        if self._fans_out(name, kwargs):
+            return asyncio.run(getattr(self, name)(*args, **kwargs))
+        return getattr(self.db, name)(*args, **kwargs)
+    
+    def _fans_out(self, name, kwargs):
+        db = self.db
+        if name == 'get_statistics':
+            return db.statistics_aggregator is None and not db.statistics_cache.fresh()
+        if name == 'get_books_page':
+            return bool(kwargs.get('cursor')) and kwargs.get('with_total', True)
+        if name == 'get_related_books':
+            return db.related_index is None
+        return False
+    
+    async def run(self, func, *args, **kwargs):
+        """在线程池中执行 func(*args, **kwargs)"""
+        context = contextvars.copy_context()
+        instrumentation = self.db.instrumentation
+        parent = instrumentation.current()
+        stats = None
+        if parent is not None:
+            # 复制的上下文只由本任务使用，在其中换上任务自己的统计
+            context.run(instrumentation.begin)
+            stats = context.run(instrumentation.current)
+        label = self.profiler.current() if self.profiler is not None else None
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._executor, functools.partial(context.run, self._call, label, func, args, kwargs)
+            )
+        finally:
+            if stats is not None:
+                # 在事件循环线程中合并，同一请求的各任务依次合并
+                parent.merge(stats)
+    
+    def _call(self, label, func, args, kwargs):
+        if label is None:
+            return func(*args, **kwargs)
+        token = self.profiler.enter_task(label)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.profiler.leave(token)
+    
+    async def get_statistics(self):
+        """
+        获取统计数据
+        
+        缓存有效或开启增量统计时与同步版本相同；否则按出版社分组的聚合和最受欢迎图书两条查询并发执行。
+        同时未命中缓存的请求（可能在不同线程的事件循环中）合并为一次计算，其余请求等待其结果。
+        """
+        db = self.db
+        if db.statistics_aggregator is not None:
+            return await self.run(db.get_statistics)
+        cached = db.statistics_cache.peek()
+        if cached is not None:
+            return cached[0]
+        with self._lock:
+            future = self._statistics_load
+            leader = future is None
+            if leader:
+                future = self._statistics_load = Future()
+        if not leader:
+            return await asyncio.wrap_future(future)
+        try:
+            generation = db.statistics_cache.begin_load()
+            groups, popular = await asyncio.gather(
+                self.run(db._query_statistics_part, 'groups', read_only=True),
+                self.run(db._query_statistics_part, 'popular', read_only=True)
+            )
+            stats = _summarize_statistics(groups, popular)
+            db.statistics_cache.store(generation, stats)
+            future.set_result(stats)
+            return stats
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._statistics_load = None
+    
+    async def get_books_page(self, page=1, per_page=10, search=None, sort_by='book_id', sort_order='ASC',
+                             cursor=None, with_total=True):
+        """
+        分页获取图书及符合条件的总数
+        
+        键集分页并需要总数时，当前页和计数两条查询并发执行；其他情况总数随当前页一起返回，与同步版本相同。
+        """
+        db = self.db
+        if not (cursor and with_total):
+            return await self.run(db.get_books_page, page=page, per_page=per_page, search=search,
+                                  sort_by=sort_by, sort_order=sort_order, cursor=cursor, with_total=with_total)
+        result, total = await asyncio.gather(
+            self.run(db.get_books_page, page=page, per_page=per_page, search=search,
+                     sort_by=sort_by, sort_order=sort_order, cursor=cursor, with_total=False),
+            self.run(db.get_books_count, search=search)
+        )
+        result['total'] = total
+        return result
+    
+    async def get_related_books(self, book_id, limit=5):
+        """
+        获取相关图书（同作者、同出版社）
+        
+        启用相关图书索引时由内存索引给出结果，与同步版本相同；否则同作者和同出版社两条查询并发执行后拼接。
+        """
+        db = self.db
+        if db.related_index is not None:
+            return await self.run(db.get_related_books, book_id, limit)
+        book = await self.run(db.get_book_by_id, book_id)
+        if not book:
+            return []
+        by_author, by_publisher = await asyncio.gather(
+            self.run(db._query_related_books, book, 'author', limit),
+            self.run(db._query_related_books, book, 'publisher', limit)
+        )
+        return (by_author + by_publisher)[:limit]
+    
+    def close(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+
+def _read_method(name):
+    async def method(self, *args, **kwargs):
+        return await self.run(getattr(self.db, name), *args, **kwargs)
+    method.__name__ = name
+    method.__doc__ = f'在线程池中执行 BookDB.{name}'
+    return method
+
+
+for _name in READ_METHODS:
+    setattr(AsyncBookDB, _name, _read_method(_name))
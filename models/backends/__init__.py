@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+"""
+数据库后端
+BookDB 通过后端对象建立连接，并取得各数据库方言不同的 SQL 片段：
+分页子句、LIKE 转义、JSON 参数展开、带返回的删除/更新、索引管理等
+"""
+
+
+def create_backend(config):
+    """
+    根据 DB_CONFIG['backend'] 创建后端：'mssql'（默认）或 'sqlite'
+    
+    按需导入，使用 SQLite 后端时无需安装 pymssql。
+    """
+    name = config.get('backend', 'mssql')
+    if name == 'mssql':
+        from .mssql import MSSQLBackend
+        return MSSQLBackend(config)
+    if name == 'sqlite':
+        from .sqlite import SQLiteBackend
+        return SQLiteBackend(config)
+    raise ValueError(f'未知的数据库后端: {name}')
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+后端契约检查
+对一个 BookDB 实例依次调用各公开方法，确认不同后端的行为一致。
+只读写以 CT 开头的图书ID，结束时清理；用于新后端上线前和分馆终端部署后的自检（flask check-backend）。
+"""
+
+import time
+
+from ..db import DatabaseError
+
+_PREFIX = 'CT'
+
+
+def _book(number, **overrides):
+    book = {
+        'book_id': f'{_PREFIX}{number:06d}',
+        'book_name': f'契约测试图书{number}',
+        'book_isbn': f'978-7-000-{number:05d}-0',
+        'book_author': '契约作者',
+        'book_publisher': '契约测试出版社',
+        'book_price': 10.5 + number,
+        'interview_times': number,
+    }
+    book.update(overrides)
+    return book
+
+
+def _ids(books):
+    return [book['book_id'] for book in books if book['book_id'].startswith(_PREFIX)]
+
+
+def _check(condition, message):
+    if not condition:
+        raise AssertionError(message)
+
+
+def _create_and_get(db):
+    db.create_book(_book(1))
+    db.create_book(_book(2, book_name='契约_100%特价', book_author='另一作者', interview_times=50))
+    db.create_book(_book(3, book_publisher='契约[其他]出版社'))
+    book = db.get_book_by_id(f'{_PREFIX}000001')
+    _check(book is not None and book['book_name'] == '契约测试图书1', '按ID读取的图书与写入不一致')
+    _check(book['book_price'] == 11.5, f"价格应为 11.5，实际为 {book['book_price']}")
+
+
+def _duplicate(db):
+    try:
+        db.create_book(_book(1))
+    except DatabaseError as e:
+        _check('已存在' in str(e), f'重复ID的错误信息不正确: {e}')
+    else:
+        raise AssertionError('重复ID应当写入失败')
+
+
+def _update(db):
+    db.update_book(f'{_PREFIX}000001', _book(1, book_name='契约测试图书1修订'))
+    _check(db.get_book_by_id(f'{_PREFIX}000001')['book_name'] == '契约测试图书1修订', '更新后读取的书名不正确')
+    try:
+        db.update_book(f'{_PREFIX}999999', _book(999999))
+    except DatabaseError as e:
+        _check('不存在' in str(e), f'更新不存在图书的错误信息不正确: {e}')
+    else:
+        raise AssertionError('更新不存在的图书应当失败')
+
+
+def _paging(db):
+    filters = {'author': '契约作者'}
+    first = db.get_books_advanced_filter(filters, per_page=1, sort_by='interview_times', sort_order='DESC')
+    _check(first['total'] == 2, f"筛选总数应为 2，实际为 {first['total']}")
+    _check(_ids(first['books']) == [f'{_PREFIX}000003'], '按借阅次数降序的第一页不正确')
+    second = db.get_books_advanced_filter(filters, per_page=1, sort_by='interview_times', sort_order='DESC',
+                                          cursor=first['next_cursor'], with_total=False)
+    _check(_ids(second['books']) == [f'{_PREFIX}000001'], '键集分页的第二页不正确')
+
+
+def _filter_escaping(db):
+    # % _ [ 按字面匹配
+    result = db.get_books_advanced_filter({'field_search': {'field': 'book_name', 'keyword': '_100%'}})
+    _check(_ids(result['books']) == [f'{_PREFIX}000002'], '字段筛选未按字面匹配 _ 和 %')
+    result = db.get_books_advanced_filter({'publisher': '契约[其他]'})
+    _check(_ids(result['books']) == [f'{_PREFIX}000003'], '出版社筛选未按字面匹配 [')
+    result = db.get_books_advanced_filter({'author': '契约_者'})
+    _check(result['total'] == 0, '作者筛选把 _ 当作了通配符')
+    result = db.get_books_advanced_filter({'price_min': 12.5, 'price_max': 12.5, 'publisher': '契约'})
+    _check(_ids(result['books']) == [f'{_PREFIX}000002'], '价格范围筛选不正确')
+
+
+def _search(db):
+    _check(f'{_PREFIX}000002' in _ids(db.search_books('100%特价')), '搜索未找到书名包含关键词的图书')
+    _check(f'{_PREFIX}000001' in _ids(db.search_books('修订')), '搜索未反映更新后的书名')
+    _check(not _ids(db.search_books('不存在的契约关键词')), '搜索返回了不匹配的图书')
+
+
+def _statistics(db):
+    stats = db.get_statistics()
+    _check(stats['total'] >= 3, '统计总数少于已写入的图书数')
+    publishers = {item['book_publisher']: item['count'] for item in stats['publishers']}
+    # 出版社分布只包含数量最多的若干家，已有大量数据时可能不含检查用的出版社
+    _check(publishers.get('契约测试出版社', 2) == 2, '按出版社统计的数量不正确')
+
+
+def _options(db):
+    options = db.get_filter_options(with_counts=True)
+    authors = {item['value']: item['count'] for item in options['authors']}
+    _check(authors.get('契约作者') == 2, '筛选选项中的作者计数不正确')
+    suggestions = db.suggest_filter_values('publisher', '契约[')
+    _check([item['value'] for item in suggestions] == ['契约[其他]出版社'], '筛选联想未按字面匹配前缀')
+
+
+def _related(db):
+    related = _ids(db.get_related_books(f'{_PREFIX}000001'))
+    _check(related[:1] == [f'{_PREFIX}000003'], f'相关图书应优先同作者图书，实际为 {related}')
+    _check(f'{_PREFIX}000001' not in related, '相关图书包含了图书本身')
+
+
+def _import(db):
+    result = db.import_books_from_data([
+        _book(4),
+        _book(1),
+        _book(5, book_author='超长作者名' * 5),
+        _book(6),
+    ], batch_size=10)
+    _check(result['success_count'] == 2 and result['error_count'] == 2,
+           f"导入结果应为成功 2 行、失败 2 行，实际为 {result['success_count']} / {result['error_count']}")
+    _check(any('已存在' in error for error in result['errors']), '导入未报告重复的图书ID')
+    _check(db.get_book_by_id(f'{_PREFIX}000006') is not None, '同一批次中的有效行未写入')
+
+
+def _iter_and_delete(db):
+    exported = [book['book_id'] for batch in db.iter_books({'publisher': '契约'}, batch_size=2) for book in batch]
+    _check(exported == sorted(exported) and len(exported) == 5, f'逐批导出的结果不正确: {exported}')
+    _check(db.delete_books_batch([f'{_PREFIX}000004', f'{_PREFIX}000006']) == 2, '批量删除的数量不正确')
+    db.delete_book(f'{_PREFIX}000003')
+    _check(db.get_book_by_id(f'{_PREFIX}000003') is None, '删除后仍能读到图书')
+
+
+CHECKS = [
+    ('新增与读取', _create_and_get),
+    ('重复ID', _duplicate),
+    ('更新', _update),
+    ('偏移与键集分页', _paging),
+    ('筛选转义', _filter_escaping),
+    ('搜索', _search),
+    ('统计', _statistics),
+    ('筛选选项', _options),
+    ('相关图书', _related),
+    ('批量导入', _import),
+    ('导出与删除', _iter_and_delete),
+]
+
+
+def _cleanup(db):
+    db.delete_books_batch([_book(number)['book_id'] for number in range(1, 7)])
+
+
+def run_contract(db):
+    """
+    依次执行各项检查，返回 [{'name', 'passed', 'elapsed', 'error'}]
+    
+    某项失败后其余检查仍会执行（可能因数据不完整连带失败）；开始前和结束时删除检查用到的图书。
+    """
+    results = []
+    _cleanup(db)
+    try:
+        for name, check in CHECKS:
+            started = time.perf_counter()
+            error = None
+            try:
+                check(db)
+            except Exception as e:
+                error = str(e) or e.__class__.__name__
+            results.append({
+                'name': name,
+                'passed': error is None,
+                'elapsed': round(time.perf_counter() - started, 4),
+                'error': error,
+            })
+    finally:
+        _cleanup(db)
+    return results
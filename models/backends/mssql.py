@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+SQL Server 后端（pymssql）
+"""
+
+import pymssql
+
+from ..schema import (
+    BOOK_COLUMNS, BOOK_INDEXES, INDEX_COLUMNS_SQL, INDEX_USAGE_SQL,
+    check_index, create_index_sql, parse_index_columns,
+)
+from ..search import create_search_engine
+from ..statements import PLAN_CACHE_SQL
+
+
+class MSSQLBackend:
+    """
+    SQL Server 后端
+    
+    原有的 T-SQL 写法集中在这里：TOP/OFFSET 分页、[%] 转义、OPENJSON、OUTPUT 子句、
+    ROWVERSION 水位和 DMV 统计。
+    """
+    
+    name = 'mssql'
+    IntegrityError = pymssql.IntegrityError
+    OperationalError = pymssql.OperationalError
+    
+    # 单条语句最多 2100 个参数
+    max_params = 2100
+    # 一次往返可执行多条语句并通过 nextset() 取多个结果集
+    multiple_result_sets = True
+    # 支持 sp_executesql 参数化执行（语句模板缓存）
+    parameterized_statements = True
+    
+    like = "LIKE %s"
+    money_param = "CAST(%s AS MONEY)"
+    # JSON 数组参数展开为 (book_id, rank)
+    json_ids = "SELECT CAST([value] AS CHAR(8)) AS book_id, CAST([key] AS INT) AS rank FROM OPENJSON(%s)"
+    watermark_sql = "SELECT CONVERT(CHAR(16), MIN_ACTIVE_ROWVERSION(), 2)"
+    plan_cache_sql = PLAN_CACHE_SQL
+    index_usage_sql = INDEX_USAGE_SQL
+    
+    def __init__(self, config):
+        self.config = config
+    
+    def connect(self, target=None):
+        """建立物理连接；target 为只读副本配置，未给出的项沿用主库配置"""
+        target = target or {}
+        return pymssql.connect(
+            server=target.get('server', self.config['server']),
+            database=target.get('database', self.config['database']),
+            charset=target.get('charset', self.config['charset']),
+            login_timeout=target.get('login_timeout', self.config.get('login_timeout', 60))
+        )
+    
+    def create_search_engine(self, config, loader, connect):
+        """搜索引擎：'like' 或 'ngram'（见 models/search.py）"""
+        return create_search_engine(config, loader)
+    
+    @staticmethod
+    def escape_like(value):
+        """转义 LIKE 查询中的特殊字符"""
+        return value.replace('[', '[[]').replace('%', '[%]').replace('_', '[_]')
+    
+    @staticmethod
+    def paginate(offset, limit):
+        """分页子句（跟在 ORDER BY 之后）及其参数"""
+        return "OFFSET %s ROWS FETCH NEXT %s ROWS ONLY", [offset, limit]
+    
+    @staticmethod
+    def watermark_condition(column, op):
+        return f"{column} {op} CONVERT(BINARY(8), %s, 2)"
+    
+    def is_duplicate_error(self, error):
+        return isinstance(error, pymssql.IntegrityError)
+    
+    def delete_returning(self, cursor, condition, params):
+        """删除满足条件的图书，返回被删除的记录"""
+        columns = ', '.join(f'DELETED.{column}' for column in BOOK_COLUMNS)
+        cursor.execute(f"DELETE FROM book OUTPUT {columns} WHERE {condition}", tuple(params))
+        return cursor.fetchall()
+    
+    def update_returning_old(self, cursor, assignments, params, condition, condition_params):
+        """更新满足条件的图书，返回更新前的记录（OUTPUT DELETED）"""
+        columns = ', '.join(f'DELETED.{column}' for column in BOOK_COLUMNS)
+        cursor.execute(
+            f"UPDATE book SET {assignments} OUTPUT {columns} WHERE {condition}",
+            tuple(params) + tuple(condition_params)
+        )
+        return cursor.fetchall()
+    
+    def ensure_indexes(self, conn, create=True):
+        """检查覆盖索引（见 models/schema.py），create 为 True 时创建缺失的索引"""
+        cursor = conn.cursor(as_dict=True)
+        cursor.execute(INDEX_COLUMNS_SQL)
+        existing = parse_index_columns(cursor.fetchall())
+        
+        report = []
+        for name, key_columns in BOOK_INDEXES.items():
+            status = check_index(name, key_columns, existing)
+            sql = create_index_sql(name, key_columns)
+            if status == 'missing' and create:
+                cursor.execute(sql)
+                conn.commit()
+                status = 'created'
+            report.append({'name': name, 'status': status, 'sql': sql})
+        return report
@@ -0,0 +1,315 @@
+# -*- coding: utf-8 -*-
+"""
+SQLite 后端（标准库 sqlite3）
+用于分馆自助终端等无 SQL Server 的本地部署和压测：WAL 模式、与 SQL Server 一致的索引、
+FTS5 trigram 全文索引（由触发器随写入维护）
+"""
+
+import re
+import sqlite3
+import threading
+import uuid
+from decimal import Decimal
+from functools import lru_cache
+
+from ..schema import BOOK_COLUMNS, BOOK_INDEXES
+from ..search import SEARCH_FIELDS, create_search_engine
+
+# MONEY 参数（Decimal）按 REAL 存储和比较
+sqlite3.register_adapter(Decimal, float)
+
+_PLACEHOLDER = re.compile(r'%[s%]')
+
+BOOK_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS book (
+        book_id          TEXT    NOT NULL COLLATE NOCASE PRIMARY KEY CHECK (length(book_id) <= 8),
+        book_name        TEXT    NOT NULL COLLATE NOCASE CHECK (length(book_name) <= 50),
+        book_isbn        TEXT    NOT NULL COLLATE NOCASE CHECK (length(book_isbn) <= 17),
+        book_author      TEXT    NOT NULL COLLATE NOCASE CHECK (length(book_author) <= 10),
+        book_publisher   TEXT    NOT NULL COLLATE NOCASE CHECK (length(book_publisher) <= 50),
+        book_price       REAL    NOT NULL,
+        interview_times  INTEGER NOT NULL CHECK (interview_times BETWEEN -32768 AND 32767)
+    )
+"""
+
+# 外部内容 FTS5 表：只保存索引，文本从 book 表按 rowid 读取
+FTS_SQL = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS book_fts USING fts5(
+        book_id UNINDEXED, book_name, book_isbn, book_author, book_publisher,
+        content='book', content_rowid='rowid', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_fts_insert AFTER INSERT ON book BEGIN
+        INSERT INTO book_fts (rowid, book_id, book_name, book_isbn, book_author, book_publisher)
+        VALUES (new.rowid, new.book_id, new.book_name, new.book_isbn, new.book_author, new.book_publisher);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_fts_delete AFTER DELETE ON book BEGIN
+        INSERT INTO book_fts (book_fts, rowid, book_id, book_name, book_isbn, book_author, book_publisher)
+        VALUES ('delete', old.rowid, old.book_id, old.book_name, old.book_isbn, old.book_author, old.book_publisher);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS book_fts_update AFTER UPDATE ON book BEGIN
+        INSERT INTO book_fts (book_fts, rowid, book_id, book_name, book_isbn, book_author, book_publisher)
+        VALUES ('delete', old.rowid, old.book_id, old.book_name, old.book_isbn, old.book_author, old.book_publisher);
+        INSERT INTO book_fts (rowid, book_id, book_name, book_isbn, book_author, book_publisher)
+        VALUES (new.rowid, new.book_id, new.book_name, new.book_isbn, new.book_author, new.book_publisher);
+    END
+    """,
+)
+
+
+@lru_cache(maxsize=1024)
+def _translate(sql):
+    """将 pymssql 风格的 %s 占位符转换为 sqlite3 的 ?（%% 还原为 %）"""
+    return _PLACEHOLDER.sub(lambda match: '%' if match.group() == '%%' else '?', sql)
+
+
+class SQLiteCursor:
+    """与 pymssql 游标接口一致的包装：%s 占位符，as_dict=True 时返回字典"""
+    
+    def __init__(self, cursor, as_dict=False):
+        self._cursor = cursor
+        self._as_dict = as_dict
+    
+    @property
+    def connection(self):
+        return self._cursor.connection
+    
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+    
+    def execute(self, sql, params=()):
+        self._cursor.execute(_translate(sql), tuple(params or ()))
+    
+    def _row(self, row):
+        if row is None or not self._as_dict:
+            return row
+        return dict(zip((column[0] for column in self._cursor.description), row))
+    
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+    
+    def fetchmany(self, size):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+    
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+    
+    def nextset(self):
+        # SQLite 每次只执行一条语句，没有后续结果集
+        return None
+    
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    """与 pymssql 连接接口一致的包装"""
+    
+    def __init__(self, conn):
+        self._conn = conn
+    
+    def cursor(self, as_dict=False):
+        return SQLiteCursor(self._conn.cursor(), as_dict=as_dict)
+    
+    def commit(self):
+        self._conn.commit()
+    
+    def rollback(self):
+        self._conn.rollback()
+    
+    def close(self):
+        self._conn.close()
+
+
+class Fts5SearchEngine:
+    """
+    基于 FTS5 trigram 索引的搜索
+    
+    索引由数据库触发器随写入维护，本进程不保存任何数据；
+    关键词不足 3 个字符时 trigram 无法匹配，退回 LIKE。结果按 bm25 相关度排序。
+    """
+    
+    uses_index = True
+    
+    def __init__(self, connect):
+        self._connect = connect
+    
+    def search(self, keyword, fields=None):
+        keyword = (keyword or '').strip()
+        if not keyword:
+            return []
+        fields = [field for field in (fields or SEARCH_FIELDS) if field in SEARCH_FIELDS]
+        conn = self._connect()
+        try:
+            cursor = conn.cursor()
+            if len(keyword) >= 3:
+                query = '{' + ' '.join(fields) + '} : "' + keyword.replace('"', '""') + '"'
+                cursor.execute("SELECT book_id FROM book_fts WHERE book_fts MATCH %s ORDER BY rank", (query,))
+            else:
+                pattern = '%' + SQLiteBackend.escape_like(keyword) + '%'
+                condition = ' OR '.join(f"{field} {SQLiteBackend.like}" for field in fields)
+                cursor.execute(f"SELECT book_id FROM book WHERE {condition} ORDER BY book_id",
+                               [pattern] * len(fields))
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            conn.close()
+    
+    def on_books_changed(self, changes):
+        # 索引由触发器维护
+        pass
+    
+    def stats(self):
+        return {'engine': 'fts5'}
+
+
+class SQLiteBackend:
+    """
+    SQLite 后端
+    
+    - path 为数据库文件路径；':memory:' 为进程内共享的内存数据库（用于测试和压测）
+    - 首次连接时建表、建索引（与 SQL Server 的覆盖索引同名同键列），fts 为 True 时建立 FTS5 索引
+    - 连接开启 WAL 模式，读写互不阻塞
+    """
+    
+    name = 'sqlite'
+    IntegrityError = sqlite3.IntegrityError
+    OperationalError = sqlite3.OperationalError
+    
+    max_params = 32766
+    multiple_result_sets = False
+    parameterized_statements = False
+    
+    like = "LIKE %s ESCAPE '\\'"
+    money_param = "%s"
+    json_ids = "SELECT value AS book_id, key AS rank FROM json_each(%s)"
+    # 不支持变更水位增量导出、计划缓存和索引使用统计
+    watermark_sql = None
+    plan_cache_sql = None
+    index_usage_sql = None
+    
+    def __init__(self, config):
+        self.config = config
+        sqlite_config = config.get('sqlite', {})
+        self.path = sqlite_config.get('path', 'jy_books.db')
+        self.timeout = sqlite_config.get('timeout', 30)
+        self.fts = sqlite_config.get('fts', True)
+        self._initialized = set()
+        self._lock = threading.Lock()
+        self._keepalive = {}
+    
+    def connect(self, target=None):
+        """建立物理连接；target 为只读副本配置（可指定 path）"""
+        path = (target or {}).get('path', self.path)
+        uri = False
+        if path == ':memory:':
+            # 每个连接默认是独立的内存库，改用共享缓存的命名内存库，并保持一个连接不关闭
+            path = self._memory_uri(path)
+            uri = True
+        conn = sqlite3.connect(path, timeout=self.timeout, check_same_thread=False, uri=uri)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        self._initialize(conn, path)
+        return SQLiteConnection(conn)
+    
+    def _memory_uri(self, path):
+        with self._lock:
+            if path not in self._keepalive:
+                uri = f'file:jybooks-{uuid.uuid4().hex}?mode=memory&cache=shared'
+                self._keepalive[path] = (uri, sqlite3.connect(uri, uri=True, check_same_thread=False))
+            return self._keepalive[path][0]
+    
+    def _initialize(self, conn, path):
+        with self._lock:
+            if path in self._initialized:
+                return
+            conn.execute(BOOK_TABLE_SQL)
+            for name, key_columns in BOOK_INDEXES.items():
+                conn.execute(self._create_index_sql(name, key_columns, if_not_exists=True))
+            if self.fts:
+                for sql in FTS_SQL:
+                    conn.execute(sql)
+            conn.commit()
+            self._initialized.add(path)
+    
+    @staticmethod
+    def _create_index_sql(name, key_columns, if_not_exists=False):
+        keys = ', '.join(f'{column} {direction}' for column, direction in key_columns)
+        exists = 'IF NOT EXISTS ' if if_not_exists else ''
+        return f"CREATE INDEX {exists}{name} ON book ({keys})"
+    
+    def create_search_engine(self, config, loader, connect):
+        """search.engine 为 'fts5' 时使用 FTS5 索引，否则与 SQL Server 相同"""
+        if config.get('engine') == 'fts5':
+            if not self.fts:
+                raise ValueError('使用 fts5 搜索需要开启 sqlite.fts')
+            return Fts5SearchEngine(connect)
+        return create_search_engine(config, loader)
+    
+    @staticmethod
+    def escape_like(value):
+        """转义 LIKE 查询中的特殊字符（配合 ESCAPE '\\'）"""
+        return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    
+    @staticmethod
+    def paginate(offset, limit):
+        """分页子句（跟在 ORDER BY 之后）及其参数"""
+        return "LIMIT %s OFFSET %s", [limit, offset]
+    
+    def is_duplicate_error(self, error):
+        return isinstance(error, sqlite3.IntegrityError) and 'UNIQUE' in str(error)
+    
+    def delete_returning(self, cursor, condition, params):
+        """删除满足条件的图书，返回被删除的记录（RETURNING，需要 SQLite 3.35+）"""
+        cursor.execute(f"DELETE FROM book WHERE {condition} RETURNING {', '.join(BOOK_COLUMNS)}", tuple(params))
+        return cursor.fetchall()
+    
+    def update_returning_old(self, cursor, assignments, params, condition, condition_params):
+        """
+        更新满足条件的图书，返回更新前的记录
+        
+        RETURNING 只能返回新值，因此先以 BEGIN IMMEDIATE 取得写锁，再读旧值、执行更新。
+        """
+        if not cursor.connection.in_transaction:
+            cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute(f"SELECT {', '.join(BOOK_COLUMNS)} FROM book WHERE {condition}", tuple(condition_params))
+        old_books = cursor.fetchall()
+        if old_books:
+            cursor.execute(f"UPDATE book SET {assignments} WHERE {condition}",
+                           tuple(params) + tuple(condition_params))
+        return old_books
+    
+    def ensure_indexes(self, conn, create=True):
+        """检查索引（键列与 SQL Server 的覆盖索引一致，SQLite 不支持 INCLUDE 列）"""
+        cursor = conn.cursor(as_dict=True)
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'book'")
+        names = [row['name'] for row in cursor.fetchall()]
+        existing = {}
+        for name in names:
+            cursor.execute(f"PRAGMA index_xinfo('{name}')")
+            existing[name] = [
+                (row['name'], 'DESC' if row['desc'] else 'ASC')
+                for row in cursor.fetchall() if row['key']
+            ]
+        
+        report = []
+        for name, key_columns in BOOK_INDEXES.items():
+            sql = self._create_index_sql(name, key_columns)
+            if name not in existing:
+                status = 'missing'
+                if create:
+                    cursor.execute(sql)
+                    conn.commit()
+                    status = 'created'
+            elif existing[name] != list(key_columns):
+                status = 'mismatch'
+            else:
+                status = 'ok'
+            report.append({'name': name, 'status': status, 'sql': sql})
+        return report
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+缓存模块
+提供进程内缓存，配合 BookDB 的写入监听实现写入即失效
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+
+class CachedValue:
+    """
+    带过期时间的单值缓存
+    
+    - 过期或失效后由第一个读取者重新计算，其他并发读取者等待结果，避免重复查询
+    - 实现 on_books_changed，注册为写入监听者后数据变更即失效
+    - ttl 为 None 表示只依赖失效通知，不按时间过期
+    """
+    
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._value = None
+        self._loaded_at = None
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, loader):
+        """返回缓存值；缓存无效时调用 loader() 重新计算"""
+        value = self._peek()
+        if value is not None:
+            return value[0]
+        
+        with self._load_lock:
+            # 等待期间其他线程可能已经完成计算
+            value = self._peek(count=False)
+            if value is not None:
+                return value[0]
+            generation = self.begin_load()
+            result = loader()
+            self.store(generation, result)
+            return result
+    
+    def peek(self):
+        """返回 (缓存值,)，缓存无效时返回 None（不等待、不计算）"""
+        return self._peek()
+    
+    def fresh(self):
+        """缓存当前是否有效（不计入命中统计）"""
+        return self._peek(count=False) is not None
+    
+    def begin_load(self):
+        """
+        开始一次重新计算，返回当前的失效代数，计算完成后连同结果交给 store()
+        
+        供不能在 get() 的锁内计算的调用者（如 models/aio.py 中并发执行的查询）使用，
+        并发的重新计算由调用者自行合并。
+        """
+        with self._lock:
+            self.misses += 1
+            return self._generation
+    
+    def store(self, generation, result):
+        with self._lock:
+            # 计算期间发生了失效，结果可能已过时，本次返回但不缓存
+            if generation == self._generation:
+                self._value = result
+                self._loaded_at = time.monotonic()
+    
+    def _peek(self, count=True):
+        with self._lock:
+            if self._loaded_at is None:
+                return None
+            if self.ttl is not None and time.monotonic() - self._loaded_at > self.ttl:
+                return None
+            if count:
+                self.hits += 1
+            return (self._value,)
+    
+    def invalidate(self):
+        """使缓存失效"""
+        with self._lock:
+            self._generation += 1
+            self._value = None
+            self._loaded_at = None
+    
+    def on_books_changed(self, changes):
+        self.invalidate()
+    
+    def stats(self):
+        """返回命中/未命中次数"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'cached': self._loaded_at is not None,
+            }
+
+
+class LRUCache:
+    """
+    按键缓存的 LRU，带过期时间和容量上限
+    
+    - 超过 max_size 时淘汰最久未使用的条目；ttl 为 None 表示不按时间过期
+    - 实现 on_books_changed，按变更记录的 book_id 精确失效对应条目
+    - loader 返回 None 时不缓存（不存在的键每次都重新查询）
+    """
+    
+    def __init__(self, max_size=1000, ttl=300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key, loader, cache_if=None):
+        """
+        返回缓存值；未命中或已过期时调用 loader(key)，
+        结果不为 None 且满足 cache_if(结果)（未指定时总是满足）时写入缓存
+        """
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                value, loaded_at = item
+                if self.ttl is None or time.monotonic() - loaded_at <= self.ttl:
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._items[key]
+            self.misses += 1
+            generation = self._generation
+        
+        value = loader(key)
+        if value is not None and (cache_if is None or cache_if(value)):
+            self.put(key, value, generation)
+        return value
+    
+    def put(self, key, value, generation=None):
+        """
+        写入缓存
+        
+        generation 为读取前的失效代数：读取期间发生过失效时结果可能已过时，不写入。
+        """
+        if self.max_size is not None and self.max_size <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._items[key] = (value, time.monotonic())
+            self._items.move_to_end(key)
+            while self.max_size is not None and len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+                self.evictions += 1
+    
+    def invalidate(self, key):
+        """使指定键失效"""
+        with self._lock:
+            self._generation += 1
+            self._items.pop(key, None)
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._generation += 1
+            self._items.clear()
+    
+    def on_books_changed(self, changes):
+        with self._lock:
+            self._generation += 1
+            for old, new in changes:
+                for book in (old, new):
+                    if book is not None:
+                        self._items.pop(str(book['book_id']).rstrip(), None)
+    
+    def stats(self):
+        """返回命中/未命中/淘汰次数和当前条目数"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._items),
+                'max_size': self.max_size,
+            }
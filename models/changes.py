@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+"""
+跨进程写入通知模块
+多进程部署（server.py 的多个工作进程）中，内存索引、统计聚合和缓存都在各进程内维护。
+各进程提交写入后把变更（旧记录, 新记录）追加到共享目录下的日志文件，其他进程在处理请求前读取新增的变更，
+交给各自的写入监听者，使进程内的数据与其他进程的写入保持一致。
+"""
+
+import json
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows：没有 fcntl，改用 msvcrt 对锁文件的第一个字节加锁
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+LOG_NAME = 'changes.log'
+# 日志换用新文件时，旧文件改名为该名称（只保留一个），读取较慢的进程从中读完剩余的变更
+ROTATED_NAME = 'changes.log.1'
+LOCK_NAME = 'changes.lock'
+
+
+class ChangeFeed:
+    """
+    共享日志文件上的写入通知
+    
+    - publish(changes)：追加一行 {"origin": 进程标识, "changes": [[旧记录, 新记录], ...]}（持有写锁，整行一次写入）
+    - poll()：返回其他进程追加的新变更；只读取到最后一个完整的行
+    - 日志超过 max_bytes 时由写入者换用新文件；读取者落后超过一个文件时无法补齐，poll() 抛出 ChangeFeedGap，
+      调用者应全量重建进程内的数据
+    - fork 后调用 after_fork() 更换进程标识（子进程从父进程的读取位置继续）
+    """
+    
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._path = os.path.join(directory, LOG_NAME)
+        self._rotated_path = os.path.join(directory, ROTATED_NAME)
+        self._lock_path = os.path.join(directory, LOCK_NAME)
+        self._lock = threading.Lock()
+        self.origin = uuid.uuid4().hex
+        # 从当前日志末尾开始读取：此前的变更已反映在本进程从数据库构建的数据中
+        with open(self._path, 'ab') as f:
+            stat = os.fstat(f.fileno())
+        self._inode = stat.st_ino
+        self._offset = stat.st_size
+        self.published = 0
+        self.received = 0
+    
+    def after_fork(self):
+        self.origin = uuid.uuid4().hex
+        self._lock = threading.Lock()
+    
+    def publish(self, changes):
+        line = json.dumps({'origin': self.origin, 'changes': changes}, ensure_ascii=False,
+                          separators=(',', ':')).encode('utf-8') + b'\n'
+        with _exclusive_lock(self._lock_path):
+            if os.path.exists(self._path) and os.path.getsize(self._path) >= self.max_bytes:
+                os.replace(self._path, self._rotated_path)
+            with open(self._path, 'ab') as f:
+                f.write(line)
+        self.published += 1
+    
+    def poll(self):
+        """返回其他进程追加的变更列表 [(旧记录, 新记录), ...]"""
+        with self._lock:
+            try:
+                stat = os.stat(self._path)
+            except FileNotFoundError:
+                return []
+            if stat.st_ino == self._inode and stat.st_size == self._offset:
+                return []
+            changes = []
+            if stat.st_ino != self._inode:
+                # 日志已换用新文件：先读完旧文件中剩余的变更
+                if not self._read_rotated(changes):
+                    self._inode, self._offset = stat.st_ino, 0
+                    raise ChangeFeedGap('写入通知日志已轮换多次，无法补齐其他进程的变更')
+                self._inode, self._offset = stat.st_ino, 0
+            self._offset = self._read(self._path, self._offset, changes)
+            self.received += len(changes)
+            return changes
+    
+    def _read_rotated(self, changes):
+        try:
+            if os.stat(self._rotated_path).st_ino != self._inode:
+                return False
+        except FileNotFoundError:
+            return False
+        self._read(self._rotated_path, self._offset, changes)
+        return True
+    
+    def _read(self, path, offset, changes):
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                logger.warning('跳过无法解析的写入通知: %r', line[:200])
+                continue
+            if entry.get('origin') != self.origin:
+                changes.extend((old, new) for old, new in entry['changes'])
+        return offset + end
+    
+    def stats(self):
+        return {
+            'directory': self.directory,
+            'published': self.published,
+            'received': self.received,
+        }
+
+
+@contextmanager
+def _exclusive_lock(path):
+    """跨进程排他锁（持有期间其他进程的 publish 等待）"""
+    with open(path, 'a+b') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+            return
+        lock.seek(0)
+        while True:
+            try:
+                # LK_LOCK 最多重试约 10 秒，仍未取得时抛出 OSError，继续等待
+                msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                break
+            except OSError:
+                continue
+        try:
+            yield
+        finally:
+            lock.seek(0)
+            msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ChangeFeedGap(Exception):
+    """读取落后太多，丢失了部分变更"""
+    pass
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+CSV导入解析模块
+从上传文件的二进制流中逐行解析图书数据，内存占用与文件大小无关
+"""
+
+import codecs
+import csv
+import io
+
+# 依次尝试的编码
+ENCODINGS = ('utf-8-sig', 'utf-8', 'gbk', 'gb2312', 'gb18030')
+
+# 识别编码时读取的文件头部字节数
+SNIFF_SIZE = 64 * 1024
+
+
+class CSVFormatError(Exception):
+    """无法识别的CSV文件"""
+    pass
+
+
+class ImportErrors:
+    """导入错误记录：计数不受限制，只保留前 limit 条错误信息"""
+    
+    def __init__(self, limit=1000):
+        self.limit = limit
+        self.count = 0
+        self.messages = []
+    
+    def add(self, message):
+        self.count += 1
+        if self.limit is None or len(self.messages) < self.limit:
+            self.messages.append(message)
+
+
+def detect_encoding(prefix):
+    """
+    根据文件头部字节识别编码
+    
+    使用增量解码器解码，头部截断在多字节字符中间时不会误判；
+    能够解码且表头包含“图书ID”或“book_id”的第一个编码即为结果，都不满足时返回 None。
+    """
+    for encoding in ENCODINGS:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            text = decoder.decode(prefix, final=False)
+        except (UnicodeDecodeError, UnicodeError):
+            continue
+        header = next(csv.reader(io.StringIO(text)), None)
+        if header:
+            header_str = ','.join(header)
+            if '图书ID' in header_str or 'book_id' in header_str:
+                return encoding
+    return None
+
+
+def open_csv(binary_stream):
+    """
+    打开上传的CSV文件，返回 (文本流, 编码)
+    
+    只读取头部 SNIFF_SIZE 字节识别编码，随后在原始流上逐块解码，不整体读入内存。
+    """
+    prefix = binary_stream.read(SNIFF_SIZE)
+    binary_stream.seek(0)
+    encoding = detect_encoding(prefix)
+    if encoding is None:
+        raise CSVFormatError('无法识别CSV文件编码，请确保文件为UTF-8或GBK编码')
+    return io.TextIOWrapper(binary_stream, encoding=encoding, newline=''), encoding
+
+
+def parse_book_row(row):
+    """将CSV行映射为图书数据（兼容中文表头和英文字段名）"""
+    return {
+        'book_id': row.get('图书ID', row.get('book_id', '')).strip(),
+        'book_name': row.get('图书名称', row.get('book_name', '')).strip(),
+        'book_isbn': row.get('ISBN', row.get('book_isbn', '')).strip(),
+        'book_author': row.get('作者', row.get('book_author', '')).strip(),
+        'book_publisher': row.get('出版社', row.get('book_publisher', '')).strip(),
+        'book_price': float(row.get('价格', row.get('book_price', 0))),
+        'interview_times': int(row.get('借阅次数', row.get('interview_times', 0)))
+    }
+
+
+def iter_books(text_stream, errors):
+    """
+    逐行解析CSV，生成 (行号, 图书数据)
+    
+    行号从2开始（第1行是表头）；格式错误的行记入 errors 并跳过。
+    """
+    reader = csv.DictReader(text_stream)
+    for idx, row in enumerate(reader, 2):
+        try:
+            book_data = parse_book_row(row)
+        except (ValueError, KeyError, AttributeError) as e:
+            errors.add(f"第{idx}行: 数据格式错误 - {str(e)}")
+            continue
+        
+        # 验证必填字段
+        if not book_data['book_id'] or not book_data['book_name']:
+            errors.add(f"第{idx}行: 图书ID或图书名称为空")
+            continue
+        
+        yield idx, book_data
@@ -4,8 +4,28 @@
 提供对book表的CRUD操作
 """
 
-import pymssql
+import base64
+import functools
+import json
+import logging
+import threading
+import time
+from decimal import Decimal
+from itertools import islice
+
 from config import DB_CONFIG
+from .backends import create_backend
+from .cache import CachedValue, LRUCache
+from .instrumentation import Instrumentation
+from .pool import ConnectionPool
+from .options import ValueDictionary
+from .related import create_related_index
+from .routing import Replica, ReplicaRouter
+from .search import SEARCH_FIELDS
+from .statements import StatementCache
+from .stats import StatisticsAggregator
+
+logger = logging.getLogger(__name__)
 
 
 class DatabaseError(Exception):
@@ -18,29 +38,567 @@ class DatabaseError(Exception):
     pass
 
 
+class InvalidCursorError(DatabaseError):
+    """分页游标无效（格式错误或与当前排序条件不一致）"""
+    pass
+
+
+class InvalidWatermarkError(DatabaseError):
+    """增量导出的变更水位无效"""
+    pass
+
+
+# 允许排序的字段（白名单）
+VALID_SORT_FIELDS = ['book_id', 'book_name', 'book_price', 'interview_times', 'book_author', 'book_publisher']
+
+
+# 支持联想的筛选字段
+FILTER_OPTION_FIELDS = {
+    'publisher': 'book_publisher',
+    'author': 'book_author',
+}
+
+# 导入时写入的列（顺序即多行 INSERT 的参数顺序）
+_IMPORT_COLUMNS = (
+    'book_id', 'book_name', 'book_isbn', 'book_author',
+    'book_publisher', 'book_price', 'interview_times'
+)
+
+
+def _id_key(book_id):
+    """CHAR(8) 列比较时忽略尾部空格"""
+    return None if book_id is None else str(book_id).rstrip()
+
+
+def _import_result(total_rows, success_count, error_count, errors, started, cancelled):
+    """构造导入结果（也用于导入过程中的进度回调）"""
+    elapsed = time.perf_counter() - started
+    return {
+        'total_rows': total_rows,
+        'success_count': success_count,
+        'error_count': error_count,
+        'errors': errors,
+        'elapsed': round(elapsed, 3),
+        'rows_per_second': round(total_rows / elapsed, 1) if elapsed > 0 else None,
+        'cancelled': cancelled
+    }
+
+
+def _check_watermark(watermark):
+    """校验变更水位格式（16位十六进制），防止无效参数进入查询"""
+    watermark = str(watermark).strip()
+    if len(watermark) != 16 or any(c not in '0123456789abcdefABCDEF' for c in watermark):
+        raise InvalidWatermarkError(f"无效的变更水位: {watermark}")
+    return watermark.upper()
+
+
+def _convert_price(book):
+    """转换MONEY类型为float，便于JSON序列化"""
+    if book['book_price'] is not None:
+        book['book_price'] = float(book['book_price'])
+    return book
+
+
+def _price_param(value):
+    """价格筛选参数：转为 Decimal（按字符串转换，避免二进制浮点误差）"""
+    try:
+        price = Decimal(str(value).strip())
+    except ArithmeticError:
+        price = None
+    if price is None or not price.is_finite():
+        raise ValueError(f"无效的价格: {value}")
+    return price
+
+
+def _book_record(book_id, book_data):
+    """由写入参数构造一条完整的图书记录（用于通知写入监听者）"""
+    return {
+        'book_id': book_id,
+        'book_name': book_data['book_name'],
+        'book_isbn': book_data['book_isbn'],
+        'book_author': book_data['book_author'],
+        'book_publisher': book_data['book_publisher'],
+        'book_price': float(book_data['book_price']),
+        'interview_times': int(book_data['interview_times'])
+    }
+
+
+def encode_cursor(book, sort_by, sort_order, direction):
+    """
+    生成不透明的分页游标
+    
+    游标记录排序条件、定位行的 (sort_by, book_id) 取值和翻页方向（next/prev），
+    使用URL安全的base64编码，客户端只需原样传回。
+    """
+    value = book[sort_by]
+    if isinstance(value, (Decimal, float)):
+        value = str(value)
+    payload = {'s': sort_by, 'o': sort_order, 'v': value, 'k': book['book_id'], 'd': direction}
+    raw = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, sort_by, sort_order):
+    """解析分页游标，返回 {'value': ..., 'key': ..., 'direction': ...}"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw.decode('utf-8'))
+        direction = payload['d']
+        value = payload['v']
+        if sort_by == 'book_price':
+            value = Decimal(value)
+        elif sort_by == 'interview_times':
+            value = int(value)
+        position = {'value': value, 'key': payload['k'], 'direction': direction}
+        cursor_sort = (payload['s'], payload['o'])
+    except Exception:
+        raise InvalidCursorError("无效的分页游标")
+    if direction not in ('next', 'prev'):
+        raise InvalidCursorError("无效的分页游标")
+    if cursor_sort != (sort_by, sort_order):
+        raise InvalidCursorError("分页游标与当前排序条件不一致")
+    return position
+
+
+def _order_clause(sort_by, sort_order):
+    """排序子句，追加 book_id 作为次级排序，保证顺序稳定且与游标定位一致"""
+    if sort_by == 'book_id':
+        return f"book_id {sort_order}"
+    return f"{sort_by} {sort_order}, book_id {sort_order}"
+
+
+def _where_clause(conditions):
+    """由条件片段拼接 WHERE 子句（无条件时为空）"""
+    if not conditions:
+        return ""
+    return "WHERE " + " AND ".join(f"({c})" for c in conditions)
+
+
+def _keyset_condition(sort_by, sort_order, position):
+    """
+    构建键集分页的定位条件、参数和排序子句
+    
+    条件写成 "col >= v AND (col > v OR book_id > k)" 的形式，前半部分可直接走索引查找。
+    向前翻页（prev）时反转比较和排序方向，取出后再倒序还原。
+    """
+    backward = position['direction'] == 'prev'
+    ascending = (sort_order == 'ASC') != backward
+    op = '>' if ascending else '<'
+    order = 'ASC' if ascending else 'DESC'
+    if sort_by == 'book_id':
+        return f"book_id {op} %s", [position['key']], f"book_id {order}"
+    condition = f"{sort_by} {op}= %s AND ({sort_by} {op} %s OR book_id {op} %s)"
+    params = [position['value'], position['value'], position['key']]
+    return condition, params, f"{sort_by} {order}, book_id {order}"
+
+
+STATISTICS_GROUPS_QUERY = """
+    SELECT 
+        book_publisher,
+        COUNT(*) as count,
+        SUM(book_price) as price_sum,
+        MIN(book_price) as min_price,
+        MAX(book_price) as max_price,
+        SUM(interview_times) as borrows
+    FROM book
+    GROUP BY book_publisher
+"""
+
+
+def _summarize_statistics(groups, popular):
+    """由按出版社分组的聚合行和最受欢迎图书计算统计数据"""
+    total = sum(group['count'] for group in groups)
+    # MONEY 聚合结果为 Decimal，合计保持精确，最后再转为 float（SQLite 返回 float，先按字符串转换）
+    price_sum = sum(
+        (Decimal(str(group['price_sum'])) for group in groups if group['price_sum'] is not None),
+        Decimal(0)
+    )
+    total_borrows = sum(group['borrows'] or 0 for group in groups)
+    min_prices = [group['min_price'] for group in groups if group['min_price'] is not None]
+    max_prices = [group['max_price'] for group in groups if group['max_price'] is not None]
+    avg_price = float(price_sum / total) if total else 0.0
+    
+    # 出版社分布（前5名）
+    groups = sorted(groups, key=lambda group: (-group['count'], group['book_publisher']))
+    publishers = [
+        {'book_publisher': group['book_publisher'], 'count': group['count']}
+        for group in groups[:5]
+    ]
+    
+    return {
+        'total': total,
+        'avg_price': round(avg_price, 2),
+        'total_borrows': total_borrows,
+        'popular_book': popular['book_name'] if popular else '无',
+        'popular_borrows': popular['interview_times'] if popular else 0,
+        'min_price': float(min(min_prices)) if min_prices else 0.0,
+        'max_price': float(max(max_prices)) if max_prices else 0.0,
+        'publishers': publishers
+    }
+
+
+def _caused_by(error, error_type):
+    """error 或其上下文（包装为 DatabaseError 前的原始异常）中是否有 error_type"""
+    while error is not None:
+        if isinstance(error, error_type):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+def _replica_read(method):
+    """只读查询方法：在只读副本上中途出现连接错误时由主库重试一次（见 ReplicaRouter.read_with_failover）"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self.router is None:
+            return method(self, *args, **kwargs)
+        return self.router.read_with_failover(
+            lambda: method(self, *args, **kwargs),
+            lambda error: _caused_by(error, self.backend.OperationalError)
+        )
+    return wrapper
+
+
 class BookDB:
     """图书数据库操作类"""
     
-    def __init__(self):
-        self.config = DB_CONFIG
+    def __init__(self, config=None):
+        self.config = config or DB_CONFIG
+        # 数据库后端（DB_CONFIG['backend']：'mssql' 或 'sqlite'），提供连接和方言相关的SQL片段
+        self.backend = create_backend(self.config)
+        self.pool = ConnectionPool(self._connect, **self.config.get('pool', {}))
+        
+        # 数据库访问统计：每次请求的连接数、语句数和耗时，按语句汇总，记录慢查询
+        self.instrumentation = Instrumentation(**self.config.get('instrumentation', {}))
+        
+        # 只读副本（未配置时所有查询都走主库）
+        self.router = None
+        replicas = self.config.get('replicas') or []
+        if replicas:
+            routing_config = self.config.get('routing', {})
+            self.router = ReplicaRouter(
+                [
+                    Replica(
+                        replica.get('name') or replica.get('server') or replica.get('path'),
+                        ConnectionPool(lambda target=replica: self._connect(target), **self.config.get('pool', {})),
+                        weight=replica.get('weight', 1)
+                    )
+                    for replica in replicas
+                ],
+                read_your_writes=routing_config.get('read_your_writes', 5),
+                failure_threshold=routing_config.get('failure_threshold', 3),
+                retry_interval=routing_config.get('retry_interval', 30)
+            )
+        
+        # 分页、筛选等动态查询的语句模板缓存
+        statements_config = self.config.get('statements', {})
+        self.statements = StatementCache(
+            max_size=statements_config.get('max_size', 256),
+            parameterize=statements_config.get('parameterize', True) and self.backend.parameterized_statements
+        )
+        
+        # 写入监听者：数据变更提交后收到 (旧记录, 新记录) 列表，用于维护内存索引等
+        self._write_listeners = []
+        # 跨进程写入通知（多进程部署时由 enable_change_feed 开启，见 models/changes.py）
+        self.change_feed = None
+        self.search_engine = self.backend.create_search_engine(
+            self.config.get('search', {}), self._load_search_documents,
+            lambda: self._get_connection(read_only=True)
+        )
+        self.add_write_listener(self.search_engine)
+        
+        statistics_config = self.config.get('statistics', {})
+        self.statistics_aggregator = None
+        if statistics_config.get('incremental', False):
+            # 聚合器必须先于缓存收到通知，否则缓存可能在聚合器更新前被重新填充
+            self.statistics_aggregator = StatisticsAggregator(self._load_statistics_rows)
+            self.add_write_listener(self.statistics_aggregator)
+        self.statistics_cache = CachedValue(ttl=statistics_config.get('cache_ttl', 60))
+        self.add_write_listener(self.statistics_cache)
+        
+        # 相关图书索引（engine 为 'sql' 时为 None，每次查询数据库）
+        # 内存索引、统计聚合器和取值字典随本进程写入增量更新，全量构建必须读主库，避免漏掉副本尚未同步的写入
+        self.related_index = create_related_index(
+            self.config.get('related', {}), lambda: self.get_all_books(read_only=False)
+        )
+        if self.related_index is not None:
+            self.add_write_listener(self.related_index)
+        
+        # 筛选选项取值字典（engine 为 'sql' 时为 None，每次查询数据库）
+        options_config = self.config.get('filter_options', {})
+        self.value_dictionary = None
+        if options_config.get('engine', 'sql') == 'index':
+            self.value_dictionary = ValueDictionary(
+                self._load_option_values,
+                rebuild_interval=options_config.get('rebuild_interval')
+            )
+            self.add_write_listener(self.value_dictionary)
+        
+        book_cache_config = self.config.get('book_cache', {})
+        self.book_cache = LRUCache(
+            max_size=book_cache_config.get('max_size', 1000),
+            ttl=book_cache_config.get('ttl', 300)
+        )
+        self.add_write_listener(self.book_cache)
+    
+    def _connect(self, target=None):
+        """建立新的物理连接（仅由连接池调用）；target 为只读副本配置，未给出的项沿用主库配置"""
+        return self.backend.connect(target)
     
-    def _get_connection(self):
-        """获取数据库连接"""
+    def _get_connection(self, read_only=False):
+        """
+        从连接池获取数据库连接，调用 close() 即归还连接池
+        
+        read_only 为 True 时优先从只读副本借出连接；当前请求刚写入过或副本都不可用时使用主库。
+        借出耗时和连接上执行的语句计入当前请求的访问统计。
+        """
+        started = time.perf_counter()
+        if read_only and self.router is not None:
+            conn = self.router.acquire()
+            if conn is not None:
+                return self.instrumentation.wrap(conn, time.perf_counter() - started)
         try:
-            conn = pymssql.connect(
-                server=self.config['server'],
-                database=self.config['database'],
-                charset=self.config['charset']
-            )
-            return conn
+            conn = self.pool.acquire()
         except Exception as e:
             raise DatabaseError(f"数据库连接失败: {str(e)}")
+        return self.instrumentation.wrap(conn, time.perf_counter() - started)
+    
+    def _pools(self):
+        pools = [self.pool]
+        if self.router is not None:
+            pools.extend(replica.pool for replica in self.router.replicas)
+        return pools
+    
+    def warm_up(self, connections=True):
+        """
+        预热内存索引、统计聚合、连接池和统计缓存，返回各步骤的耗时（秒）
+        
+        connections 为 False 时只构建进程内的数据结构（不预热连接池，也不启动对账线程），结束后应调用
+        close_connections()：预分叉部署的主进程在 fork 前这样预热，工作进程通过写时复制共享这些数据，
+        再各自建立连接（见 server.py）。
+        """
+        steps = [
+            ('search_index', getattr(self.search_engine, 'ensure_built', None)),
+            ('related_index', getattr(self.related_index, 'ensure_built', None)),
+            ('filter_options', getattr(self.value_dictionary, 'ensure_built', None)),
+            ('statistics', getattr(self.statistics_aggregator, 'warm', None)),
+        ]
+        if connections:
+            steps.append(('pool', lambda: [pool.warm() for pool in self._pools()]))
+            steps.append(('statistics_cache', self.get_statistics))
+        
+        timings = {}
+        for name, step in steps:
+            if step is None:
+                continue
+            started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                raise DatabaseError(f"预热失败（{name}）: {str(e)}")
+            timings[name] = round(time.perf_counter() - started, 3)
+        return timings
+    
+    def after_fork(self):
+        """fork 后在子进程中调用：丢弃从父进程继承的连接（主库和只读副本）"""
+        for pool in self._pools():
+            pool.reset_after_fork()
+        if self.change_feed is not None:
+            self.change_feed.after_fork()
+    
+    def enable_change_feed(self, directory):
+        """
+        开启跨进程写入通知：本进程的写入追加到 directory 下的日志，sync_changes() 读取其他进程的写入
+        
+        多进程部署时应在构建内存索引前（预热、fork 前）调用。
+        只在开启时导入 changes 模块，单进程部署（包括 Windows）不依赖其中的文件锁。
+        """
+        if self.change_feed is None:
+            from .changes import ChangeFeed
+            self.change_feed = ChangeFeed(directory)
     
-    def get_all_books(self):
-        """获取所有图书"""
+    def sync_changes(self):
+        """读取其他进程提交的写入，通知本进程的写入监听者（多进程部署时在处理每个请求前调用）"""
+        if self.change_feed is None:
+            return
+        from .changes import ChangeFeedGap
+        try:
+            changes = self.change_feed.poll()
+        except ChangeFeedGap as e:
+            logger.warning("%s，在后台全量重建内存索引和缓存", e)
+            threading.Thread(target=self._resync, name='change-feed-resync', daemon=True).start()
+            return
+        except OSError as e:
+            logger.warning("读取跨进程写入通知失败: %s", e)
+            return
+        if changes:
+            self._dispatch_changes(changes)
+    
+    def _resync(self):
+        """丢失了其他进程的部分写入时，从数据库重建各监听者的数据（索引、聚合先于缓存）"""
+        for listener in self._write_listeners:
+            try:
+                if hasattr(listener, 'rebuild'):
+                    listener.rebuild()
+                elif hasattr(listener, 'warm'):
+                    listener.warm(force=True)
+                elif hasattr(listener, 'clear'):
+                    listener.clear()
+                elif hasattr(listener, 'invalidate'):
+                    listener.invalidate()
+            except Exception:
+                logger.exception("重建写入监听者的数据失败: %r", listener)
+    
+    def close_connections(self):
+        """关闭主库和只读副本连接池中的空闲连接"""
+        for pool in self._pools():
+            pool.close()
+    
+    def get_pool_status(self):
+        """获取连接池指标（使用中、空闲、等待次数、新建次数等）"""
+        return self.pool.stats()
+    
+    def get_query_status(self, limit=20):
+        """获取按语句汇总的执行次数、耗时、返回行数和慢查询次数（按总耗时排序）"""
+        return self.instrumentation.stats(limit)
+    
+    def get_replica_status(self):
+        """获取只读副本的健康状态、读取次数和连接池指标（未配置副本时为 None）"""
+        if self.router is None:
+            return None
+        return self.router.stats()
+    
+    def get_cache_status(self):
+        """获取各缓存和内存索引的指标"""
+        status = {
+            'books': self.book_cache.stats(),
+            'statistics': self.statistics_cache.stats(),
+            'statements': self.statements.stats(),
+        }
+        if self.related_index is not None:
+            status['related_index'] = self.related_index.stats()
+        if self.search_engine.uses_index:
+            status['search_index'] = self.search_engine.stats()
+        if self.value_dictionary is not None:
+            status['filter_options'] = self.value_dictionary.stats()
+        return status
+    
+    def ensure_indexes(self, create=True):
+        """
+        检查 book 表的覆盖索引（见 models/schema.py），create 为 True 时创建缺失的索引
+        
+        返回 [{'name', 'status', 'sql'}]，status 为 ok、created、missing 或 mismatch；
+        同名但定义不同的索引不会自动删除重建，需人工处理。
+        """
         conn = None
         try:
             conn = self._get_connection()
+            return self.backend.ensure_indexes(conn, create=create)
+        except Exception as e:
+            if conn:
+                conn.rollback()
+            raise DatabaseError(f"检查索引失败: {str(e)}")
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_index_usage(self):
+        """获取 book 表各索引的使用统计（查找、扫描、书签查找、更新次数；需要 VIEW SERVER STATE 权限）"""
+        if self.backend.index_usage_sql is None:
+            raise DatabaseError(f"{self.backend.name} 后端不提供索引使用统计")
+        conn = None
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor(as_dict=True)
+            cursor.execute(self.backend.index_usage_sql)
+            return cursor.fetchall()
+        except Exception as e:
+            raise DatabaseError(f"获取索引使用统计失败: {str(e)}")
+        finally:
+            if conn:
+                conn.close()
+    
+    def add_write_listener(self, listener):
+        """
+        注册写入监听者
+        
+        监听者需实现 on_books_changed(changes)，changes 为 (旧记录, 新记录) 列表：
+        新增时旧记录为 None，删除时新记录为 None。仅在事务提交后调用。
+        """
+        self._write_listeners.append(listener)
+    
+    def _notify_changes(self, changes):
+        """通知写入监听者；监听者出错不影响已提交的写入"""
+        if not changes:
+            return
+        if self.router is not None:
+            # 之后一段时间内当前请求的读取走主库，保证读到自己的写入
+            self.router.record_write()
+        if self.change_feed is not None:
+            try:
+                self.change_feed.publish(changes)
+            except Exception as e:
+                logger.warning("发布跨进程写入通知失败: %s", e)
+        self._dispatch_changes(changes)
+    
+    def _dispatch_changes(self, changes):
+        for listener in self._write_listeners:
+            try:
+                listener.on_books_changed(changes)
+            except Exception:
+                logger.exception("写入监听者处理失败: %r", listener)
+    
+    def _search_condition(self, keyword, fields=None):
+        """
+        构建搜索条件，返回 (条件SQL, 参数列表)
+        
+        使用索引搜索引擎时，由内存倒排索引得到匹配的图书ID，
+        以 JSON 数组作为单个参数传给数据库（SQL Server 的 OPENJSON 需要 2016 及以上，SQLite 使用 json_each）；
+        匹配的图书超过 search.max_candidates 本时（如单字搜索），参数过大、数据库解析 JSON 的开销超过扫描，
+        改用 LIKE 条件（索引的匹配规则与 LIKE 一致，结果相同）。未使用索引时直接使用各字段的 LIKE 模糊匹配。
+        """
+        if self.search_engine.uses_index:
+            book_ids = self.search_engine.search(keyword, fields=fields)
+            if not book_ids:
+                return "1 = 0", []
+            max_candidates = self.config.get('search', {}).get('max_candidates', 1000)
+            if max_candidates is None or len(book_ids) <= max_candidates:
+                return f"book_id IN (SELECT book_id FROM ({self.backend.json_ids}) ids)", [json.dumps(book_ids)]
+        
+        fields = fields or ['book_name', 'book_author', 'book_isbn', 'book_publisher']
+        search_pattern = f'%{keyword}%'
+        condition = " OR ".join(f"{field} LIKE %s" for field in fields)
+        return condition, [search_pattern] * len(fields)
+    
+    def _load_search_documents(self):
+        """读取构建搜索索引所需的字段"""
+        conn = None
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor(as_dict=True)
+            cursor.execute("""
+                SELECT 
+                    book_id,
+                    book_name,
+                    book_isbn,
+                    book_author,
+                    book_publisher,
+                    interview_times
+                FROM book
+            """)
+            return cursor.fetchall()
+        except Exception as e:
+            raise DatabaseError(f"构建搜索索引失败: {str(e)}")
+        finally:
+            if conn:
+                conn.close()
+    
+    @_replica_read
+    def get_all_books(self, read_only=True):
+        """获取所有图书（read_only 为 False 时从主库读取）"""
+        conn = None
+        try:
+            conn = self._get_connection(read_only=read_only)
             cursor = conn.cursor(as_dict=True)
             cursor.execute("""
                 SELECT 
@@ -66,8 +624,97 @@ class BookDB:
             if conn:
                 conn.close()
     
+    def iter_books(self, filters=None, since=None, until=None, batch_size=None):
+        """
+        按 book_id 顺序逐批读取图书（生成器，每次产出一个列表）
+        
+        filters 与高级筛选的条件相同；since / until 为变更水位（见 get_export_watermark），
+        只返回在 [since, until) 之间发生过写入的图书，用于增量导出。
+        通过 fetchmany 从结果流中分批取数，内存占用只与批大小有关；
+        连接在生成器结束或被关闭时归还连接池。
+        """
+        export_config = self.config.get('export', {})
+        batch_size = batch_size or export_config.get('fetch_size', 1000)
+        conn = None
+        try:
+            where_conditions, params = self._filter_conditions(filters or {})
+            if since or until:
+                watermark_column = export_config.get('watermark_column')
+                if not watermark_column:
+                    raise DatabaseError("未配置变更追踪列（export.watermark_column），无法增量导出")
+                if self.backend.watermark_sql is None:
+                    raise DatabaseError(f"{self.backend.name} 后端不支持按变更水位增量导出")
+                if since:
+                    where_conditions.append(self.backend.watermark_condition(watermark_column, '>='))
+                    params.append(_check_watermark(since))
+                if until:
+                    where_conditions.append(self.backend.watermark_condition(watermark_column, '<'))
+                    params.append(_check_watermark(until))
+            where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
+            
+            conn = self._get_connection()
+            cursor = conn.cursor(as_dict=True)
+            cursor.execute(f"""
+                SELECT 
+                    book_id,
+                    book_name,
+                    book_isbn,
+                    book_author,
+                    book_publisher,
+                    book_price,
+                    interview_times
+                FROM book
+                {where_clause}
+                ORDER BY book_id
+            """, tuple(params))
+            while True:
+                books = cursor.fetchmany(batch_size)
+                if not books:
+                    break
+                yield [_convert_price(book) for book in books]
+        except DatabaseError:
+            raise
+        except Exception as e:
+            raise DatabaseError(f"查询图书失败: {str(e)}")
+        finally:
+            if conn:
+                conn.close()
+    
+    def get_export_watermark(self):
+        """
+        获取当前变更水位（16位十六进制字符串），未配置变更追踪列时返回 None
+        
+        取 MIN_ACTIVE_ROWVERSION()：小于它的行版本都已提交，
+        以它作为本次导出的 until、下次导出的 since，增量导出不会遗漏或重复。
+        需要在 book 表上增加 ROWVERSION 列（删除操作不会被增量导出捕获）。
+        """
+        if not self.config.get('export', {}).get('watermark_column'):
+            return None
+        if self.backend.watermark_sql is None:
+            raise DatabaseError(f"{self.backend.name} 后端不支持按变更水位增量导出")
+        conn = None
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor()
+            cursor.execute(self.backend.watermark_sql)
+            return cursor.fetchone()[0]
+        except Exception as e:
+            raise DatabaseError(f"获取变更水位失败: {str(e)}")
+        finally:
+            if conn:
+                conn.close()
+    
     def get_book_by_id(self, book_id):
-        """根据ID获取图书"""
+        """根据ID获取图书（读穿缓存，写入时按图书ID精确失效）"""
+        key = _id_key(book_id)
+        # 失效通知携带数据库中的原始ID，按其他写法（如大小写不同）查到的记录不缓存
+        book = self.book_cache.get(key, self._query_book,
+                                   cache_if=lambda book: _id_key(book['book_id']) == key)
+        # 返回副本，调用方修改结果不会影响缓存
+        return dict(book) if book else book
+    
+    def _query_book(self, book_id):
+        """从数据库查询单本图书"""
         conn = None
         try:
             conn = self._get_connection()
@@ -115,8 +762,9 @@ class BookDB:
                 book_data['interview_times']
             ))
             conn.commit()
+            self._notify_changes([(None, _book_record(book_data['book_id'], book_data))])
             return True
-        except pymssql.IntegrityError as e:
+        except self.backend.IntegrityError as e:
             raise DatabaseError(f"图书ID已存在或数据完整性错误: {str(e)}")
         except Exception as e:
             if conn:
@@ -131,28 +779,33 @@ class BookDB:
         conn = None
         try:
             conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute("""
-                UPDATE book SET
+            cursor = conn.cursor(as_dict=True)
+            # 返回更新前的记录，供写入监听者计算增量
+            old_books = self.backend.update_returning_old(
+                cursor,
+                """
                     book_name = %s,
                     book_isbn = %s,
                     book_author = %s,
                     book_publisher = %s,
                     book_price = %s,
                     interview_times = %s
-                WHERE book_id = %s
-            """, (
-                book_data['book_name'],
-                book_data['book_isbn'],
-                book_data['book_author'],
-                book_data['book_publisher'],
-                book_data['book_price'],
-                book_data['interview_times'],
-                book_id
-            ))
-            if cursor.rowcount == 0:
+                """,
+                (
+                    book_data['book_name'],
+                    book_data['book_isbn'],
+                    book_data['book_author'],
+                    book_data['book_publisher'],
+                    book_data['book_price'],
+                    book_data['interview_times']
+                ),
+                "book_id = %s", (book_id,)
+            )
+            if not old_books:
                 raise DatabaseError("图书不存在")
             conn.commit()
+            old_book = _convert_price(old_books[0])
+            self._notify_changes([(old_book, _book_record(old_book['book_id'], book_data))])
             return True
         except Exception as e:
             if conn:
@@ -167,13 +820,14 @@ class BookDB:
         conn = None
         try:
             conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM book WHERE book_id = %s", (book_id,))
-            if cursor.rowcount == 0:
+            cursor = conn.cursor(as_dict=True)
+            deleted = self.backend.delete_returning(cursor, "book_id = %s", (book_id,))
+            if not deleted:
                 raise DatabaseError("图书不存在")
             conn.commit()
+            self._notify_changes([(_convert_price(book), None) for book in deleted])
             return True
-        except pymssql.IntegrityError as e:
+        except self.backend.IntegrityError as e:
             raise DatabaseError(f"无法删除：该图书可能被其他表引用: {str(e)}")
         except Exception as e:
             if conn:
@@ -183,23 +837,36 @@ class BookDB:
             if conn:
                 conn.close()
     
-    def get_books_count(self):
-        """获取图书总数"""
+    @_replica_read
+    def get_books_count(self, search=None):
+        """获取图书总数（给出 search 时为符合搜索条件的图书数）"""
         conn = None
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) as total FROM book")
+            conditions = ()
+            params = []
+            if search:
+                search_condition, params = self._search_condition(search)
+                conditions = (search_condition,)
+            conn = self._get_connection(read_only=True)
+            cursor = conn.cursor(as_dict=True)
+            self._execute_count(cursor, conditions, params)
             result = cursor.fetchone()
-            return result[0] if result else 0
+            return result['total'] if result else 0
         except Exception as e:
             raise DatabaseError(f"获取图书总数失败: {str(e)}")
         finally:
             if conn:
                 conn.close()
     
-    def get_books_paginated(self, page=1, per_page=10, search=None, sort_by='book_id', sort_order='ASC'):
-        """分页获取图书"""
+    @_replica_read
+    def get_books_paginated(self, page=1, per_page=10, search=None, sort_by='book_id', sort_order='ASC', cursor=None):
+        """分页获取图书（传入 cursor 时使用键集分页）"""
+        if cursor:
+            return self.get_books_page(
+                per_page=per_page, search=search, sort_by=sort_by,
+                sort_order=sort_order, cursor=cursor, with_total=False
+            )['books']
+        
         conn = None
         try:
             # 确保 page 和 per_page 是整数类型
@@ -218,25 +885,17 @@ class BookDB:
             if per_page < 1:
                 per_page = 10
             
-            conn = self._get_connection()
-            cursor = conn.cursor(as_dict=True)
-            
             # 构建WHERE子句
-            where_clause = ""
+            search_condition = None
             params = []
             if search:
-                where_clause = """
-                    WHERE book_name LIKE %s 
-                    OR book_author LIKE %s 
-                    OR book_isbn LIKE %s 
-                    OR book_publisher LIKE %s
-                """
-                search_pattern = f'%{search}%'
-                params = [search_pattern, search_pattern, search_pattern, search_pattern]
+                search_condition, params = self._search_condition(search)
+            
+            conn = self._get_connection(read_only=True)
+            cursor = conn.cursor(as_dict=True)
             
             # 验证排序字段
-            valid_sort_fields = ['book_id', 'book_name', 'book_price', 'interview_times', 'book_author', 'book_publisher']
-            if sort_by not in valid_sort_fields:
+            if sort_by not in VALID_SORT_FIELDS:
                 sort_by = 'book_id'
             sort_order = 'ASC' if sort_order.upper() == 'ASC' else 'DESC'
             
@@ -244,25 +903,27 @@ class BookDB:
             offset = int((page - 1) * per_page)
             
             # 执行查询
-            query = f"""
-                SELECT 
-                    book_id,
-                    book_name,
-                    book_isbn,
-                    book_author,
-                    book_publisher,
-                    book_price,
-                    interview_times
-                FROM book
-                {where_clause}
-                ORDER BY {sort_by} {sort_order}
-                OFFSET %s ROWS
-                FETCH NEXT %s ROWS ONLY
-            """
-            # 确保 offset 和 per_page 是整数类型
-            params.extend([int(offset), int(per_page)])
+            page_clause, page_params = self.backend.paginate(int(offset), int(per_page))
+            
+            def build():
+                where_clause = f"WHERE {search_condition}" if search_condition else ""
+                return f"""
+                    SELECT 
+                        book_id,
+                        book_name,
+                        book_isbn,
+                        book_author,
+                        book_publisher,
+                        book_price,
+                        interview_times
+                    FROM book
+                    {where_clause}
+                    ORDER BY {_order_clause(sort_by, sort_order)}
+                    {page_clause}
+                """
+            params.extend(page_params)
             
-            cursor.execute(query, params)
+            self.statements.execute(cursor, ('paginated', search_condition, sort_by, sort_order), build, params)
             books = cursor.fetchall()
             
             # 转换MONEY类型
@@ -277,80 +938,160 @@ class BookDB:
             if conn:
                 conn.close()
     
-    def get_statistics(self):
-        """获取统计数据"""
+    @_replica_read
+    def get_books_page(self, page=1, per_page=10, search=None, sort_by='book_id', sort_order='ASC',
+                       cursor=None, with_total=True):
+        """
+        分页获取图书及符合条件的总数
+        
+        偏移分页：通过窗口函数 COUNT(*) OVER() 在同一次查询中返回当前页数据和总数。
+        键集分页：传入 cursor 时按 (sort_by, book_id) 定位，耗时与页码深度无关；
+        此时仅在 with_total 为 True 时额外计数。
+        返回 {'books', 'total', 'page', 'per_page', 'next_cursor', 'prev_cursor'}
+        """
         conn = None
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor(as_dict=True)
-            
-            # 获取总数
-            cursor.execute("SELECT COUNT(*) as total FROM book")
-            total = cursor.fetchone()['total']
+            # 确保 page 和 per_page 是正整数
+            try:
+                page = int(page)
+            except (ValueError, TypeError):
+                page = 1
+            try:
+                per_page = int(per_page)
+            except (ValueError, TypeError):
+                per_page = 10
+            if page < 1:
+                page = 1
+            if per_page < 1:
+                per_page = 10
             
-            # 获取平均价格
-            cursor.execute("SELECT AVG(CAST(book_price AS FLOAT)) as avg_price FROM book")
-            avg_price_result = cursor.fetchone()
-            avg_price = float(avg_price_result['avg_price']) if avg_price_result['avg_price'] else 0.0
+            # 验证排序字段
+            if sort_by not in VALID_SORT_FIELDS:
+                sort_by = 'book_id'
+            sort_order = 'ASC' if str(sort_order).upper() == 'ASC' else 'DESC'
+            position = decode_cursor(cursor, sort_by, sort_order) if cursor else None
             
-            # 获取总借阅次数
-            cursor.execute("SELECT SUM(interview_times) as total_borrows FROM book")
-            total_borrows_result = cursor.fetchone()
-            total_borrows = total_borrows_result['total_borrows'] if total_borrows_result['total_borrows'] else 0
+            # 构建WHERE条件
+            where_conditions = []
+            params = []
+            if search:
+                search_condition, params = self._search_condition(search)
+                where_conditions.append(search_condition)
+            conditions = tuple(where_conditions)
             
-            # 获取最受欢迎的图书
-            cursor.execute("""
-                SELECT TOP 1 book_name, interview_times 
-                FROM book 
-                ORDER BY interview_times DESC
-            """)
-            popular = cursor.fetchone()
+            conn = self._get_connection(read_only=True)
+            cursor = conn.cursor(as_dict=True)
             
-            # 获取价格统计
-            cursor.execute("""
-                SELECT 
-                    MIN(CAST(book_price AS FLOAT)) as min_price,
-                    MAX(CAST(book_price AS FLOAT)) as max_price
-                FROM book
-            """)
-            price_stats = cursor.fetchone()
+            if position:
+                books, next_cursor, prev_cursor = self._fetch_keyset_page(
+                    cursor, where_conditions, params, sort_by, sort_order, per_page, position
+                )
+                total = None
+                if with_total:
+                    self._execute_count(cursor, conditions, params)
+                    total = cursor.fetchone()['total']
+                page = None
+            else:
+                offset = (page - 1) * per_page
+                page_clause, page_params = self.backend.paginate(offset, per_page)
+                
+                def build():
+                    return f"""
+                        SELECT
+                            book_id,
+                            book_name,
+                            book_isbn,
+                            book_author,
+                            book_publisher,
+                            book_price,
+                            interview_times,
+                            COUNT(*) OVER() AS total_count
+                        FROM book
+                        {_where_clause(conditions)}
+                        ORDER BY {_order_clause(sort_by, sort_order)}
+                        {page_clause}
+                    """
+                self.statements.execute(
+                    cursor, ('page', conditions, sort_by, sort_order), build, params + page_params
+                )
+                books = cursor.fetchall()
+                
+                if books:
+                    total = books[0]['total_count']
+                elif page > 1:
+                    # 页码超出范围时结果为空，窗口函数无法带回总数，单独计数
+                    self._execute_count(cursor, conditions, params)
+                    total = cursor.fetchone()['total']
+                else:
+                    total = 0
+                for book in books:
+                    del book['total_count']
+                
+                # 同时返回游标，客户端可从任意一页切换为键集分页
+                next_cursor = None
+                prev_cursor = None
+                if books and offset + len(books) < total:
+                    next_cursor = encode_cursor(books[-1], sort_by, sort_order, 'next')
+                if books and page > 1:
+                    prev_cursor = encode_cursor(books[0], sort_by, sort_order, 'prev')
             
-            # 获取出版社分布（前5名）
-            cursor.execute("""
-                SELECT TOP 5 
-                    book_publisher,
-                    COUNT(*) as count
-                FROM book
-                GROUP BY book_publisher
-                ORDER BY count DESC
-            """)
-            publishers = cursor.fetchall()
+            for book in books:
+                if book['book_price'] is not None:
+                    book['book_price'] = float(book['book_price'])
             
             return {
+                'books': books,
                 'total': total,
-                'avg_price': round(avg_price, 2),
-                'total_borrows': total_borrows,
-                'popular_book': popular['book_name'] if popular else '无',
-                'popular_borrows': popular['interview_times'] if popular else 0,
-                'min_price': float(price_stats['min_price']) if price_stats['min_price'] else 0.0,
-                'max_price': float(price_stats['max_price']) if price_stats['max_price'] else 0.0,
-                'publishers': publishers
+                'page': page,
+                'per_page': per_page,
+                'next_cursor': next_cursor,
+                'prev_cursor': prev_cursor
             }
+        except InvalidCursorError:
+            raise
         except Exception as e:
-            raise DatabaseError(f"获取统计数据失败: {str(e)}")
+            raise DatabaseError(f"分页查询图书失败: {str(e)}")
         finally:
             if conn:
                 conn.close()
     
-    def search_books(self, keyword):
-        """搜索图书"""
+    def _execute_count(self, cursor, conditions, params):
+        """按条件计数（结果列为 total）"""
+        self.statements.execute(
+            cursor, ('count', conditions),
+            lambda: f"SELECT COUNT(*) AS total FROM book {_where_clause(conditions)}",
+            params
+        )
+    
+    def get_plan_cache_usage(self, limit=20):
+        """获取服务器计划缓存中 book 表查询的复用次数（需要 VIEW SERVER STATE 权限）"""
+        if self.backend.plan_cache_sql is None:
+            raise DatabaseError(f"{self.backend.name} 后端不提供计划缓存统计")
         conn = None
         try:
             conn = self._get_connection()
             cursor = conn.cursor(as_dict=True)
-            search_pattern = f'%{keyword}%'
-            cursor.execute("""
-                SELECT 
+            cursor.execute(self.backend.plan_cache_sql, (int(limit),))
+            return cursor.fetchall()
+        except Exception as e:
+            raise DatabaseError(f"获取计划缓存信息失败: {str(e)}")
+        finally:
+            if conn:
+                conn.close()
+    
+    def _fetch_keyset_page(self, cursor, where_conditions, params, sort_by, sort_order, per_page, position):
+        """
+        按游标取一页（键集分页）
+        
+        多取一行用于判断该方向是否还有数据，返回 (books, next_cursor, prev_cursor)。
+        """
+        seek_condition, seek_params, order_clause = _keyset_condition(sort_by, sort_order, position)
+        conditions = tuple(where_conditions) + (seek_condition,)
+        page_clause, page_params = self.backend.paginate(0, per_page + 1)
+        
+        def build():
+            return f"""
+                SELECT
                     book_id,
                     book_name,
                     book_isbn,
@@ -359,13 +1100,199 @@ class BookDB:
                     book_price,
                     interview_times
                 FROM book
-                WHERE book_name LIKE %s 
-                OR book_author LIKE %s 
-                OR book_isbn LIKE %s 
-                OR book_publisher LIKE %s
-                ORDER BY book_id
-            """, (search_pattern, search_pattern, search_pattern, search_pattern))
-            books = cursor.fetchall()
+                {_where_clause(conditions)}
+                ORDER BY {order_clause}
+                {page_clause}
+            """
+        self.statements.execute(
+            cursor, ('keyset', conditions, order_clause), build,
+            list(params) + seek_params + page_params
+        )
+        books = cursor.fetchall()
+        
+        has_more = len(books) > per_page
+        books = books[:per_page]
+        if position['direction'] == 'prev':
+            books.reverse()
+            has_prev, has_next = has_more, True
+        else:
+            has_prev, has_next = True, has_more
+        
+        next_cursor = None
+        prev_cursor = None
+        if books and has_next:
+            next_cursor = encode_cursor(books[-1], sort_by, sort_order, 'next')
+        if books and has_prev:
+            prev_cursor = encode_cursor(books[0], sort_by, sort_order, 'prev')
+        return books, next_cursor, prev_cursor
+    
+    def get_statistics(self):
+        """
+        获取统计数据（带缓存，数据变更后自动失效）
+        
+        开启增量统计时由内存聚合器直接给出结果，不访问数据库；
+        后台对账线程定期用SQL重新计算，纠正其他进程写入造成的偏差。
+        """
+        if self.statistics_aggregator is None:
+            return self.statistics_cache.get(lambda: self._query_statistics(read_only=True))
+        try:
+            self.statistics_aggregator.start_reconciler(
+                self.config.get('statistics', {}).get('reconcile_interval'),
+                self.reconcile_statistics
+            )
+            return self.statistics_cache.get(self.statistics_aggregator.snapshot)
+        except DatabaseError:
+            raise
+        except Exception as e:
+            raise DatabaseError(f"获取统计数据失败: {str(e)}")
+    
+    def reconcile_statistics(self):
+        """立即用SQL重新计算统计数据并与增量结果对账，返回偏差报告"""
+        if self.statistics_aggregator is None:
+            raise DatabaseError("未开启增量统计")
+        report = self.statistics_aggregator.reconcile(self._query_statistics)
+        if not report['in_sync']:
+            self.statistics_cache.invalidate()
+        return report
+    
+    def get_statistics_drift(self):
+        """获取最近一次对账的偏差报告（尚未对账时为 None）"""
+        if self.statistics_aggregator is None:
+            return None
+        return self.statistics_aggregator.last_reconcile
+    
+    def _load_statistics_rows(self):
+        """读取预热统计聚合器所需的字段"""
+        conn = None
+        try:
+            conn = self._get_connection()
+            cursor = conn.cursor(as_dict=True)
+            cursor.execute("""
+                SELECT 
+                    book_id,
+                    book_name,
+                    book_publisher,
+                    book_price,
+                    interview_times
+                FROM book
+            """)
+            return cursor.fetchall()
+        except Exception as e:
+            raise DatabaseError(f"预热统计数据失败: {str(e)}")
+        finally:
+            if conn:
+                conn.close()
+    
+    @_replica_read
+    def _query_statistics(self, read_only=False):
+        """
+        查询统计数据
+        
+        按出版社分组的一次扫描得到总数、价格合计/最值、借阅合计和出版社分布，
+        最受欢迎图书由取第一行的查询得到；后端支持时两条语句在同一次往返中执行。
+        对账时读主库，read_only 为 True 时可读只读副本。
+        """
+        conn = None
+        try:
+            conn = self._get_connection(read_only=read_only)
+            cursor = conn.cursor(as_dict=True)
+            popular_query, page_params = self._popular_book_query()
+            if self.backend.multiple_result_sets:
+                cursor.execute(f"{STATISTICS_GROUPS_QUERY};\n{popular_query};", page_params)
+                groups = cursor.fetchall()
+                cursor.nextset()
+            else:
+                cursor.execute(STATISTICS_GROUPS_QUERY)
+                groups = cursor.fetchall()
+                cursor.execute(popular_query, page_params)
+            popular = cursor.fetchone()
+            return _summarize_statistics(groups, popular)
+        except Exception as e:
+            raise DatabaseError(f"获取统计数据失败: {str(e)}")
+        finally:
+            if conn:
+                conn.close()
+    
+    def _popular_book_query(self):
+        page_clause, page_params = self.backend.paginate(0, 1)
+        return f"""
+            SELECT book_name, interview_times 
+            FROM book 
+            ORDER BY interview_times DESC
+            {page_clause}
+        """, page_params
+    
+    @_replica_read
+    def _query_statistics_part(self, part, read_only=False):
+        """
+        单独执行统计查询的一部分，供并发执行（见 models/aio.py）
+        
+        part 为 'groups' 时返回按出版社分组的聚合行，为 'popular' 时返回最受欢迎的图书（可能为 None）；
+        两部分由 _summarize_statistics 合并为统计结果。
+        """
+        conn = None
+        try:
+            conn = self._get_connection(read_only=read_only)
+            cursor = conn.cursor(as_dict=True)
+            if part == 'groups':
+                cursor.execute(STATISTICS_GROUPS_QUERY)
+                return cursor.fetchall()
+            popular_query, page_params = self._popular_book_query()
+            cursor.execute(popular_query, page_params)
+            return cursor.fetchone()
+        except Exception as e:
+            raise DatabaseError(f"获取统计数据失败: {str(e)}")
+        finally:
+            if conn:
+                conn.close()
+    
+    @_replica_read
+    def search_books(self, keyword):
+        """搜索图书"""
+        conn = None
+        try:
+            if self.search_engine.uses_index:
+                # 索引搜索：按相关度排序
+                book_ids = self.search_engine.search(keyword)
+                if not book_ids:
+                    return []
+                conn = self._get_connection(read_only=True)
+                cursor = conn.cursor(as_dict=True)
+                cursor.execute(f"""
+                    SELECT 
+                        b.book_id,
+                        b.book_name,
+                        b.book_isbn,
+                        b.book_author,
+                        b.book_publisher,
+                        b.book_price,
+                        b.interview_times
+                    FROM book b
+                    JOIN ({self.backend.json_ids}) r ON b.book_id = r.book_id
+                    ORDER BY r.rank
+                """, (json.dumps(book_ids),))
+                books = cursor.fetchall()
+            else:
+                conn = self._get_connection(read_only=True)
+                cursor = conn.cursor(as_dict=True)
+                search_pattern = f'%{keyword}%'
+                cursor.execute("""
+                    SELECT 
+                        book_id,
+                        book_name,
+                        book_isbn,
+                        book_author,
+                        book_publisher,
+                        book_price,
+                        interview_times
+                    FROM book
+                    WHERE book_name LIKE %s 
+                    OR book_author LIKE %s 
+                    OR book_isbn LIKE %s 
+                    OR book_publisher LIKE %s
+                    ORDER BY book_id
+                """, (search_pattern, search_pattern, search_pattern, search_pattern))
+                books = cursor.fetchall()
             for book in books:
                 if book['book_price'] is not None:
                     book['book_price'] = float(book['book_price'])
@@ -381,11 +1308,12 @@ class BookDB:
         conn = None
         try:
             conn = self._get_connection()
-            cursor = conn.cursor()
+            cursor = conn.cursor(as_dict=True)
             placeholders = ','.join(['%s'] * len(book_ids))
-            cursor.execute(f"DELETE FROM book WHERE book_id IN ({placeholders})", book_ids)
-            deleted_count = cursor.rowcount
+            deleted = self.backend.delete_returning(cursor, f"book_id IN ({placeholders})", book_ids)
+            deleted_count = len(deleted)
             conn.commit()
+            self._notify_changes([(_convert_price(book), None) for book in deleted])
             return deleted_count
         except Exception as e:
             if conn:
@@ -395,8 +1323,83 @@ class BookDB:
             if conn:
                 conn.close()
     
-    def get_books_advanced_filter(self, filters, page=1, per_page=10, sort_by='book_id', sort_order='ASC'):
-        """高级筛选查询"""
+    def _filter_conditions(self, filters):
+        """
+        由高级筛选条件构建 WHERE 条件，返回 (条件列表, 参数列表)
+        
+        filters 支持 price_min/price_max、borrow_min/borrow_max、publisher、author
+        和 field_search（{'field': 字段, 'keyword': 关键词}），高级筛选和导出共用。
+        """
+        where_conditions = []
+        params = []
+        
+        # 价格范围（参数转为 MONEY 与列直接比较，列上不做转换，可使用 book_price 索引）
+        if filters.get('price_min') is not None:
+            where_conditions.append(f"book_price >= {self.backend.money_param}")
+            params.append(_price_param(filters['price_min']))
+        if filters.get('price_max') is not None:
+            where_conditions.append(f"book_price <= {self.backend.money_param}")
+            params.append(_price_param(filters['price_max']))
+        
+        # 借阅次数范围
+        if filters.get('borrow_min') is not None:
+            where_conditions.append("interview_times >= %s")
+            params.append(int(filters['borrow_min']))
+        if filters.get('borrow_max') is not None:
+            where_conditions.append("interview_times <= %s")
+            params.append(int(filters['borrow_max']))
+        
+        # 出版社筛选（关键词搜索）
+        publisher = filters.get('publisher')
+        if publisher:
+            publisher = str(publisher).strip()
+            if publisher:
+                # 转义 LIKE 查询中的特殊字符
+                publisher = self.backend.escape_like(publisher)
+                where_conditions.append(f"book_publisher {self.backend.like}")
+                params.append(f'%{publisher}%')
+        
+        # 作者筛选（关键词搜索）
+        author = filters.get('author')
+        if author:
+            author = str(author).strip()
+            if author:
+                # 转义 LIKE 查询中的特殊字符
+                author = self.backend.escape_like(author)
+                where_conditions.append(f"book_author {self.backend.like}")
+                params.append(f'%{author}%')
+        
+        # 指定字段筛选
+        if filters.get('field_search'):
+            field = filters.get('field_search', {}).get('field', '')
+            keyword = filters.get('field_search', {}).get('keyword', '').strip()
+            if field and keyword and self.search_engine.uses_index and field in SEARCH_FIELDS:
+                # 使用搜索索引匹配指定字段（按原文匹配，无需转义）
+                search_condition, search_params = self._search_condition(keyword, fields=[field])
+                where_conditions.append(search_condition)
+                params.extend(search_params)
+            elif field and keyword:
+                # 转义 LIKE 查询中的特殊字符
+                keyword = self.backend.escape_like(keyword)
+                if field == 'book_name':
+                    where_conditions.append(f"book_name {self.backend.like}")
+                    params.append(f'%{keyword}%')
+                elif field == 'book_author':
+                    where_conditions.append(f"book_author {self.backend.like}")
+                    params.append(f'%{keyword}%')
+                elif field == 'book_isbn':
+                    where_conditions.append(f"book_isbn {self.backend.like}")
+                    params.append(f'%{keyword}%')
+                elif field == 'book_publisher':
+                    where_conditions.append(f"book_publisher {self.backend.like}")
+                    params.append(f'%{keyword}%')
+        
+        return where_conditions, params
+    
+    @_replica_read
+    def get_books_advanced_filter(self, filters, page=1, per_page=10, sort_by='book_id', sort_order='ASC',
+                                  cursor=None, with_total=True):
+        """高级筛选查询（传入 cursor 时使用键集分页，仅在 with_total 为 True 时计数）"""
         conn = None
         try:
             # 确保 page 和 per_page 是整数类型
@@ -415,111 +1418,64 @@ class BookDB:
             if per_page < 1:
                 per_page = 10
             
-            conn = self._get_connection()
-            cursor = conn.cursor(as_dict=True)
-            
-            # 构建WHERE条件
-            where_conditions = []
-            params = []
-            
-            # 价格范围
-            if filters.get('price_min') is not None:
-                where_conditions.append("CAST(book_price AS FLOAT) >= %s")
-                params.append(float(filters['price_min']))
-            if filters.get('price_max') is not None:
-                where_conditions.append("CAST(book_price AS FLOAT) <= %s")
-                params.append(float(filters['price_max']))
-            
-            # 借阅次数范围
-            if filters.get('borrow_min') is not None:
-                where_conditions.append("interview_times >= %s")
-                params.append(int(filters['borrow_min']))
-            if filters.get('borrow_max') is not None:
-                where_conditions.append("interview_times <= %s")
-                params.append(int(filters['borrow_max']))
-            
-            # 出版社筛选（关键词搜索）
-            publisher = filters.get('publisher')
-            if publisher:
-                publisher = str(publisher).strip()
-                if publisher:
-                    # 转义 LIKE 查询中的特殊字符
-                    publisher = publisher.replace('[', '[[]').replace('%', '[%]').replace('_', '[_]')
-                    where_conditions.append("book_publisher LIKE %s")
-                    params.append(f'%{publisher}%')
-            
-            # 作者筛选（关键词搜索）
-            author = filters.get('author')
-            if author:
-                author = str(author).strip()
-                if author:
-                    # 转义 LIKE 查询中的特殊字符
-                    author = author.replace('[', '[[]').replace('%', '[%]').replace('_', '[_]')
-                    where_conditions.append("book_author LIKE %s")
-                    params.append(f'%{author}%')
-            
-            # 指定字段筛选
-            if filters.get('field_search'):
-                field = filters.get('field_search', {}).get('field', '')
-                keyword = filters.get('field_search', {}).get('keyword', '').strip()
-                if field and keyword:
-                    # 转义 LIKE 查询中的特殊字符
-                    keyword = keyword.replace('[', '[[]').replace('%', '[%]').replace('_', '[_]')
-                    if field == 'book_name':
-                        where_conditions.append("book_name LIKE %s")
-                        params.append(f'%{keyword}%')
-                    elif field == 'book_author':
-                        where_conditions.append("book_author LIKE %s")
-                        params.append(f'%{keyword}%')
-                    elif field == 'book_isbn':
-                        where_conditions.append("book_isbn LIKE %s")
-                        params.append(f'%{keyword}%')
-                    elif field == 'book_publisher':
-                        where_conditions.append("book_publisher LIKE %s")
-                        params.append(f'%{keyword}%')
-            
-            # 构建WHERE子句
-            where_clause = ""
-            if where_conditions:
-                where_clause = "WHERE " + " AND ".join(where_conditions)
-            
             # 验证排序字段
-            valid_sort_fields = ['book_id', 'book_name', 'book_price', 'interview_times', 'book_author', 'book_publisher']
-            if sort_by not in valid_sort_fields:
+            if sort_by not in VALID_SORT_FIELDS:
                 sort_by = 'book_id'
             sort_order = 'ASC' if sort_order.upper() == 'ASC' else 'DESC'
+            position = decode_cursor(cursor, sort_by, sort_order) if cursor else None
             
-            # 计算总数（使用筛选参数的副本）
-            count_params = list(params)
-            count_query = f"SELECT COUNT(*) as total FROM book {where_clause}"
-            cursor.execute(count_query, count_params)
-            total = cursor.fetchone()['total']
+            where_conditions, params = self._filter_conditions(filters)
+            # 条件片段按固定顺序生成，元组即为该筛选组合的规范形式
+            conditions = tuple(where_conditions)
             
-            # 计算偏移量（确保是整数）
-            offset = int((page - 1) * per_page)
+            conn = self._get_connection(read_only=True)
+            cursor = conn.cursor(as_dict=True)
             
-            # 执行查询（添加分页参数）
-            query = f"""
-                SELECT 
-                    book_id,
-                    book_name,
-                    book_isbn,
-                    book_author,
-                    book_publisher,
-                    book_price,
-                    interview_times
-                FROM book
-                {where_clause}
-                ORDER BY {sort_by} {sort_order}
-                OFFSET %s ROWS
-                FETCH NEXT %s ROWS ONLY
-            """
-            query_params = list(params)  # 使用筛选参数的副本
-            # 确保 offset 和 per_page 是整数类型
-            query_params.extend([int(offset), int(per_page)])
+            # 计算总数
+            total = None
+            if with_total or not position:
+                self._execute_count(cursor, conditions, params)
+                total = cursor.fetchone()['total']
             
-            cursor.execute(query, query_params)
-            books = cursor.fetchall()
+            if position:
+                books, next_cursor, prev_cursor = self._fetch_keyset_page(
+                    cursor, where_conditions, params, sort_by, sort_order, per_page, position
+                )
+            else:
+                # 计算偏移量（确保是整数）
+                offset = int((page - 1) * per_page)
+                
+                # 执行查询（添加分页参数）
+                page_clause, page_params = self.backend.paginate(int(offset), int(per_page))
+                
+                def build():
+                    return f"""
+                        SELECT 
+                            book_id,
+                            book_name,
+                            book_isbn,
+                            book_author,
+                            book_publisher,
+                            book_price,
+                            interview_times
+                        FROM book
+                        {_where_clause(conditions)}
+                        ORDER BY {_order_clause(sort_by, sort_order)}
+                        {page_clause}
+                    """
+                query_params = list(params) + page_params  # 使用筛选参数的副本
+                
+                self.statements.execute(
+                    cursor, ('filter', conditions, sort_by, sort_order), build, query_params
+                )
+                books = cursor.fetchall()
+                
+                next_cursor = None
+                prev_cursor = None
+                if books and offset + len(books) < total:
+                    next_cursor = encode_cursor(books[-1], sort_by, sort_order, 'next')
+                if books and page > 1:
+                    prev_cursor = encode_cursor(books[0], sort_by, sort_order, 'prev')
             
             # 转换MONEY类型
             for book in books:
@@ -528,58 +1484,150 @@ class BookDB:
             
             return {
                 'books': books,
-                'total': total
+                'total': total,
+                'page': None if position else page,
+                'per_page': per_page,
+                'next_cursor': next_cursor,
+                'prev_cursor': prev_cursor
             }
+        except InvalidCursorError:
+            raise
         except Exception as e:
             raise DatabaseError(f"高级筛选查询失败: {str(e)}")
         finally:
             if conn:
                 conn.close()
     
-    def get_filter_options(self):
-        """获取筛选选项（出版社、作者列表）"""
+    def get_filter_options(self, limit=None, with_counts=False):
+        """
+        获取筛选选项（出版社、作者列表）
+        
+        limit 指定时每个字段只返回图书数量最多的 limit 个取值；
+        with_counts 为 True 时每项为 {'value': 取值, 'count': 图书数量}。
+        启用取值字典时由内存字典给出，否则查询数据库。
+        """
+        try:
+            result = {}
+            for name, field in (('publishers', 'book_publisher'), ('authors', 'book_author')):
+                if self.value_dictionary is not None:
+                    values = self.value_dictionary.options(field, limit=limit)
+                else:
+                    values = self._query_option_values(field, limit=limit)
+                if with_counts:
+                    result[name] = [{'value': value, 'count': count} for value, count in values]
+                else:
+                    result[name] = [value for value, _ in values]
+            return result
+        except DatabaseError:
+            raise
+        except Exception as e:
+            raise DatabaseError(f"获取筛选选项失败: {str(e)}")
+    
+    def suggest_filter_values(self, field, prefix, limit=10):
+        """
+        筛选选项联想：返回以 prefix 开头、图书数量最多的 limit 个取值
+        
+        field 为 'publisher' 或 'author'，每项为 {'value': 取值, 'count': 图书数量}。
+        """
+        column = FILTER_OPTION_FIELDS.get(field)
+        if column is None:
+            raise DatabaseError(f"不支持联想的字段: {field}")
+        try:
+            if self.value_dictionary is not None:
+                values = self.value_dictionary.suggest(column, prefix, limit=limit)
+            else:
+                values = self._query_option_values(column, limit=limit, prefix=prefix)
+            return [{'value': value, 'count': count} for value, count in values]
+        except DatabaseError:
+            raise
+        except Exception as e:
+            raise DatabaseError(f"获取联想结果失败: {str(e)}")
+    
+    @_replica_read
+    def _query_option_values(self, column, limit=None, prefix=None):
+        """从数据库查询字段取值及图书数量，返回 [(取值, 数量)]"""
+        conn = None
+        try:
+            where_clause = ""
+            params = []
+            if prefix:
+                escaped = self.backend.escape_like(prefix)
+                where_clause = f"WHERE {column} {self.backend.like}"
+                params.append(f'{escaped}%')
+            if limit is not None:
+                page_clause, page_params = self.backend.paginate(0, int(limit))
+                query = f"""
+                    SELECT {column} as value, COUNT(*) as count
+                    FROM book {where_clause}
+                    GROUP BY {column}
+                    ORDER BY COUNT(*) DESC, {column}
+                    {page_clause}
+                """
+                params.extend(page_params)
+            else:
+                query = f"""
+                    SELECT {column} as value, COUNT(*) as count
+                    FROM book {where_clause}
+                    GROUP BY {column}
+                    ORDER BY {column}
+                """
+            
+            conn = self._get_connection(read_only=True)
+            cursor = conn.cursor(as_dict=True)
+            cursor.execute(query, tuple(params))
+            values = [(row['value'], row['count']) for row in cursor.fetchall()]
+            # 联想结果按数量排序，选项列表按取值排序
+            return values if prefix else sorted(values)
+        except Exception as e:
+            raise DatabaseError(f"查询筛选选项失败: {str(e)}")
+        finally:
+            if conn:
+                conn.close()
+    
+    def _load_option_values(self):
+        """读取构建筛选选项字典所需的数据（每本图书的出版社、作者）"""
         conn = None
         try:
             conn = self._get_connection()
             cursor = conn.cursor(as_dict=True)
-            
-            # 获取所有出版社
-            cursor.execute("SELECT DISTINCT book_publisher FROM book ORDER BY book_publisher")
-            publishers = [row['book_publisher'] for row in cursor.fetchall()]
-            
-            # 获取所有作者
-            cursor.execute("SELECT DISTINCT book_author FROM book ORDER BY book_author")
-            authors = [row['book_author'] for row in cursor.fetchall()]
-            
-            return {
-                'publishers': publishers,
-                'authors': authors
-            }
+            cursor.execute("SELECT book_id, book_publisher, book_author FROM book")
+            return cursor.fetchall()
         except Exception as e:
-            raise DatabaseError(f"获取筛选选项失败: {str(e)}")
+            raise DatabaseError(f"构建筛选选项失败: {str(e)}")
         finally:
             if conn:
                 conn.close()
     
+    @_replica_read
     def get_related_books(self, book_id, limit=5):
-        """获取相关图书（同作者、同出版社）"""
+        """
+        获取相关图书（同作者、同出版社）
+        
+        启用相关图书索引时直接由内存索引给出结果；图书不在索引中时退回数据库查询。
+        """
         conn = None
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor(as_dict=True)
+            if self.related_index is not None:
+                books = self.related_index.related(book_id, limit)
+                if books is not None:
+                    return books
             
-            # 先获取当前图书信息
+            # 先获取当前图书信息（通常命中缓存；在借出连接之前获取，避免同时占用两个连接）
             current_book = self.get_book_by_id(book_id)
             if not current_book:
                 return []
             
+            conn = self._get_connection(read_only=True)
+            cursor = conn.cursor(as_dict=True)
+            
             author = current_book['book_author']
             publisher = current_book['book_publisher']
             
             # 查找同作者或同出版社的图书（排除自己）
             # 优先级：同作者 > 同出版社 > 借阅次数
-            cursor.execute("""
-                SELECT TOP %s
+            page_clause, page_params = self.backend.paginate(0, limit)
+            cursor.execute(f"""
+                SELECT
                     book_id,
                     book_name,
                     book_isbn,
@@ -597,7 +1645,8 @@ class BookDB:
                     CASE WHEN book_author = %s THEN 0 ELSE 1 END,
                     CASE WHEN book_publisher = %s THEN 0 ELSE 1 END,
                     interview_times DESC
-            """, (limit, book_id, author, publisher, author, publisher))
+                {page_clause}
+            """, (book_id, author, publisher, author, publisher, *page_params))
             
             books = cursor.fetchall()
             
@@ -613,53 +1662,166 @@ class BookDB:
             if conn:
                 conn.close()
     
-    def import_books_from_data(self, books_data):
-        """批量导入图书"""
+    @_replica_read
+    def _query_related_books(self, book, match, limit=5):
+        """
+        单独查询同作者（match 为 'author'）或同出版社但不同作者（match 为 'publisher'）的图书，
+        供并发执行（见 models/aio.py）；两部分依次拼接后取前 limit 本，与 get_related_books 的排序一致
+        """
         conn = None
+        try:
+            conn = self._get_connection(read_only=True)
+            cursor = conn.cursor(as_dict=True)
+            page_clause, page_params = self.backend.paginate(0, limit)
+            if match == 'author':
+                condition = "book_author = %s"
+                order = "CASE WHEN book_publisher = %s THEN 0 ELSE 1 END, interview_times DESC"
+                params = (book['book_id'], book['book_author'], book['book_publisher'])
+            else:
+                condition = "book_publisher = %s AND book_author != %s"
+                order = "interview_times DESC"
+                params = (book['book_id'], book['book_publisher'], book['book_author'])
+            cursor.execute(f"""
+                SELECT
+                    book_id,
+                    book_name,
+                    book_isbn,
+                    book_author,
+                    book_publisher,
+                    book_price,
+                    interview_times
+                FROM book
+                WHERE book_id != %s AND {condition}
+                ORDER BY {order}
+                {page_clause}
+            """, (*params, *page_params))
+            books = cursor.fetchall()
+            for book_row in books:
+                if book_row['book_price'] is not None:
+                    book_row['book_price'] = float(book_row['book_price'])
+            return books
+        except Exception as e:
+            raise DatabaseError(f"获取相关图书失败: {str(e)}")
+        finally:
+            if conn:
+                conn.close()
+    
+    def import_books_from_data(self, books_data, batch_size=None, numbered=False,
+                               progress=None, cancel_event=None):
+        """
+        批量导入图书
+        
+        books_data 可以是列表或生成器，按批读取，每批提交一次，内存占用与数据总量无关；
+        numbered 为 True 时每项为 (行号, 图书数据)，错误信息使用该行号。
+        每批先用一次集合查询检查已存在的图书ID，再用一条多行 INSERT 写入；
+        某批写入失败时（如字段超长）改为逐行写入，以便定位出错行。
+        返回成功/失败数、错误列表（第N行格式，最多保留 max_errors 条）、耗时和每秒导入行数。
+        
+        progress(结果字典) 在每批提交后调用；cancel_event 被设置时在当前批次提交后停止，
+        已提交的批次保留，结果中 cancelled 为 True。
+        """
+        import_config = self.config.get('import', {})
+        batch_size = batch_size or import_config.get('batch_size', 250)
+        # 单条语句的参数个数受后端限制（SQL Server 为 2100），VALUES 最多 1000 行
+        batch_size = max(1, min(batch_size, self.backend.max_params // len(_IMPORT_COLUMNS) - 1, 1000))
+        max_errors = import_config.get('max_errors', 1000)
+        started = time.perf_counter()
+        conn = None
+        
+        success_count = 0
+        error_count = 0
+        errors = []
+        total_rows = 0
+        cancelled = False
         try:
             conn = self._get_connection()
             cursor = conn.cursor()
+            seen_ids = set()
             
-            success_count = 0
-            error_count = 0
-            errors = []
-            
-            for idx, book_data in enumerate(books_data, 1):
-                try:
-                    cursor.execute("""
-                        INSERT INTO book (
-                            book_id, book_name, book_isbn, book_author,
-                            book_publisher, book_price, interview_times
-                        ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    """, (
-                        book_data['book_id'],
-                        book_data['book_name'],
-                        book_data['book_isbn'],
-                        book_data['book_author'],
-                        book_data['book_publisher'],
-                        book_data['book_price'],
-                        book_data['interview_times']
-                    ))
-                    success_count += 1
-                except pymssql.IntegrityError:
-                    error_count += 1
-                    errors.append(f"第{idx}行: 图书ID {book_data.get('book_id', '未知')} 已存在")
-                except Exception as e:
-                    error_count += 1
-                    errors.append(f"第{idx}行: {str(e)}")
+            rows = iter(books_data) if numbered else enumerate(books_data, 1)
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    cancelled = True
+                    break
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                total_rows += len(batch)
+                
+                pending, batch_errors = self._check_import_batch(cursor, batch, seen_ids)
+                inserted = []
+                if pending:
+                    try:
+                        self._insert_books(cursor, [book_data for _, book_data in pending])
+                        inserted = [book_data for _, book_data in pending]
+                    except Exception:
+                        # 多行 INSERT 是原子的，失败时整批未写入，改为逐行写入
+                        for idx, book_data in pending:
+                            try:
+                                self._insert_books(cursor, [book_data])
+                                inserted.append(book_data)
+                            except Exception as e:
+                                if self.backend.is_duplicate_error(e):
+                                    batch_errors.append(f"第{idx}行: 图书ID {book_data.get('book_id', '未知')} 已存在")
+                                else:
+                                    batch_errors.append(f"第{idx}行: {str(e)}")
+                
+                conn.commit()
+                success_count += len(inserted)
+                error_count += len(batch_errors)
+                errors.extend(batch_errors[:max(0, max_errors - len(errors))])
+                self._notify_changes([(None, _book_record(book['book_id'], book)) for book in inserted])
+                if progress is not None:
+                    progress(_import_result(total_rows, success_count, error_count, errors, started, cancelled))
             
-            conn.commit()
-            
-            return {
-                'success_count': success_count,
-                'error_count': error_count,
-                'errors': errors
-            }
+            return _import_result(total_rows, success_count, error_count, errors, started, cancelled)
         except Exception as e:
             if conn:
                 conn.rollback()
-            raise DatabaseError(f"批量导入失败: {str(e)}")
+            raise DatabaseError(f"批量导入失败（已导入 {success_count} 本）: {str(e)}")
         finally:
             if conn:
                 conn.close()
+    
+    def _check_import_batch(self, cursor, batch, seen_ids):
+        """
+        检查一批待导入数据的图书ID
+        
+        batch 为 (行号, 图书数据) 列表；文件内重复由 seen_ids 判断，
+        数据库中已存在的ID由一次 IN 查询判断。返回 (可写入的行, 错误列表)。
+        """
+        ids = []
+        for _, book_data in batch:
+            key = _id_key(book_data.get('book_id'))
+            if key is not None and key not in seen_ids:
+                ids.append(key)
+        existing = set()
+        if ids:
+            placeholders = ','.join(['%s'] * len(ids))
+            cursor.execute(f"SELECT book_id FROM book WHERE book_id IN ({placeholders})", tuple(ids))
+            existing = {_id_key(row[0]) for row in cursor.fetchall()}
+        
+        pending = []
+        errors = []
+        for idx, book_data in batch:
+            key = _id_key(book_data.get('book_id'))
+            if key in seen_ids or key in existing:
+                errors.append(f"第{idx}行: 图书ID {book_data['book_id']} 已存在")
+                continue
+            if key is not None:
+                seen_ids.add(key)
+            pending.append((idx, book_data))
+        return pending, errors
+    
+    @staticmethod
+    def _insert_books(cursor, books):
+        """用一条多行 INSERT 写入若干图书"""
+        row_placeholder = '(' + ', '.join(['%s'] * len(_IMPORT_COLUMNS)) + ')'
+        params = []
+        for book_data in books:
+            params.extend(book_data[column] for column in _IMPORT_COLUMNS)
+        cursor.execute(f"""
+            INSERT INTO book ({', '.join(_IMPORT_COLUMNS)})
+            VALUES {', '.join([row_placeholder] * len(books))}
+        """, tuple(params))
 
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+"""
+数据导出模块
+将 BookDB.iter_books 产出的批次编码为 CSV、JSON Lines 或列式二进制格式，可选 gzip 压缩，
+全程流式输出，内存占用与导出行数无关
+"""
+
+import csv
+import io
+import json
+import struct
+import zlib
+
+# 导出列：(字段名, CSV表头, 列式格式中的类型)
+EXPORT_COLUMNS = (
+    ('book_id', '图书ID', 'string'),
+    ('book_name', '图书名称', 'string'),
+    ('book_isbn', 'ISBN', 'string'),
+    ('book_author', '作者', 'string'),
+    ('book_publisher', '出版社', 'string'),
+    ('book_price', '价格', 'decimal4'),
+    ('interview_times', '借阅次数', 'int32'),
+)
+
+# 列式格式的文件头标识
+COLUMNAR_MAGIC = b'JYCOL1\n'
+
+
+class ExportFormatError(Exception):
+    """不支持的导出格式"""
+    pass
+
+
+def csv_chunks(batches):
+    """CSV：表头与 UTF-8 BOM 只写一次，之后每批输出一块"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([header for _, header, _ in EXPORT_COLUMNS])
+    yield buffer.getvalue().encode('utf-8-sig')
+    for books in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        for book in books:
+            writer.writerow([book[name] for name, _, _ in EXPORT_COLUMNS])
+        yield buffer.getvalue().encode('utf-8')
+
+
+def jsonl_chunks(batches):
+    """JSON Lines：每行一个图书对象"""
+    for books in batches:
+        yield ''.join(
+            json.dumps({name: book[name] for name, _, _ in EXPORT_COLUMNS}, ensure_ascii=False) + '\n'
+            for book in books
+        ).encode('utf-8')
+
+
+def columnar_chunks(batches, row_group_size=10000):
+    """
+    列式二进制格式（小端）
+    
+    - 文件头：COLUMNAR_MAGIC，uint32 长度 + JSON 列定义
+    - 若干行组：uint32 行数，随后每列一个 uint32 长度 + 列数据
+      string 列为每个值 uint16 字节数 + UTF-8；decimal4 列为 int64（值×10000）；int32 列为 int32
+    - 以行数为 0 的行组结束
+    """
+    schema = json.dumps({'columns': [{'name': name, 'type': kind} for name, _, kind in EXPORT_COLUMNS]})
+    schema = schema.encode('utf-8')
+    yield COLUMNAR_MAGIC + struct.pack('<I', len(schema)) + schema
+    
+    group = []
+    for books in batches:
+        group.extend(books)
+        while len(group) >= row_group_size:
+            yield _encode_row_group(group[:row_group_size])
+            group = group[row_group_size:]
+    if group:
+        yield _encode_row_group(group)
+    yield struct.pack('<I', 0)
+
+
+def _encode_row_group(books):
+    parts = [struct.pack('<I', len(books))]
+    for name, _, kind in EXPORT_COLUMNS:
+        values = [book[name] for book in books]
+        if kind == 'string':
+            column = bytearray()
+            for value in values:
+                data = ('' if value is None else str(value)).encode('utf-8')
+                column += struct.pack('<H', len(data)) + data
+            column = bytes(column)
+        elif kind == 'decimal4':
+            column = struct.pack(f'<{len(values)}q', *(round((value or 0) * 10000) for value in values))
+        else:
+            column = struct.pack(f'<{len(values)}i', *(int(value or 0) for value in values))
+        parts.append(struct.pack('<I', len(column)))
+        parts.append(column)
+    return b''.join(parts)
+
+
+def read_columnar(fp):
+    """读取列式格式文件，逐行生成图书字典（供下游程序和核对导出结果使用）"""
+    if fp.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+        raise ExportFormatError('不是列式导出文件')
+    schema_length, = struct.unpack('<I', fp.read(4))
+    columns = json.loads(fp.read(schema_length).decode('utf-8'))['columns']
+    while True:
+        row_count, = struct.unpack('<I', fp.read(4))
+        if row_count == 0:
+            return
+        values = []
+        for column in columns:
+            length, = struct.unpack('<I', fp.read(4))
+            data = fp.read(length)
+            if column['type'] == 'string':
+                items, offset = [], 0
+                for _ in range(row_count):
+                    size, = struct.unpack_from('<H', data, offset)
+                    items.append(data[offset + 2:offset + 2 + size].decode('utf-8'))
+                    offset += 2 + size
+            elif column['type'] == 'decimal4':
+                items = [value / 10000 for value in struct.unpack(f'<{row_count}q', data)]
+            else:
+                items = list(struct.unpack(f'<{row_count}i', data))
+            values.append(items)
+        for row in zip(*values):
+            yield {column['name']: value for column, value in zip(columns, row)}
+
+
+def gzip_chunks(chunks, level=6):
+    """对输出块做流式 gzip 压缩（zlib wbits=31 即 gzip 格式）"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+# 导出格式：格式名 -> (编码函数, MIME类型, 文件扩展名)
+FORMATS = {
+    'csv': (csv_chunks, 'text/csv', 'csv'),
+    'jsonl': (jsonl_chunks, 'application/x-ndjson', 'jsonl'),
+    'columnar': (columnar_chunks, 'application/octet-stream', 'jycol'),
+}
+
+
+def export_stream(batches, fmt='csv', compress=False):
+    """
+    将图书批次编码为指定格式，返回 (字节块生成器, MIME类型, 文件扩展名)
+    
+    compress 为 True 时输出 gzip 文件（扩展名追加 .gz）。
+    """
+    if fmt not in FORMATS:
+        raise ExportFormatError(f'不支持的导出格式: {fmt}（可选: {", ".join(FORMATS)}）')
+    encode, mimetype, extension = FORMATS[fmt]
+    chunks = encode(batches)
+    if compress:
+        return gzip_chunks(chunks), 'application/gzip', extension + '.gz'
+    return chunks, mimetype, extension
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+数据库访问统计模块
+包装 BookDB 借出的连接和游标，记录每次请求的连接数、语句数、借出连接/执行/取数耗时和返回行数，
+按语句汇总到进程内的统计表，并将超过阈值的慢查询写入日志（参数默认脱敏）
+"""
+
+import contextvars
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger(__name__ + '.slow')
+
+# 当前上下文（请求）的统计，未开启时为 None
+_current = contextvars.ContextVar('query_stats', default=None)
+
+_WHITESPACE = re.compile(r'\s+')
+# 占位符列表（IN (...)、多行 VALUES）的长度随数据变化，汇总时折叠
+_PLACEHOLDER_LIST = re.compile(r'(?:(?:%s|@p\d+)\s*,\s*)+(?:%s|@p\d+)')
+_VALUES_ROWS = re.compile(r'(\([^()]*\))(?:\s*,\s*\([^()]*\))+')
+# 慢查询日志最多输出的参数个数
+_MAX_LOGGED_PARAMS = 20
+_PARAMETERIZED = 'EXEC sp_executesql'
+
+
+class QueryStats:
+    """一次请求内的数据库访问统计（耗时单位为秒）"""
+    
+    __slots__ = ('connections', 'statements', 'connect_time', 'execute_time', 'fetch_time', 'rows')
+    
+    def __init__(self):
+        self.connections = 0
+        self.statements = 0
+        self.connect_time = 0.0
+        self.execute_time = 0.0
+        self.fetch_time = 0.0
+        self.rows = 0
+    
+    @property
+    def db_time(self):
+        return self.connect_time + self.execute_time + self.fetch_time
+    
+    def merge(self, other):
+        """累加另一份统计（如同一请求中并发执行的查询各自记录的统计）"""
+        self.connections += other.connections
+        self.statements += other.statements
+        self.connect_time += other.connect_time
+        self.execute_time += other.execute_time
+        self.fetch_time += other.fetch_time
+        self.rows += other.rows
+    
+    def to_dict(self):
+        return {
+            'connections': self.connections,
+            'statements': self.statements,
+            'connect_ms': round(self.connect_time * 1000, 3),
+            'execute_ms': round(self.execute_time * 1000, 3),
+            'fetch_ms': round(self.fetch_time * 1000, 3),
+            'rows': self.rows,
+        }
+    
+    def server_timing(self, total=None):
+        """Server-Timing 响应头的取值（毫秒）"""
+        parts = [
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.connections} conn, {self.statements} queries, {self.rows} rows"',
+            f'db-connect;dur={self.connect_time * 1000:.2f}',
+            f'db-execute;dur={self.execute_time * 1000:.2f}',
+            f'db-fetch;dur={self.fetch_time * 1000:.2f}',
+        ]
+        if total is not None:
+            parts.append(f'app;dur={max(total - self.db_time, 0) * 1000:.2f}')
+        return ', '.join(parts)
+
+
+def statement_text(sql, params):
+    """
+    返回 (语句文本, 参数)
+    
+    经 sp_executesql 执行的语句（见 models/statements.py）取第一个参数中的模板文本，
+    否则所有参数化查询的文本都相同。
+    """
+    if params and sql.lstrip().startswith(_PARAMETERIZED) and len(params) >= 2:
+        return params[0], tuple(params[2:])
+    return sql, params
+
+
+def normalize_sql(sql, max_length=300):
+    """合并空白、折叠占位符列表并截断，作为语句的汇总键"""
+    text = _WHITESPACE.sub(' ', sql).strip()
+    text = _PLACEHOLDER_LIST.sub('%s, ...', text)
+    text = _VALUES_ROWS.sub(r'\1, ...', text)
+    if len(text) > max_length:
+        text = text[:max_length] + '...'
+    return text
+
+
+def redact_params(params, log_params=False):
+    """慢查询日志中的参数：默认只保留类型和长度，log_params 为 True 时输出截断后的取值"""
+    if not params:
+        return []
+    params = list(params)
+    redacted = []
+    for value in params[:_MAX_LOGGED_PARAMS]:
+        if log_params:
+            redacted.append(value if len(repr(value)) <= 100 else repr(value)[:100] + '...')
+        elif isinstance(value, (str, bytes)):
+            redacted.append(f'<{type(value).__name__}:{len(value)}>')
+        elif value is None:
+            redacted.append(None)
+        else:
+            redacted.append(f'<{type(value).__name__}>')
+    if len(params) > _MAX_LOGGED_PARAMS:
+        redacted.append(f'...（共 {len(params)} 个）')
+    return redacted
+
+
+class QueryRegistry:
+    """
+    按语句汇总的进程内统计：执行次数、总耗时、最大耗时、返回行数、慢查询次数
+    
+    汇总键超过 max_statements 个后不再新增，计入 '(other)'，避免动态拼接的语句无限增长。
+    """
+    
+    OTHER = '(other)'
+    
+    def __init__(self, max_statements=200):
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self._statements = {}
+        self.slow_queries = 0
+    
+    def record(self, key, duration, rows, slow):
+        with self._lock:
+            entry = self._statements.get(key)
+            if entry is None:
+                if len(self._statements) >= self.max_statements:
+                    key = self.OTHER
+                    entry = self._statements.get(key)
+                if entry is None:
+                    entry = self._statements[key] = [0, 0.0, 0.0, 0, 0]
+            entry[0] += 1
+            entry[1] += duration
+            if duration > entry[2]:
+                entry[2] = duration
+            entry[3] += rows
+            if slow:
+                entry[4] += 1
+                self.slow_queries += 1
+    
+    def stats(self, limit=20):
+        """按总耗时排序的前 limit 条语句"""
+        with self._lock:
+            items = [(key, list(entry)) for key, entry in self._statements.items()]
+            slow_queries = self.slow_queries
+        items.sort(key=lambda item: item[1][1], reverse=True)
+        return {
+            'statements': len(items),
+            'executions': sum(entry[0] for _, entry in items),
+            'slow_queries': slow_queries,
+            'top': [
+                {
+                    'sql': key,
+                    'executions': count,
+                    'total_ms': round(total * 1000, 3),
+                    'avg_ms': round(total / count * 1000, 3),
+                    'max_ms': round(longest * 1000, 3),
+                    'rows': rows,
+                    'slow': slow,
+                }
+                for key, (count, total, longest, rows, slow) in items[:limit]
+            ],
+        }
+    
+    def clear(self):
+        with self._lock:
+            self._statements.clear()
+            self.slow_queries = 0
+
+
+class InstrumentedCursor:
+    """
+    记录执行和取数耗时的游标包装
+    
+    一条语句的耗时为 execute 与随后各次 fetch 的耗时之和，在下一次 execute、
+    游标关闭或连接归还时结束，再计入统计表和慢查询日志。
+    """
+    
+    def __init__(self, cursor, instrumentation, stats):
+        self._cursor = cursor
+        self._instrumentation = instrumentation
+        self._stats = stats
+        self._sql = None
+        self._params = None
+        self._duration = 0.0
+        self._rows = 0
+    
+    def execute(self, sql, params=None):
+        self.finish()
+        started = time.perf_counter()
+        try:
+            if params is None:
+                return self._cursor.execute(sql)
+            return self._cursor.execute(sql, params)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._sql, self._params = sql, params
+            self._duration = elapsed
+            self._rows = 0
+            if self._stats is not None:
+                self._stats.statements += 1
+                self._stats.execute_time += elapsed
+    
+    def _fetched(self, started, rows):
+        elapsed = time.perf_counter() - started
+        self._duration += elapsed
+        self._rows += rows
+        if self._stats is not None:
+            self._stats.fetch_time += elapsed
+            self._stats.rows += rows
+    
+    def fetchone(self):
+        started = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(started, 0 if row is None else 1)
+        return row
+    
+    def fetchmany(self, *args, **kwargs):
+        started = time.perf_counter()
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._fetched(started, len(rows))
+        return rows
+    
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(started, len(rows))
+        return rows
+    
+    def finish(self):
+        """结束当前语句的计时并记录"""
+        if self._sql is None:
+            return
+        sql, params = self._sql, self._params
+        self._sql = self._params = None
+        self._instrumentation.record(sql, params, self._duration, self._rows)
+    
+    def close(self):
+        self.finish()
+        self._cursor.close()
+    
+    def __iter__(self):
+        return iter(self.fetchall())
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """记录游标语句的连接包装，close() 时结束各游标的计时后归还连接"""
+    
+    def __init__(self, conn, instrumentation, stats):
+        self._conn = conn
+        self._instrumentation = instrumentation
+        self._stats = stats
+        self._cursors = []
+    
+    def cursor(self, *args, **kwargs):
+        cursor = InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._instrumentation, self._stats)
+        self._cursors.append(cursor)
+        return cursor
+    
+    def close(self):
+        for cursor in self._cursors:
+            cursor.finish()
+        self._cursors = []
+        self._conn.close()
+    
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class Instrumentation:
+    """
+    数据库访问统计
+    
+    - begin() / end(token)：在当前上下文（请求）中开始/结束统计，current() 取得本次请求的 QueryStats
+    - wrap(conn, connect_time)：包装借出的连接，记录其上执行的语句
+    - 语句耗时超过 slow_query_ms 毫秒时写入 models.instrumentation.slow 日志，
+      log_params 为 False 时参数只记录类型和长度
+    """
+    
+    def __init__(self, enabled=True, slow_query_ms=500, log_params=False, max_statements=200):
+        self.enabled = enabled
+        self.slow_query = slow_query_ms / 1000.0 if slow_query_ms is not None else None
+        self.log_params = log_params
+        self.registry = QueryRegistry(max_statements=max_statements)
+    
+    def begin(self):
+        return _current.set(QueryStats())
+    
+    def end(self, token):
+        _current.reset(token)
+    
+    @staticmethod
+    def current():
+        return _current.get()
+    
+    def wrap(self, conn, connect_time):
+        if not self.enabled:
+            return conn
+        stats = _current.get()
+        if stats is not None:
+            stats.connections += 1
+            stats.connect_time += connect_time
+        return InstrumentedConnection(conn, self, stats)
+    
+    def record(self, sql, params, duration, rows):
+        sql, params = statement_text(sql, params)
+        key = normalize_sql(sql)
+        slow = self.slow_query is not None and duration >= self.slow_query
+        self.registry.record(key, duration, rows, slow)
+        if slow:
+            slow_query_logger.warning(
+                '慢查询 %.1f ms，%d 行: %s 参数: %s',
+                duration * 1000, rows, key, redact_params(params, self.log_params)
+            )
+    
+    def stats(self, limit=20):
+        status = self.registry.stats(limit)
+        status['slow_query_ms'] = self.slow_query * 1000 if self.slow_query is not None else None
+        return status
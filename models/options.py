@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+筛选选项模块
+在内存中维护出版社、作者的取值字典及其图书数量，支持前缀联想，无需每次扫描全表
+"""
+
+import bisect
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 维护取值字典的字段
+OPTION_FIELDS = ('book_publisher', 'book_author')
+
+
+class ValueDictionary:
+    """
+    字段取值字典
+    
+    - 每个字段保存 规范化值 -> [显示值, 图书数量]，规范化值忽略尾部空格和大小写（与数据库比较规则一致）
+    - 规范化值另存一份有序列表，前缀联想用二分查找定位
+    - 另存每本图书当前计入的取值（图书ID -> (出版社, 作者)），增量更新按图书ID先减去已计入的取值再加上新值，
+      同一变更重复应用（如全量重建期间的写入已包含在快照中）不会重复计数
+    - 通过 on_books_changed 增量更新；可设置定期全量重建，以同步其他进程的写入
+    - version 在每次变化时递增，可用于判断选项是否改变
+    """
+    
+    def __init__(self, loader, rebuild_interval=None):
+        self._loader = loader
+        self.rebuild_interval = rebuild_interval
+        
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._values = {field: {} for field in OPTION_FIELDS}
+        self._sorted = {field: [] for field in OPTION_FIELDS}
+        self._books = {}
+        self.version = 0
+        self._built_at = None
+        self._building = False
+        self._refreshing = False
+        self._pending = []
+    
+    # ---- 查询 ----
+    
+    def options(self, field, limit=None):
+        """
+        返回字段的全部取值 [(显示值, 数量)]，按值排序
+        
+        指定 limit 时只返回图书数量最多的 limit 个（仍按值排序）。
+        """
+        self.ensure_built()
+        with self._lock:
+            entries = self._values[field].values()
+            if limit is not None:
+                entries = heapq.nsmallest(limit, entries, key=lambda entry: (-entry[1], entry[0]))
+            return sorted((entry[0], entry[1]) for entry in entries)
+    
+    def suggest(self, field, prefix, limit=10):
+        """返回以 prefix 开头的取值 [(显示值, 数量)]，按图书数量降序"""
+        self.ensure_built()
+        prefix = _norm(prefix)
+        with self._lock:
+            keys = self._sorted[field]
+            values = self._values[field]
+            matches = []
+            for i in range(bisect.bisect_left(keys, prefix), len(keys)):
+                if not keys[i].startswith(prefix):
+                    break
+                matches.append(values[keys[i]])
+            top = heapq.nsmallest(limit, matches, key=lambda entry: (-entry[1], entry[0]))
+            return [(entry[0], entry[1]) for entry in top]
+    
+    # ---- 构建与增量更新 ----
+    
+    def ensure_built(self):
+        """首次查询时构建字典；超过重建间隔时在后台线程重建，期间继续使用旧数据"""
+        if self._built_at is None:
+            self.rebuild(only_if_missing=True)
+            return
+        if self.rebuild_interval is None or time.monotonic() - self._built_at <= self.rebuild_interval:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name='filter-options-rebuild', daemon=True).start()
+    
+    def rebuild(self, only_if_missing=False):
+        """从数据库全量重建"""
+        with self._build_lock:
+            if only_if_missing and self._built_at is not None:
+                return
+            with self._lock:
+                self._building = True
+                self._pending = []
+            try:
+                rows = self._loader()
+                values = {field: {} for field in OPTION_FIELDS}
+                books = {}
+                for row in rows:
+                    books[_book_key(row['book_id'])] = tuple(row[field] for field in OPTION_FIELDS)
+                    for field in OPTION_FIELDS:
+                        display = row[field]
+                        entry = values[field].setdefault(_norm(display), [_display(display), 0])
+                        entry[1] += 1
+                with self._lock:
+                    self._values = values
+                    self._sorted = {field: sorted(values[field]) for field in OPTION_FIELDS}
+                    self._books = books
+                    # 构建期间发生的写入在新数据上重放（快照中已包含的写入重放后结果不变）
+                    pending, self._pending = self._pending, []
+                    for old, new in pending:
+                        self._apply_change(old, new)
+                    self.version += 1
+                    self._built_at = time.monotonic()
+            finally:
+                with self._lock:
+                    self._building = False
+                    self._pending = []
+    
+    def _refresh(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception('重建筛选选项失败')
+        finally:
+            with self._lock:
+                self._refreshing = False
+    
+    def on_books_changed(self, changes):
+        """写入监听：changes 为 (旧记录, 新记录) 列表"""
+        with self._lock:
+            if self._building:
+                self._pending.extend(changes)
+            if self._built_at is None:
+                return
+            for old, new in changes:
+                self._apply_change(old, new)
+            self.version += 1
+    
+    def _apply_change(self, old, new):
+        # 按当前计入的取值撤销，而不是按变更中的旧记录，重复应用同一变更时结果不变
+        for record in (old, new):
+            if record is not None:
+                self._remove_book(_book_key(record['book_id']))
+        if new is not None:
+            values = tuple(new[field] for field in OPTION_FIELDS)
+            self._books[_book_key(new['book_id'])] = values
+            for field, display in zip(OPTION_FIELDS, values):
+                self._adjust(field, display, 1)
+    
+    def _remove_book(self, key):
+        values = self._books.pop(key, None)
+        if values is None:
+            return
+        for field, display in zip(OPTION_FIELDS, values):
+            self._adjust(field, display, -1)
+    
+    def _adjust(self, field, display, delta):
+        key = _norm(display)
+        values = self._values[field]
+        entry = values.get(key)
+        if entry is None:
+            if delta <= 0:
+                return
+            entry = values[key] = [_display(display), 0]
+            bisect.insort(self._sorted[field], key)
+        entry[1] += delta
+        if entry[1] <= 0:
+            del values[key]
+            keys = self._sorted[field]
+            pos = bisect.bisect_left(keys, key)
+            if pos < len(keys) and keys[pos] == key:
+                del keys[pos]
+    
+    def stats(self):
+        """返回字典规模信息"""
+        with self._lock:
+            return {
+                'publishers': len(self._values['book_publisher']),
+                'authors': len(self._values['book_author']),
+                'version': self.version,
+                'built': self._built_at is not None,
+            }
+
+
+def _book_key(book_id):
+    # CHAR(8) 列查询结果带尾部空格，统一去除后作为键
+    return str(book_id).rstrip()
+
+
+def _display(value):
+    return '' if value is None else str(value).rstrip()
+
+
+def _norm(value):
+    """与数据库比较规则一致：忽略尾部空格和大小写"""
+    return _display(value).casefold()
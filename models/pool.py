@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+"""
+数据库连接池模块
+提供有界、线程安全、可复用的数据库连接，避免每次操作都重新登录数据库
+"""
+
+import re
+import threading
+import time
+from collections import deque
+
+# 只读语句：以 SELECT 开头且不含写入或加锁关键字（默认的 READ COMMITTED 下执行后不持有锁）
+_SELECT = re.compile(r'\s*SELECT\b', re.IGNORECASE)
+_WRITE_KEYWORDS = re.compile(
+    r'\b(INSERT|UPDATE|DELETE|MERGE|INTO|EXEC|EXECUTE|CREATE|ALTER|DROP|TRUNCATE|UPDLOCK|XLOCK|HOLDLOCK)\b',
+    re.IGNORECASE
+)
+
+
+class PoolTimeoutError(Exception):
+    """在超时时间内未能从连接池借出连接"""
+    pass
+
+
+class _PoolEntry:
+    """连接池中的一条物理连接及其时间信息"""
+    
+    __slots__ = ('conn', 'created_at', 'last_used')
+    
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class PooledConnection:
+    """
+    借出的连接包装对象
+    
+    接口与原始连接一致（cursor/commit/rollback/close），
+    调用 close() 时不会断开物理连接，而是归还给连接池。
+    执行过写入语句且未提交时，归还前回滚；只执行过只读查询的连接直接归还，不多一次 ROLLBACK 往返。
+    """
+    
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+        self._dirty = False
+        self._broken = False
+        self._released = False
+    
+    @property
+    def raw(self):
+        """底层物理连接"""
+        return self._entry.conn
+    
+    def cursor(self, *args, **kwargs):
+        return _TrackedCursor(self, self._entry.conn.cursor(*args, **kwargs))
+    
+    def commit(self):
+        self._entry.conn.commit()
+        self._dirty = False
+    
+    def rollback(self):
+        # 回滚失败通常意味着连接已断开，标记后归还时直接丢弃
+        try:
+            self._entry.conn.rollback()
+        except Exception:
+            self._broken = True
+        self._dirty = False
+    
+    def invalidate(self):
+        """标记连接不可再用，归还时将被关闭"""
+        self._broken = True
+    
+    def close(self):
+        """归还连接到连接池（重复调用无副作用）"""
+        if self._released:
+            return
+        self._released = True
+        if self._dirty and not self._broken:
+            # 未提交的写入在归还前回滚
+            self.rollback()
+        self._pool.release(self._entry, broken=self._broken)
+    
+    def __getattr__(self, name):
+        return getattr(self._entry.conn, name)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class _TrackedCursor:
+    """游标包装：执行非只读语句时把连接标记为有未提交的写入"""
+    
+    def __init__(self, conn, cursor):
+        self._conn = conn
+        self._cursor = cursor
+    
+    def execute(self, sql, params=None):
+        self._track(sql, params)
+        if params is None:
+            return self._cursor.execute(sql)
+        return self._cursor.execute(sql, params)
+    
+    def executemany(self, sql, params):
+        self._conn._dirty = True
+        return self._cursor.executemany(sql, params)
+    
+    def _track(self, sql, params):
+        if self._conn._dirty:
+            return
+        if sql.lstrip().upper().startswith('EXEC SP_EXECUTESQL') and params:
+            # 参数化执行（见 statements.py）：第一个参数是实际执行的语句
+            sql = params[0]
+        if not _is_read_only(sql):
+            self._conn._dirty = True
+    
+    def __iter__(self):
+        return iter(self._cursor)
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+def _is_read_only(sql):
+    return isinstance(sql, str) and bool(_SELECT.match(sql)) and not _WRITE_KEYWORDS.search(sql)
+
+
+class ConnectionPool:
+    """
+    有界、线程安全的连接池
+    
+    - min_size / max_size：保留的最少空闲连接数 / 同时存在的最大连接数
+    - timeout：连接耗尽时借出连接的最长等待秒数
+    - max_idle：空闲超过该秒数的多余连接会被回收
+    - max_lifetime：连接存活超过该秒数后被回收重建
+    - health_check：借出前对空闲超过 health_check_interval 秒的连接执行 SELECT 1
+    """
+    
+    def __init__(self, connect, min_size=1, max_size=10, timeout=30,
+                 max_idle=300, max_lifetime=3600, health_check=True,
+                 health_check_interval=30):
+        if max_size < 1:
+            raise ValueError('max_size 必须大于 0')
+        self._connect = connect
+        self.min_size = max(0, min(min_size, max_size))
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.health_check = health_check
+        self.health_check_interval = health_check_interval
+        
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition(threading.Lock())
+        
+        # 连接池指标
+        self._creates = 0
+        self._checkouts = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._timeouts = 0
+        self._recycled = 0
+        self._discarded = 0
+        self._health_check_failures = 0
+    
+    def acquire(self):
+        """借出一个连接，返回 PooledConnection"""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            entry, create, stale = self._checkout(deadline)
+            for old in stale:
+                self._close_quietly(old)
+            
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._creates += 1
+                    self._checkouts += 1
+                return PooledConnection(self, _PoolEntry(conn))
+            
+            if entry is None:
+                continue
+            
+            if self._needs_ping(entry) and not self._ping(entry):
+                with self._cond:
+                    self._health_check_failures += 1
+                self._discard(entry)
+                continue
+            
+            with self._cond:
+                self._checkouts += 1
+            return PooledConnection(self, entry)
+    
+    def _checkout(self, deadline):
+        """
+        在锁内选出空闲连接或预留新建名额
+        
+        返回 (entry, create, stale)：stale 为需要在锁外关闭的过期连接。
+        """
+        stale = []
+        waited = False
+        wait_start = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                while self._idle:
+                    entry = self._idle.pop()
+                    if self._is_expired(entry, now):
+                        self._size -= 1
+                        self._recycled += 1
+                        stale.append(entry)
+                        continue
+                    if waited:
+                        self._wait_time += now - wait_start
+                    return entry, False, stale
+                
+                if self._size < self.max_size:
+                    self._size += 1
+                    if waited:
+                        self._wait_time += now - wait_start
+                    return None, True, stale
+                
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._timeouts += 1
+                    self._wait_time += now - wait_start
+                    for old in stale:
+                        self._close_quietly(old)
+                    raise PoolTimeoutError(
+                        f'等待数据库连接超时（{self.timeout}秒，最大连接数 {self.max_size}）'
+                    )
+                if not waited:
+                    waited = True
+                    self._waits += 1
+                self._cond.wait(remaining)
+    
+    def release(self, entry, broken=False):
+        """归还连接；损坏或超过存活时间的连接会被关闭"""
+        now = time.monotonic()
+        expired = (self.max_lifetime is not None
+                   and now - entry.created_at > self.max_lifetime)
+        if broken or expired:
+            with self._cond:
+                if expired and not broken:
+                    self._recycled += 1
+            self._discard(entry)
+            return
+        
+        entry.last_used = now
+        stale = []
+        with self._cond:
+            self._idle.append(entry)
+            # 回收空闲过久的多余连接（从最久未使用的一端开始）
+            while len(self._idle) > self.min_size:
+                oldest = self._idle[0]
+                if self.max_idle is None or now - oldest.last_used <= self.max_idle:
+                    break
+                self._idle.popleft()
+                self._size -= 1
+                self._recycled += 1
+                stale.append(oldest)
+            self._cond.notify()
+        for old in stale:
+            self._close_quietly(old)
+    
+    def warm(self):
+        """预先建立 min_size 个连接"""
+        entries = []
+        try:
+            while True:
+                with self._cond:
+                    if self._size >= self.min_size or self._size >= self.max_size:
+                        break
+                    self._size += 1
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                    raise
+                with self._cond:
+                    self._creates += 1
+                entries.append(_PoolEntry(conn))
+        finally:
+            with self._cond:
+                self._idle.extend(entries)
+                self._cond.notify_all()
+    
+    def reset_after_fork(self):
+        """
+        fork 后在子进程中调用：丢弃从父进程继承的连接并重建锁
+        
+        继承的物理连接仍由父进程使用，子进程中不关闭（关闭会向服务器发送断开请求）。
+        """
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = deque()
+        self._size = 0
+    
+    def close(self):
+        """关闭所有空闲连接（已借出的连接在归还时仍可正常关闭）"""
+        with self._cond:
+            entries = list(self._idle)
+            self._idle.clear()
+            self._size -= len(entries)
+        for entry in entries:
+            self._close_quietly(entry)
+    
+    def stats(self):
+        """返回连接池指标"""
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': self._size - idle,
+                'idle': idle,
+                'creates': self._creates,
+                'checkouts': self._checkouts,
+                'waits': self._waits,
+                'wait_time': round(self._wait_time, 6),
+                'timeouts': self._timeouts,
+                'recycled': self._recycled,
+                'discarded': self._discarded,
+                'health_check_failures': self._health_check_failures,
+            }
+    
+    def _is_expired(self, entry, now):
+        if self.max_lifetime is not None and now - entry.created_at > self.max_lifetime:
+            return True
+        if self.max_idle is not None and now - entry.last_used > self.max_idle:
+            return True
+        return False
+    
+    def _needs_ping(self, entry):
+        if not self.health_check:
+            return False
+        return time.monotonic() - entry.last_used >= self.health_check_interval
+    
+    def _ping(self, entry):
+        try:
+            cursor = entry.conn.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchall()
+            return True
+        except Exception:
+            return False
+    
+    def _discard(self, entry):
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+        self._close_quietly(entry)
+    
+    @staticmethod
+    def _close_quietly(entry):
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""
+相关图书模块
+在内存中维护作者、出版社到图书的倒排列表（按借阅次数降序），相关图书查询无需访问数据库
+"""
+
+import bisect
+import logging
+import math
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 加权评分的默认权重：同作者、同出版社、借阅热度（按最高借阅次数归一化）
+DEFAULT_WEIGHTS = {
+    'author': 2.0,
+    'publisher': 1.0,
+    'popularity': 0.5,
+}
+
+
+class RelatedBooksIndex:
+    """
+    相关图书索引
+    
+    - 倒排列表：作者、出版社、(作者, 出版社) -> [(-借阅次数, 图书ID)]，保持有序
+    - scoring='tiered'：与原SQL排序一致，同作者同出版社 > 同作者 > 同出版社，同层按借阅次数
+    - scoring='weighted'：按 作者权重 + 出版社权重 + 热度权重 × 归一化借阅次数 排序
+    - 通过 on_books_changed 增量更新；可设置定期全量重建，以同步其他进程的写入
+    """
+    
+    def __init__(self, loader, scoring='tiered', weights=None, rebuild_interval=None):
+        if scoring not in ('tiered', 'weighted'):
+            raise ValueError(f'未知的相关图书评分方式: {scoring}')
+        self._loader = loader
+        self.scoring = scoring
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+        self.rebuild_interval = rebuild_interval
+        
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._docs = {}
+        self._by_author = {}
+        self._by_publisher = {}
+        self._by_pair = {}
+        self._max_times = 0
+        self._max_times_stale = False
+        self._built_at = None
+        self._building = False
+        self._refreshing = False
+        self._pending = []
+    
+    # ---- 查询 ----
+    
+    def related(self, book_id, limit=5):
+        """
+        返回相关图书列表（不含自身）
+        
+        图书不在索引中时返回 None，由调用方退回数据库查询。
+        """
+        self.ensure_built()
+        key = _doc_key(book_id)
+        with self._lock:
+            current = self._docs.get(key)
+            if current is None:
+                return None
+            author = _norm(current['book_author'])
+            publisher = _norm(current['book_publisher'])
+            
+            both = self._top(self._by_pair.get((author, publisher), ()), limit, exclude=key)
+            author_only = self._top(self._by_author.get(author, ()), limit, exclude=key,
+                                    skip=lambda doc: _norm(doc['book_publisher']) == publisher)
+            publisher_only = self._top(self._by_publisher.get(publisher, ()), limit, exclude=key,
+                                       skip=lambda doc: _norm(doc['book_author']) == author)
+            
+            if self.scoring == 'tiered':
+                ranked = (both + author_only + publisher_only)[:limit]
+            else:
+                ranked = self._weighted(both, author_only, publisher_only)[:limit]
+            return [dict(self._docs[k]) for k in ranked]
+    
+    def _top(self, posting, limit, exclude, skip=None):
+        """按借阅次数从高到低取前 limit 个（跳过自身和 skip 为真的图书）"""
+        result = []
+        for _, key in posting:
+            if key == exclude:
+                continue
+            if skip is not None and skip(self._docs[key]):
+                continue
+            result.append(key)
+            if len(result) >= limit:
+                break
+        return result
+    
+    def _weighted(self, both, author_only, publisher_only):
+        if self._max_times_stale:
+            self._max_times = max((doc['interview_times'] for doc in self._docs.values()), default=0)
+            self._max_times_stale = False
+        scale = math.log1p(self._max_times) or 1.0
+        scores = {}
+        for keys, base in ((both, self.weights['author'] + self.weights['publisher']),
+                           (author_only, self.weights['author']),
+                           (publisher_only, self.weights['publisher'])):
+            for key in keys:
+                times = self._docs[key]['interview_times'] or 0
+                scores[key] = base + self.weights['popularity'] * math.log1p(times) / scale
+        return sorted(scores, key=lambda key: (-scores[key], key))
+    
+    # ---- 构建与增量更新 ----
+    
+    def ensure_built(self):
+        """首次查询时构建索引；超过重建间隔时在后台线程重建，期间继续使用旧索引"""
+        if self._built_at is None:
+            self.rebuild(only_if_missing=True)
+            return
+        if self.rebuild_interval is None or time.monotonic() - self._built_at <= self.rebuild_interval:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name='related-index-rebuild', daemon=True).start()
+    
+    def rebuild(self, only_if_missing=False):
+        """从数据库全量重建索引"""
+        with self._build_lock:
+            if only_if_missing and self._built_at is not None:
+                return
+            with self._lock:
+                self._building = True
+                self._pending = []
+            try:
+                books = self._loader()
+                with self._lock:
+                    self._docs = {}
+                    self._by_author = {}
+                    self._by_publisher = {}
+                    self._by_pair = {}
+                    for book in books:
+                        self._docs[_doc_key(book['book_id'])] = _doc(book)
+                    self._max_times = max((doc['interview_times'] for doc in self._docs.values()), default=0)
+                    self._max_times_stale = False
+                    # 先收集再一次性排序，比逐条插入快
+                    for key, doc in self._docs.items():
+                        for index, term in self._terms(doc):
+                            index.setdefault(term, []).append((-doc['interview_times'], key))
+                    for index in (self._by_author, self._by_publisher, self._by_pair):
+                        for posting in index.values():
+                            posting.sort()
+                    # 构建期间发生的写入在新索引上重放
+                    pending, self._pending = self._pending, []
+                    for old, new in pending:
+                        self._apply_change(old, new)
+                    self._built_at = time.monotonic()
+            finally:
+                with self._lock:
+                    self._building = False
+                    self._pending = []
+    
+    def _refresh(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception('重建相关图书索引失败')
+        finally:
+            with self._lock:
+                self._refreshing = False
+    
+    def on_books_changed(self, changes):
+        """写入监听：changes 为 (旧记录, 新记录) 列表"""
+        with self._lock:
+            if self._building:
+                self._pending.extend(changes)
+            if self._built_at is None:
+                return
+            for old, new in changes:
+                self._apply_change(old, new)
+    
+    def _apply_change(self, old, new):
+        if old is not None:
+            self._remove_doc(_doc_key(old['book_id']))
+        if new is not None:
+            key = _doc_key(new['book_id'])
+            self._remove_doc(key)
+            doc = _doc(new)
+            self._docs[key] = doc
+            self._max_times = max(self._max_times, doc['interview_times'])
+            for index, term in self._terms(doc):
+                bisect.insort(index.setdefault(term, []), (-doc['interview_times'], key))
+    
+    def _remove_doc(self, key):
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        entry = (-doc['interview_times'], key)
+        if doc['interview_times'] >= self._max_times:
+            # 删除的是借阅最多的图书，下次加权评分时重新计算最大值
+            self._max_times_stale = True
+        for index, term in self._terms(doc):
+            posting = index.get(term)
+            if not posting:
+                continue
+            pos = bisect.bisect_left(posting, entry)
+            if pos < len(posting) and posting[pos] == entry:
+                del posting[pos]
+            if not posting:
+                del index[term]
+    
+    def _terms(self, doc):
+        author = _norm(doc['book_author'])
+        publisher = _norm(doc['book_publisher'])
+        return (
+            (self._by_author, author),
+            (self._by_publisher, publisher),
+            (self._by_pair, (author, publisher)),
+        )
+    
+    def stats(self):
+        """返回索引规模信息"""
+        with self._lock:
+            return {
+                'documents': len(self._docs),
+                'authors': len(self._by_author),
+                'publishers': len(self._by_publisher),
+                'built': self._built_at is not None,
+                'age': None if self._built_at is None else round(time.monotonic() - self._built_at, 1),
+            }
+
+
+def create_related_index(config, loader):
+    """根据配置创建相关图书索引；engine 为 'sql' 时返回 None（每次查询数据库）"""
+    engine = config.get('engine', 'sql')
+    if engine == 'index':
+        return RelatedBooksIndex(
+            loader,
+            scoring=config.get('scoring', 'tiered'),
+            weights=config.get('weights'),
+            rebuild_interval=config.get('rebuild_interval'),
+        )
+    if engine == 'sql':
+        return None
+    raise ValueError(f'未知的相关图书引擎类型: {engine}')
+
+
+def _doc(book):
+    """索引中保存的图书记录（与数据库查询结果的字段一致）"""
+    doc = dict(book)
+    doc['interview_times'] = int(doc.get('interview_times') or 0)
+    if doc.get('book_price') is not None:
+        doc['book_price'] = float(doc['book_price'])
+    return doc
+
+
+def _norm(value):
+    """与数据库比较规则一致：忽略尾部空格和大小写"""
+    return '' if value is None else str(value).rstrip().casefold()
+
+
+def _doc_key(book_id):
+    # CHAR(8) 列查询结果带尾部空格，统一去除后作为索引键
+    return str(book_id).rstrip()
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+"""
+读写分离模块
+将只读查询分发到只读副本（按健康状态和当前负载选择），写入及写入后的读取留在主库
+"""
+
+import contextvars
+import logging
+import random
+import threading
+import time
+
+from .pool import PoolTimeoutError
+
+logger = logging.getLogger(__name__)
+
+# 当前上下文（请求）在该时间点（time.time()）之前的读取都走主库，用于读到自己的写入
+_primary_until = contextvars.ContextVar('primary_until', default=0.0)
+# 当前上下文最近一次从哪个副本借出连接（read_with_failover 据此判断出错的读取是否在副本上执行）
+_read_replica = contextvars.ContextVar('read_replica', default=None)
+
+
+class Replica:
+    """一个只读副本：连接池、权重和健康状态"""
+    
+    def __init__(self, name, pool, weight=1):
+        self.name = name
+        self.pool = pool
+        self.weight = max(weight, 0.01)
+        self.healthy = True
+        self.failures = 0
+        self.down_since = None
+        self.reads = 0
+        self.errors = 0
+
+
+class ReplicaRouter:
+    """
+    只读副本路由
+    
+    - 负载均衡：在健康且有空闲名额的副本中随机选择，概率与 权重 / (借出连接数 + 1) 成正比
+    - 健康状态：连续 failure_threshold 次连接失败（或查询中途的连接错误）后标记为不可用，retry_interval 秒后再试
+    - 故障转移：read_with_failover 中的读取在副本上中途出错时，改由主库重试一次
+    - 读到自己的写入：写入后 read_your_writes 秒内同一上下文的读取走主库，
+      跨请求由调用方（如 Flask 的 Cookie）通过 pin_primary 延续
+    """
+    
+    def __init__(self, replicas, read_your_writes=5, failure_threshold=3, retry_interval=30):
+        self.replicas = list(replicas)
+        self.read_your_writes = read_your_writes
+        self.failure_threshold = failure_threshold
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self.primary_reads = 0
+        self.fallbacks = 0
+        self.failovers = 0
+    
+    # ---- 读到自己的写入 ----
+    
+    def record_write(self):
+        """记录当前上下文发生了写入，返回此后读取主库的截止时间"""
+        deadline = time.time() + self.read_your_writes
+        if deadline > _primary_until.get():
+            _primary_until.set(deadline)
+        return deadline
+    
+    def pin_primary(self, until):
+        """在当前上下文中将读取固定到主库直到 until，返回用于 reset 的令牌"""
+        return _primary_until.set(max(until, _primary_until.get()))
+    
+    def reset(self, token):
+        _primary_until.reset(token)
+    
+    def primary_until(self):
+        """当前上下文读取主库的截止时间（0 表示没有写入）"""
+        return _primary_until.get()
+    
+    def primary_pinned(self):
+        return time.time() < _primary_until.get()
+    
+    # ---- 路由 ----
+    
+    def acquire(self):
+        """
+        从副本借出连接；读取需要走主库或所有副本都不可用时返回 None，由调用方使用主库
+        """
+        if self.primary_pinned():
+            with self._lock:
+                self.primary_reads += 1
+            return None
+        tried = set()
+        while True:
+            replica = self._choose(tried)
+            if replica is None:
+                with self._lock:
+                    self.fallbacks += 1
+                return None
+            tried.add(replica.name)
+            try:
+                conn = replica.pool.acquire()
+            except PoolTimeoutError:
+                # 副本连接耗尽不代表不可用，换下一个副本
+                continue
+            except Exception as e:
+                self._mark_failure(replica, e)
+                continue
+            self._mark_success(replica)
+            _read_replica.set(replica)
+            return conn
+    
+    def read_with_failover(self, read, is_retryable):
+        """
+        执行读取 read() 并返回结果
+        
+        读取使用的副本连接在查询中途出错、且 is_retryable(异常) 为 True（如连接断开等 OperationalError）时，
+        记为该副本的一次失败，并将读取固定到主库重试一次；其他异常和主库上的错误原样抛出。
+        """
+        token = _read_replica.set(None)
+        try:
+            result = read()
+            replica = _read_replica.get()
+            if replica is not None:
+                self._mark_read_succeeded(replica)
+            return result
+        except Exception as e:
+            replica = _read_replica.get()
+            if replica is None or not is_retryable(e):
+                raise
+            logger.warning('只读副本 %s 查询失败，改由主库重试: %s', replica.name, e)
+            self._mark_failure(replica, e)
+            with self._lock:
+                self.failovers += 1
+        finally:
+            _read_replica.reset(token)
+        pin = _primary_until.set(float('inf'))
+        try:
+            return read()
+        finally:
+            _primary_until.reset(pin)
+    
+    def _choose(self, tried):
+        now = time.monotonic()
+        candidates = []
+        with self._lock:
+            for replica in self.replicas:
+                if replica.name in tried:
+                    continue
+                if not replica.healthy and now - replica.down_since < self.retry_interval:
+                    continue
+                candidates.append(replica)
+        # 连接已全部借出的副本不参与选择（否则要等待借出超时），都满时由主库承担
+        choices = []
+        weights = []
+        for replica in candidates:
+            stats = replica.pool.stats()
+            if stats['in_use'] < stats['max_size']:
+                choices.append(replica)
+                weights.append(replica.weight / (stats['in_use'] + 1))
+        if not choices:
+            return None
+        return random.choices(choices, weights=weights)[0]
+    
+    def _mark_success(self, replica):
+        # 连续失败次数在读取成功后才清零（见 _mark_read_succeeded）：能连接但查询总是出错的副本也会被暂停使用
+        with self._lock:
+            replica.reads += 1
+            if not replica.healthy:
+                logger.info('只读副本 %s 已恢复', replica.name)
+                replica.healthy = True
+                replica.down_since = None
+    
+    def _mark_read_succeeded(self, replica):
+        with self._lock:
+            replica.failures = 0
+    
+    def _mark_failure(self, replica, error):
+        with self._lock:
+            replica.errors += 1
+            replica.failures += 1
+            if not replica.healthy:
+                # 恢复重试失败，重新计时
+                replica.down_since = time.monotonic()
+            elif replica.failures >= self.failure_threshold:
+                logger.warning('只读副本 %s 连续 %d 次连接或查询失败，暂停使用: %s',
+                               replica.name, replica.failures, error)
+                replica.healthy = False
+                replica.down_since = time.monotonic()
+    
+    def stats(self):
+        """返回各副本的健康状态和读取次数"""
+        with self._lock:
+            replicas = [
+                {
+                    'name': replica.name,
+                    'weight': replica.weight,
+                    'healthy': replica.healthy,
+                    'consecutive_failures': replica.failures,
+                    'reads': replica.reads,
+                    'errors': replica.errors,
+                }
+                for replica in self.replicas
+            ]
+            primary_reads, fallbacks, failovers = self.primary_reads, self.fallbacks, self.failovers
+        for item, replica in zip(replicas, self.replicas):
+            item['pool'] = replica.pool.stats()
+        return {
+            'replicas': replicas,
+            'primary_reads': primary_reads,
+            'fallbacks': fallbacks,
+            'failovers': failovers,
+        }
+    
+    def close(self):
+        for replica in self.replicas:
+            replica.pool.close()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+表结构与索引模块
+定义 book 表查询所需的覆盖索引，生成创建语句，读取索引定义和使用情况
+"""
+
+# book 表的全部列（聚集主键 book_id 之外的列作为覆盖索引的 INCLUDE 列）
+BOOK_COLUMNS = (
+    'book_id', 'book_name', 'book_isbn', 'book_author',
+    'book_publisher', 'book_price', 'interview_times'
+)
+
+# 覆盖索引：索引名 -> 键列 [(列名, 排序方向)]
+# - 每个可排序列以 (列, book_id) 为键，与分页的 ORDER BY 和键集分页的定位条件一致
+# - interview_times DESC 用于最受欢迎图书和相关图书排序
+# - book_publisher、book_author 同时用于统计分组、相关图书和筛选选项分组
+BOOK_INDEXES = {
+    'IX_book_interview_times': (('interview_times', 'DESC'), ('book_id', 'ASC')),
+    'IX_book_publisher': (('book_publisher', 'ASC'), ('book_id', 'ASC')),
+    'IX_book_author': (('book_author', 'ASC'), ('book_id', 'ASC')),
+    'IX_book_name': (('book_name', 'ASC'), ('book_id', 'ASC')),
+    'IX_book_price': (('book_price', 'ASC'), ('book_id', 'ASC')),
+}
+
+
+def include_columns(key_columns):
+    """覆盖索引的 INCLUDE 列：键列和聚集主键之外的全部列"""
+    keys = {column for column, _ in key_columns}
+    return [column for column in BOOK_COLUMNS if column not in keys and column != 'book_id']
+
+
+def create_index_sql(name, key_columns):
+    """生成 CREATE INDEX 语句"""
+    keys = ', '.join(f'{column} {direction}' for column, direction in key_columns)
+    return (
+        f"CREATE NONCLUSTERED INDEX {name} ON book ({keys}) "
+        f"INCLUDE ({', '.join(include_columns(key_columns))})"
+    )
+
+
+# 读取 book 表现有索引的键列和 INCLUDE 列
+INDEX_COLUMNS_SQL = """
+    SELECT
+        i.name as index_name,
+        c.name as column_name,
+        ic.key_ordinal,
+        ic.is_descending_key,
+        ic.is_included_column
+    FROM sys.indexes i
+    JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+    JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+    WHERE i.object_id = OBJECT_ID('book') AND i.index_id > 0
+    ORDER BY i.name, ic.key_ordinal, c.name
+"""
+
+# 读取 book 表各索引的使用统计（计数在 SQL Server 重启后清零）
+INDEX_USAGE_SQL = """
+    SELECT
+        i.name as index_name,
+        i.type_desc,
+        ISNULL(s.user_seeks, 0) as user_seeks,
+        ISNULL(s.user_scans, 0) as user_scans,
+        ISNULL(s.user_lookups, 0) as user_lookups,
+        ISNULL(s.user_updates, 0) as user_updates,
+        s.last_user_seek,
+        s.last_user_scan
+    FROM sys.indexes i
+    LEFT JOIN sys.dm_db_index_usage_stats s
+        ON s.object_id = i.object_id AND s.index_id = i.index_id AND s.database_id = DB_ID()
+    WHERE i.object_id = OBJECT_ID('book') AND i.index_id > 0
+    ORDER BY i.index_id
+"""
+
+
+def parse_index_columns(rows):
+    """将 INDEX_COLUMNS_SQL 的结果整理为 索引名 -> {'keys': [(列, 方向)], 'include': {列}}"""
+    indexes = {}
+    for row in rows:
+        index = indexes.setdefault(row['index_name'], {'keys': [], 'include': set()})
+        if row['is_included_column']:
+            index['include'].add(row['column_name'])
+        else:
+            index['keys'].append((row['column_name'], 'DESC' if row['is_descending_key'] else 'ASC'))
+    return indexes
+
+
+def check_index(name, key_columns, existing):
+    """
+    比较索引定义与数据库中的现有索引
+    
+    返回 'missing'（不存在）、'ok'（一致）或 'mismatch'（同名索引的键列或 INCLUDE 列不同）。
+    """
+    index = existing.get(name)
+    if index is None:
+        return 'missing'
+    if index['keys'] != list(key_columns):
+        return 'mismatch'
+    if not set(include_columns(key_columns)) <= index['include']:
+        return 'mismatch'
+    return 'ok'
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+图书搜索引擎模块
+提供可切换的搜索实现：数据库 LIKE 模糊匹配，或内存中的字符 n-gram 倒排索引
+"""
+
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 参与搜索的字段及其排序权重（命中书名优先于作者、出版社、ISBN）
+SEARCH_FIELDS = ('book_name', 'book_author', 'book_isbn', 'book_publisher')
+FIELD_WEIGHTS = {
+    'book_name': 4,
+    'book_author': 3,
+    'book_publisher': 2,
+    'book_isbn': 1,
+}
+
+
+class LikeSearchEngine:
+    """
+    旧的搜索方式：由数据库对各字段执行 LIKE '%关键词%'
+    
+    不维护任何索引，BookDB 检测到 uses_index 为 False 时直接生成 LIKE 条件。
+    """
+    
+    uses_index = False
+    
+    def on_books_changed(self, changes):
+        pass
+
+
+class NgramSearchIndex:
+    """
+    字符 n-gram 倒排索引
+    
+    - 对每个字段同时索引 1-gram 和 n-gram，中文书名无需分词即可做子串匹配
+    - 候选集由各 gram 的倒排列表求交集得到，再用子串校验去除误命中，结果与 LIKE 一致
+    - 结果按字段权重和匹配程度（完全相等 > 前缀 > 包含）排序，同分按借阅次数
+    - 通过 on_books_changed 增量更新；可设置定期全量重建，以同步其他进程的写入
+    """
+    
+    uses_index = True
+    
+    def __init__(self, loader, ngram_size=2, rebuild_interval=None):
+        if ngram_size < 1:
+            raise ValueError('ngram_size 必须大于 0')
+        self._loader = loader
+        self.ngram_size = ngram_size
+        self.rebuild_interval = rebuild_interval
+        
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._postings = {}
+        self._docs = {}
+        self._built_at = None
+        self._building = False
+        self._refreshing = False
+        self._pending = []
+    
+    # ---- 查询 ----
+    
+    def search(self, keyword, fields=None):
+        """返回按相关度排序的图书ID列表；fields 为空时搜索全部字段"""
+        keyword = _normalize(keyword)
+        if not keyword:
+            return []
+        self.ensure_built()
+        
+        field_indexes = self._field_indexes(fields)
+        grams = self._query_grams(keyword)
+        scores = {}
+        with self._lock:
+            for field_idx in field_indexes:
+                for book_id in self._candidates(field_idx, grams):
+                    text = self._docs[book_id][0][field_idx]
+                    if keyword not in text:
+                        continue
+                    if text == keyword:
+                        quality = 3
+                    elif text.startswith(keyword):
+                        quality = 2
+                    else:
+                        quality = 1
+                    weight = FIELD_WEIGHTS[SEARCH_FIELDS[field_idx]]
+                    scores[book_id] = scores.get(book_id, 0) + weight * quality
+            popularity = {book_id: self._docs[book_id][1] for book_id in scores}
+        
+        return sorted(scores, key=lambda book_id: (-scores[book_id], -popularity[book_id], book_id))
+    
+    def _candidates(self, field_idx, grams):
+        postings = []
+        for gram in grams:
+            posting = self._postings.get((field_idx, gram))
+            if not posting:
+                return ()
+            postings.append(posting)
+        postings.sort(key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result &= posting
+            if not result:
+                break
+        return result
+    
+    def _query_grams(self, keyword):
+        if len(keyword) < self.ngram_size:
+            return set(keyword)
+        return _ngrams(keyword, self.ngram_size)
+    
+    @staticmethod
+    def _field_indexes(fields):
+        if not fields:
+            return range(len(SEARCH_FIELDS))
+        if isinstance(fields, str):
+            fields = [fields]
+        return [SEARCH_FIELDS.index(field) for field in fields if field in SEARCH_FIELDS]
+    
+    # ---- 构建与增量更新 ----
+    
+    def ensure_built(self):
+        """首次查询时构建索引；超过重建间隔时在后台线程重建，期间继续使用旧索引"""
+        if self._built_at is None:
+            self.rebuild(only_if_missing=True)
+            return
+        if self.rebuild_interval is None or time.monotonic() - self._built_at <= self.rebuild_interval:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name='search-index-rebuild', daemon=True).start()
+    
+    def rebuild(self, only_if_missing=False):
+        """从数据库全量重建索引"""
+        with self._build_lock:
+            if only_if_missing and self._built_at is not None:
+                return
+            with self._lock:
+                self._building = True
+                self._pending = []
+            try:
+                books = self._loader()
+                postings = {}
+                docs = {}
+                for book in books:
+                    self._add_doc(postings, docs, book)
+                with self._lock:
+                    # 构建期间发生的写入在新索引上重放，避免被旧快照覆盖
+                    pending, self._pending = self._pending, []
+                    self._postings = postings
+                    self._docs = docs
+                    for old, new in pending:
+                        self._apply_change(old, new)
+                    self._built_at = time.monotonic()
+            finally:
+                with self._lock:
+                    self._building = False
+                    self._pending = []
+    
+    def _refresh(self):
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception('重建搜索索引失败')
+        finally:
+            with self._lock:
+                self._refreshing = False
+    
+    def on_books_changed(self, changes):
+        """
+        写入监听：changes 为 (旧记录, 新记录) 列表
+        
+        新增时旧记录为 None，删除时新记录为 None。
+        """
+        with self._lock:
+            if self._building:
+                self._pending.extend(changes)
+            if self._built_at is None:
+                return
+            for old, new in changes:
+                self._apply_change(old, new)
+    
+    def _apply_change(self, old, new):
+        if old is not None:
+            self._remove_doc(_doc_key(old['book_id']))
+        if new is not None:
+            self._remove_doc(_doc_key(new['book_id']))
+            self._add_doc(self._postings, self._docs, new)
+    
+    def _add_doc(self, postings, docs, book):
+        key = _doc_key(book['book_id'])
+        texts = tuple(_normalize(book.get(field)) for field in SEARCH_FIELDS)
+        docs[key] = (texts, book.get('interview_times') or 0)
+        for field_idx, text in enumerate(texts):
+            for gram in self._doc_grams(text):
+                postings.setdefault((field_idx, gram), set()).add(key)
+    
+    def _remove_doc(self, key):
+        doc = self._docs.pop(key, None)
+        if doc is None:
+            return
+        for field_idx, text in enumerate(doc[0]):
+            for gram in self._doc_grams(text):
+                posting = self._postings.get((field_idx, gram))
+                if posting is not None:
+                    posting.discard(key)
+                    if not posting:
+                        del self._postings[(field_idx, gram)]
+    
+    def _doc_grams(self, text):
+        grams = set(text)
+        if self.ngram_size > 1:
+            grams |= _ngrams(text, self.ngram_size)
+        return grams
+    
+    def stats(self):
+        """返回索引规模信息"""
+        with self._lock:
+            return {
+                'documents': len(self._docs),
+                'grams': len(self._postings),
+                'built': self._built_at is not None,
+                'age': None if self._built_at is None else round(time.monotonic() - self._built_at, 1),
+            }
+
+
+def create_search_engine(config, loader):
+    """根据配置创建搜索引擎：'like' 或 'ngram'"""
+    engine = config.get('engine', 'like')
+    if engine == 'ngram':
+        return NgramSearchIndex(
+            loader,
+            ngram_size=config.get('ngram_size', 2),
+            rebuild_interval=config.get('rebuild_interval'),
+        )
+    if engine == 'like':
+        return LikeSearchEngine()
+    raise ValueError(f'未知的搜索引擎类型: {engine}')
+
+
+def _normalize(value):
+    """统一转为小写并去除首尾空白（与数据库不区分大小写的排序规则一致）"""
+    if value is None:
+        return ''
+    return str(value).strip().lower()
+
+
+def _doc_key(book_id):
+    # CHAR(8) 列查询结果带尾部空格，统一去除后作为索引键
+    return str(book_id).rstrip()
+
+
+def _ngrams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+语句缓存模块
+将动态拼接的查询规范化为有限个参数化语句模板并缓存，通过 sp_executesql 执行，
+相同模板的查询在 SQL Server 中共用一个执行计划
+"""
+
+import datetime
+import re
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+
+_PLACEHOLDER = re.compile(r'%[s%]')
+
+
+def sql_type(value):
+    """参数的 SQL Server 类型（同一模板同一位置的类型固定，保证参数声明不变）"""
+    if isinstance(value, bool):
+        return 'BIT'
+    if isinstance(value, int):
+        return 'BIGINT'
+    if isinstance(value, float):
+        return 'FLOAT'
+    if isinstance(value, Decimal):
+        return 'MONEY'
+    if isinstance(value, datetime.datetime):
+        return 'DATETIME2'
+    if isinstance(value, (bytes, bytearray)):
+        return 'VARBINARY(MAX)'
+    # 超过 4000 字符的字符串（如搜索索引传入的图书ID列表）需要 NVARCHAR(MAX)，否则会被截断
+    if value is not None and len(str(value)) > 4000:
+        return 'NVARCHAR(MAX)'
+    return 'NVARCHAR(4000)'
+
+
+class Statement:
+    """
+    参数化语句模板
+    
+    sql 使用 %s 占位符（与 pymssql 一致），构造时转换为 @p0、@p1 ... 命名参数，
+    并生成调用 sp_executesql 的语句；执行时只代入参数值。
+    """
+    
+    def __init__(self, sql, param_types):
+        self.sql = sql
+        self.param_types = param_types
+        self.executions = 0
+        
+        counter = iter(range(len(param_types) + 1))
+        
+        def replace(match):
+            if match.group() == '%%':
+                return '%'
+            return f'@p{next(counter)}'
+        
+        self.text = _PLACEHOLDER.sub(replace, sql)
+        self.declaration = ', '.join(f'@p{i} {kind}' for i, kind in enumerate(param_types))
+        if param_types:
+            assignments = ''.join(f', @p{i} = %s' for i in range(len(param_types)))
+            self.exec_sql = f'EXEC sp_executesql %s, %s{assignments}'
+        else:
+            self.exec_sql = 'EXEC sp_executesql %s'
+    
+    def bind(self, params):
+        """返回 (执行语句, 参数元组)"""
+        if self.param_types:
+            return self.exec_sql, (self.text, self.declaration) + tuple(params)
+        return self.exec_sql, (self.text,)
+
+
+class StatementCache:
+    """
+    语句模板缓存（LRU）
+    
+    - 调用方以规范化的键（查询种类、条件片段、排序等）标识查询形状，键相同则 SQL 文本相同，
+      只在未命中时调用 build() 拼接 SQL
+    - 参数类型也是键的一部分，同一形状的模板声明始终一致
+    - parameterize 为 False 时直接执行拼接好的 SQL（由 pymssql 代入参数），仍复用模板文本
+    """
+    
+    def __init__(self, max_size=256, parameterize=True):
+        self.max_size = max_size
+        self.parameterize = parameterize
+        self._statements = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def statement(self, key, build, params):
+        """返回 key 对应的语句模板，未命中时调用 build() 构建"""
+        cache_key = (key, tuple(sql_type(param) for param in params))
+        with self._lock:
+            statement = self._statements.get(cache_key)
+            if statement is not None:
+                self._statements.move_to_end(cache_key)
+                self.hits += 1
+                statement.executions += 1
+                return statement
+            self.misses += 1
+        
+        # 在锁外拼接 SQL；并发构建同一模板时以先写入的为准
+        statement = Statement(build(), cache_key[1])
+        with self._lock:
+            statement = self._statements.setdefault(cache_key, statement)
+            self._statements.move_to_end(cache_key)
+            statement.executions += 1
+            while len(self._statements) > self.max_size:
+                self._statements.popitem(last=False)
+                self.evictions += 1
+        return statement
+    
+    def execute(self, cursor, key, build, params=()):
+        """按模板执行查询"""
+        params = list(params)
+        statement = self.statement(key, build, params)
+        if self.parameterize:
+            cursor.execute(*statement.bind(params))
+        else:
+            cursor.execute(statement.sql, tuple(params))
+    
+    def clear(self):
+        with self._lock:
+            self._statements.clear()
+    
+    def stats(self, top=10):
+        """返回命中率和执行次数最多的模板"""
+        with self._lock:
+            total = self.hits + self.misses
+            statements = sorted(self._statements.items(), key=lambda item: -item[1].executions)
+            return {
+                'statements': len(self._statements),
+                'max_size': self.max_size,
+                'parameterize': self.parameterize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'top': [
+                    {'key': repr(key[0]), 'executions': statement.executions}
+                    for key, statement in statements[:top]
+                ],
+            }
+
+
+# 读取服务器计划缓存中 book 表查询的复用情况（需要 VIEW SERVER STATE 权限）
+PLAN_CACHE_SQL = """
+    SELECT TOP (%s)
+        cp.objtype,
+        cp.usecounts,
+        cp.size_in_bytes,
+        LEFT(st.text, 200) as text
+    FROM sys.dm_exec_cached_plans cp
+    CROSS APPLY sys.dm_exec_sql_text(cp.plan_handle) st
+    WHERE st.dbid = DB_ID() AND st.text LIKE '%%FROM book%%'
+    ORDER BY cp.usecounts DESC
+"""
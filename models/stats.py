@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+统计数据增量维护模块
+由 BookDB 的写入监听驱动，读取统计数据时无需访问数据库
+"""
+
+import heapq
+import logging
+import threading
+from datetime import datetime
+from decimal import Decimal
+
+logger = logging.getLogger(__name__)
+
+# 价格以万分之一元为单位的整数保存（与 MONEY 精度一致），累加不产生浮点误差
+PRICE_SCALE = 10000
+
+
+class StatisticsAggregator:
+    """
+    统计数据聚合器
+    
+    - 一次预热扫描后，按 (旧记录, 新记录) 增量维护总数、价格合计、借阅合计和出版社分布
+    - 最低/最高价格、最受欢迎图书使用堆维护，删除采用惰性失效（取堆顶时丢弃过期条目）
+    - reconcile() 从数据库重新计算并报告偏差，有偏差时以数据库为准重新预热
+    """
+    
+    def __init__(self, loader):
+        self._loader = loader
+        self._lock = threading.RLock()
+        self._warm_lock = threading.Lock()
+        self._warmed = False
+        self._warming = False
+        self._pending = []
+        self._reset()
+        self.last_reconcile = None
+        self._reconciler = None
+        self._stop_event = threading.Event()
+    
+    def _reset(self):
+        self._books = {}
+        self._publishers = {}
+        self._price_counts = {}
+        self._min_heap = []
+        self._max_heap = []
+        self._popular_heap = []
+        self._price_sum = 0
+        self._total_borrows = 0
+    
+    # ---- 预热与增量更新 ----
+    
+    def warm(self, force=False):
+        """从数据库扫描一次，建立全部聚合值"""
+        with self._warm_lock:
+            if self._warmed and not force:
+                return
+            with self._lock:
+                self._warming = True
+                self._pending = []
+            try:
+                books = self._loader()
+                with self._lock:
+                    self._reset()
+                    for book in books:
+                        self._add(book)
+                    # 预热期间发生的写入在新数据上重放
+                    for old, new in self._pending:
+                        self._apply(old, new)
+                    self._warmed = True
+            finally:
+                with self._lock:
+                    self._warming = False
+                    self._pending = []
+    
+    def on_books_changed(self, changes):
+        """写入监听：changes 为 (旧记录, 新记录) 列表"""
+        with self._lock:
+            if self._warming:
+                self._pending.extend(changes)
+            if not self._warmed:
+                return
+            for old, new in changes:
+                self._apply(old, new)
+    
+    def _apply(self, old, new):
+        if old is not None:
+            self._remove(_key(old['book_id']))
+        if new is not None:
+            self._remove(_key(new['book_id']))
+            self._add(new)
+    
+    def _add(self, book):
+        key = _key(book['book_id'])
+        price = _price_units(book['book_price'])
+        times = int(book['interview_times'] or 0)
+        publisher = book['book_publisher']
+        self._books[key] = (book['book_name'], publisher, price, times)
+        
+        self._publishers[publisher] = self._publishers.get(publisher, 0) + 1
+        self._price_sum += price
+        self._total_borrows += times
+        if price not in self._price_counts:
+            heapq.heappush(self._min_heap, price)
+            heapq.heappush(self._max_heap, -price)
+        self._price_counts[price] = self._price_counts.get(price, 0) + 1
+        heapq.heappush(self._popular_heap, (-times, key))
+        self._compact()
+    
+    def _remove(self, key):
+        record = self._books.pop(key, None)
+        if record is None:
+            return
+        _, publisher, price, times = record
+        
+        count = self._publishers.get(publisher, 0) - 1
+        if count > 0:
+            self._publishers[publisher] = count
+        else:
+            self._publishers.pop(publisher, None)
+        self._price_sum -= price
+        self._total_borrows -= times
+        count = self._price_counts.get(price, 0) - 1
+        if count > 0:
+            self._price_counts[price] = count
+        else:
+            self._price_counts.pop(price, None)
+    
+    def _compact(self):
+        """过期条目过多时重建堆，避免堆无限增长"""
+        limit = 2 * len(self._books) + 64
+        if len(self._popular_heap) > limit:
+            self._popular_heap = [(-record[3], key) for key, record in self._books.items()]
+            heapq.heapify(self._popular_heap)
+        if len(self._min_heap) > limit:
+            self._min_heap = list(self._price_counts)
+            heapq.heapify(self._min_heap)
+            self._max_heap = [-price for price in self._price_counts]
+            heapq.heapify(self._max_heap)
+    
+    # ---- 读取 ----
+    
+    def snapshot(self):
+        """返回与 BookDB.get_statistics 相同格式的统计数据"""
+        self.warm()
+        with self._lock:
+            total = len(self._books)
+            min_price = self._peek_price(self._min_heap, 1)
+            max_price = self._peek_price(self._max_heap, -1)
+            popular = self._peek_popular()
+            publishers = heapq.nsmallest(5, self._publishers.items(), key=lambda item: (-item[1], item[0]))
+            return {
+                'total': total,
+                'avg_price': round(self._price_sum / PRICE_SCALE / total, 2) if total else 0.0,
+                'total_borrows': self._total_borrows,
+                'popular_book': popular[0] if popular else '无',
+                'popular_borrows': popular[3] if popular else 0,
+                'min_price': min_price / PRICE_SCALE if min_price is not None else 0.0,
+                'max_price': max_price / PRICE_SCALE if max_price is not None else 0.0,
+                'publishers': [{'book_publisher': name, 'count': count} for name, count in publishers]
+            }
+    
+    def _peek_price(self, heap, sign):
+        while heap:
+            price = heap[0] * sign
+            if price in self._price_counts:
+                return price
+            heapq.heappop(heap)
+        return None
+    
+    def _peek_popular(self):
+        while self._popular_heap:
+            neg_times, key = self._popular_heap[0]
+            record = self._books.get(key)
+            if record is not None and record[3] == -neg_times:
+                return record
+            heapq.heappop(self._popular_heap)
+        return None
+    
+    # ---- 对账 ----
+    
+    def reconcile(self, query_actual):
+        """
+        与数据库对账
+        
+        query_actual() 返回由SQL重新计算的统计数据；比较各项聚合值，
+        记录偏差报告，存在偏差时重新预热。返回报告字典。
+        """
+        actual = query_actual()
+        maintained = self.snapshot()
+        drift = {}
+        for field in ('total', 'avg_price', 'total_borrows', 'popular_borrows', 'min_price', 'max_price'):
+            if not _same(maintained[field], actual[field]):
+                drift[field] = {'maintained': maintained[field], 'actual': actual[field]}
+        # 按出版社比较各自的图书数量（数量相同但出版社不同也视为偏差）
+        if _publisher_counts(maintained) != _publisher_counts(actual):
+            drift['publishers'] = {'maintained': maintained['publishers'], 'actual': actual['publishers']}
+        
+        report = {
+            'checked_at': datetime.now().isoformat(timespec='seconds'),
+            'in_sync': not drift,
+            'drift': drift
+        }
+        if drift:
+            logger.warning('统计数据与数据库存在偏差，已重新预热: %s', drift)
+            self.warm(force=True)
+        self.last_reconcile = report
+        return report
+    
+    def start_reconciler(self, interval, reconcile):
+        """启动后台对账线程（每个进程只启动一次），每隔 interval 秒调用 reconcile()"""
+        if not interval or self._reconciler is not None:
+            return
+        with self._lock:
+            if self._reconciler is not None:
+                return
+            self._reconciler = threading.Thread(
+                target=self._reconcile_loop,
+                args=(interval, reconcile),
+                name='statistics-reconciler',
+                daemon=True
+            )
+        self._reconciler.start()
+    
+    def stop_reconciler(self):
+        self._stop_event.set()
+    
+    def _reconcile_loop(self, interval, reconcile):
+        while not self._stop_event.wait(interval):
+            try:
+                reconcile()
+            except Exception:
+                logger.exception('统计数据对账失败')
+
+
+def _key(book_id):
+    return str(book_id).rstrip()
+
+
+def _price_units(price):
+    if price is None:
+        return 0
+    return int((Decimal(str(price)) * PRICE_SCALE).to_integral_value())
+
+
+def _publisher_counts(statistics):
+    # 出版社名称忽略尾部空格（与数据库比较规则一致）
+    return {
+        (p['book_publisher'] or '').rstrip(): p['count']
+        for p in statistics['publishers']
+    }
+
+
+def _same(a, b):
+    if isinstance(a, float) or isinstance(b, float):
+        return abs(float(a) - float(b)) < 0.005
+    return a == b
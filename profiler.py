@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+采样分析模块
+按需开启一段时间的采样：后台线程定期通过 sys._current_frames() 读取各工作线程的调用栈，
+按请求路由（或后台任务）汇总为折叠栈（可直接用 flamegraph.pl / speedscope 生成火焰图），
+并统计各路由的 CPU 时间与等待时间（数据库、网络、锁等）
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class ProfilerBusyError(Exception):
+    """已有采样正在进行"""
+    pass
+
+
+def _frame_name(code):
+    filename = code.co_filename
+    if filename.startswith(_ROOT):
+        filename = os.path.relpath(filename, _ROOT)
+    else:
+        # 标准库和第三方库只保留包内路径
+        parts = filename.replace('\\', '/').split('/')
+        filename = '/'.join(parts[-2:])
+    return f'{code.co_name} ({filename}:{code.co_firstlineno})'.replace(';', ':')
+
+
+class _Session:
+    """一次采样的结果"""
+    
+    def __init__(self, interval):
+        self.interval = interval
+        self.started = time.perf_counter()
+        self.finished = None
+        self.samples = 0
+        self.stacks = Counter()
+        self.activity_samples = Counter()
+        # 路由 -> [请求数, 墙钟时间, CPU 时间]
+        self.routes = {}
+        self.lock = threading.Lock()
+    
+    def add_request(self, label, wall, cpu, requests=1):
+        with self.lock:
+            entry = self.routes.setdefault(label, [0, 0.0, 0.0])
+            entry[0] += requests
+            entry[1] += wall
+            entry[2] += cpu
+    
+    def collapsed(self):
+        """折叠栈文本：每行为“根;...;叶 次数”"""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+    
+    def report(self, top=20):
+        duration = (self.finished or time.perf_counter()) - self.started
+        with self.lock:
+            routes = {label: list(entry) for label, entry in self.routes.items()}
+        labels = set(routes) | set(self.activity_samples)
+        breakdown = {}
+        for label in sorted(labels):
+            requests, wall, cpu = routes.get(label, (0, 0.0, 0.0))
+            breakdown[label] = {
+                'requests': requests,
+                'wall_ms': round(wall * 1000, 1),
+                'cpu_ms': round(cpu * 1000, 1),
+                'wait_ms': round(max(wall - cpu, 0) * 1000, 1),
+                'cpu_ratio': round(cpu / wall, 3) if wall else None,
+                'samples': self.activity_samples.get(label, 0),
+            }
+        return {
+            'duration': round(duration, 3),
+            'interval': self.interval,
+            'samples': self.samples,
+            'routes': breakdown,
+            'top_stacks': [
+                {'stack': stack.split(';'), 'samples': count}
+                for stack, count in self.stacks.most_common(top)
+            ],
+        }
+
+
+class SamplingProfiler:
+    """
+    采样分析器
+    
+    - enter(label) / leave(token)：在工作线程中标记当前正在处理的路由或后台任务，
+      未标记的线程（空闲的服务线程、线程池等）不采样；leave 时记录本次处理的墙钟时间和
+      CPU 时间（time.thread_time），两者之差即等待时间
+    - enter_task(label) / leave(token)：线程池线程为某个请求执行部分工作（如异步视图并发的查询）时，
+      调用栈归入该请求的路由，CPU 时间计入该路由，但不计为一次请求
+    - run(seconds)：阻塞采样 seconds 秒，返回 _Session；同一时间只能有一次采样
+    - interval：采样间隔（秒），采样线程只在采样期间存在
+    """
+    
+    def __init__(self, interval=0.01, max_seconds=60, max_depth=128):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.max_depth = max_depth
+        self._activities = {}
+        self._session = None
+        self._lock = threading.Lock()
+    
+    def enter(self, label):
+        ident = threading.get_ident()
+        self._activities[ident] = label
+        return (ident, label, time.perf_counter(), time.thread_time())
+    
+    def enter_task(self, label):
+        ident = threading.get_ident()
+        self._activities[ident] = label
+        return (ident, label, None, time.thread_time())
+    
+    def leave(self, token):
+        ident, label, started, cpu_started = token
+        self._activities.pop(ident, None)
+        session = self._session
+        if session is None:
+            return
+        cpu = time.thread_time() - cpu_started
+        if started is None:
+            # 请求的墙钟时间已包含等待本任务的时间，这里只补上任务线程的 CPU 时间
+            session.add_request(label, 0.0, cpu, requests=0)
+        else:
+            session.add_request(label, time.perf_counter() - started, cpu)
+    
+    def current(self):
+        """本线程正在处理的路由或后台任务（未标记时为 None）"""
+        return self._activities.get(threading.get_ident())
+    
+    def activity(self, label):
+        """上下文管理器形式的 enter/leave，用于后台任务"""
+        return _Activity(self, label)
+    
+    @property
+    def running(self):
+        return self._session is not None
+    
+    def run(self, seconds, interval=None):
+        seconds = min(float(seconds), self.max_seconds)
+        interval = max(float(interval or self.interval), 0.001)
+        with self._lock:
+            if self._session is not None:
+                raise ProfilerBusyError('已有采样正在进行，请稍后再试')
+            session = self._session = _Session(interval)
+        try:
+            sampler = threading.Thread(target=self._sample, args=(session, seconds), name='profiler', daemon=True)
+            sampler.start()
+            sampler.join()
+        finally:
+            session.finished = time.perf_counter()
+            self._session = None
+        return session
+    
+    def _sample(self, session, seconds):
+        own = threading.get_ident()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            activities = dict(self._activities)
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                label = activities.get(ident)
+                if label is None:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    stack.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack.append(f'[{label}]')
+                session.stacks[';'.join(reversed(stack))] += 1
+                session.activity_samples[label] += 1
+            del frames
+            session.samples += 1
+            time.sleep(session.interval)
+
+
+class _Activity:
+    def __init__(self, profiler, label):
+        self._profiler = profiler
+        self._label = label
+    
+    def __enter__(self):
+        self._token = self._profiler.enter(self._label)
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self._profiler.leave(self._token)
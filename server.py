@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+生产环境入口：gunicorn 预分叉多进程（需要 pip install gunicorn，仅支持 Linux / macOS）
+    python server.py
+    python server.py --workers 4 --threads 8 --bind 0.0.0.0:5000
+
+- 主进程加载 app.py 并构建内存索引和统计聚合，fork 后各工作进程通过写时复制共享，
+  主进程在 fork 前关闭预热用的连接
+- 多个工作进程时开启共享状态目录（DB_CONFIG['serving']['state_dir']，未配置时创建临时目录）：
+  各进程的写入通过该目录通知其他进程更新内存索引、统计聚合和缓存，导入任务可由任意进程查询和取消；
+  /metrics 和 /api/queries/status 仍是响应请求的那个进程的统计（带 pid）
+- 每个工作进程启动后丢弃继承的连接，预热自己的连接池和统计缓存，完成后才开始接受请求
+- SIGTERM 时先进入排空期（drain_seconds，/healthz 返回 503，仍正常处理请求），
+  再停止接受新连接，在 graceful_timeout 内处理完已接受的请求和执行中的导入任务后退出
+
+Windows 上没有 fork，可使用 uvicorn asgi:application --workers N。
+"""
+
+import argparse
+import logging
+import multiprocessing
+import shutil
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+from config import DB_CONFIG
+
+try:
+    from gunicorn.app.base import BaseApplication
+except ImportError:
+    BaseApplication = object
+
+logger = logging.getLogger(__name__)
+
+
+def default_workers():
+    return multiprocessing.cpu_count() * 2 + 1
+
+
+def server_config(overrides=None):
+    """DB_CONFIG['serving'] 与命令行参数合并后的配置"""
+    config = {
+        'bind': '0.0.0.0:5000',
+        'workers': None,
+        'threads': 4,
+        'timeout': 60,
+        'graceful_timeout': 30,
+        'drain_seconds': 0,
+        'keepalive': 5,
+        'max_requests': 0,
+        'max_requests_jitter': 0,
+        'warm_up': True,
+        'state_dir': None,
+    }
+    config.update(DB_CONFIG.get('serving', {}))
+    config.update({key: value for key, value in (overrides or {}).items() if value is not None})
+    if not config['workers']:
+        config['workers'] = default_workers()
+    return config
+
+
+class PreforkServer(BaseApplication):
+    """以预加载方式运行 app.py 的 gunicorn 应用"""
+    
+    def __init__(self, config):
+        self.config = config
+        self._temp_state_dir = None
+        super().__init__()
+    
+    def load_config(self):
+        config = self.config
+        settings = {
+            'bind': config['bind'],
+            'workers': config['workers'],
+            'threads': config['threads'],
+            'worker_class': 'gthread',
+            'timeout': config['timeout'],
+            'graceful_timeout': config['graceful_timeout'],
+            'keepalive': config['keepalive'],
+            'max_requests': config['max_requests'],
+            'max_requests_jitter': config['max_requests_jitter'],
+            'preload_app': True,
+            'post_fork': self.post_fork,
+            'post_worker_init': self.post_worker_init,
+            'worker_exit': self.worker_exit,
+            'on_exit': self.on_exit,
+        }
+        for key, value in settings.items():
+            self.cfg.set(key, value)
+    
+    def load(self):
+        """在主进程中执行（preload_app）：加载应用，构建可由工作进程共享的内存数据"""
+        import app as web
+        if self.config['workers'] > 1 and web.db.change_feed is None:
+            # 在构建内存索引前开启：预热之后的写入都会通知到各工作进程
+            state_dir = self.config['state_dir']
+            if not state_dir:
+                state_dir = self._temp_state_dir = tempfile.mkdtemp(prefix='jy_server_')
+            web.enable_shared_state(state_dir)
+        if self.config['warm_up']:
+            started = time.perf_counter()
+            try:
+                timings = web.db.warm_up(connections=False)
+                logger.info('主进程预热完成，用时 %.3f 秒: %s', time.perf_counter() - started, timings)
+            except Exception as e:
+                # 数据库暂时不可用时照常启动，索引在首次使用时构建
+                logger.warning('主进程预热失败，改为首次使用时构建: %s', e)
+        # 预热用的连接不能带入子进程
+        web.db.close_connections()
+        return web.app
+    
+    def post_fork(self, server, worker):
+        import app as web
+        web.db.after_fork()
+        web.process_status['started_at'] = time.time()
+        if not self.config['warm_up']:
+            return
+        started = time.perf_counter()
+        try:
+            timings = web.db.warm_up(connections=True)
+        except Exception as e:
+            server.log.warning('工作进程 %s 预热失败: %s', worker.pid, e)
+            return
+        timings['total'] = round(time.perf_counter() - started, 3)
+        web.process_status['warm_up'] = timings
+        server.log.info('工作进程 %s 预热完成: %s', worker.pid, timings)
+    
+    def post_worker_init(self, worker):
+        """替换工作进程的 SIGTERM 处理：先排空 drain_seconds 秒，再按 gunicorn 的方式停止接受连接"""
+        import app as web
+        drain_seconds = self.config['drain_seconds']
+        handle_exit = worker.handle_exit
+        
+        def drain(sig, frame):
+            if web.process_status['draining']:
+                return
+            web.process_status['draining'] = True
+            worker.log.info('工作进程 %s 开始排空，%s 秒后停止接受连接', worker.pid, drain_seconds)
+            threading.Timer(drain_seconds, handle_exit, (sig, frame)).start()
+        
+        if drain_seconds:
+            signal.signal(signal.SIGTERM, drain)
+    
+    def worker_exit(self, server, worker):
+        """工作进程退出前：等待执行中的导入任务，关闭线程池和连接"""
+        import app as web
+        web.import_jobs.shutdown(wait=True)
+        web.adb.close(wait=False)
+        web.db.close_connections()
+    
+    def on_exit(self, server):
+        if self._temp_state_dir is not None:
+            shutil.rmtree(self._temp_state_dir, ignore_errors=True)
+
+
+def run(overrides=None):
+    if BaseApplication is object:
+        raise RuntimeError('多进程服务需要 gunicorn：pip install gunicorn（Windows 上请使用 uvicorn asgi:application）')
+    PreforkServer(server_config(overrides)).run()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python server.py', description='JY图书管理系统生产环境服务')
+    parser.add_argument('--bind', help='监听地址（默认 0.0.0.0:5000）')
+    parser.add_argument('--workers', type=int, help='工作进程数（默认 CPU 核数 × 2 + 1）')
+    parser.add_argument('--threads', type=int, help='每个工作进程的线程数')
+    parser.add_argument('--timeout', type=int, help='请求超时（秒），超时的工作进程被重启')
+    parser.add_argument('--graceful-timeout', type=int, help='收到 SIGTERM 后等待请求处理完的秒数')
+    parser.add_argument('--drain-seconds', type=float, help='停止接受连接前的排空秒数（/healthz 返回 503）')
+    parser.add_argument('--no-warm-up', dest='warm_up', action='store_false', default=None,
+                        help='不预热索引、连接池和统计缓存')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(process)d] [%(levelname)s] %(message)s')
+    try:
+        run(vars(args))
+    except RuntimeError as e:
+        print(e, file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -11,13 +11,22 @@ let currentFilters = {};
 // 保存选中的图书ID（用于批量操作）
 let selectedBookIds = new Set();
 
+// 连续滚动模式：按游标加载下一页并追加到列表末尾
+let infiniteScroll = false;
+let nextCursor = null;
+let loadingMore = false;
+let listVersion = 0;
+let scrollObserver = null;
+
 $(document).ready(function() {
-    // 加载统计数据
+    // 加载统计数据和图表（共用一次请求）
     loadStatistics();
     
-    // 加载图表
-    loadCharts();
-    
+    // 第一页已由服务端渲染，使用内嵌的数据渲染分页，不再重复请求
+    const initialData = $('#initialData');
+    if (initialData.length) {
+        updatePaging(JSON.parse(initialData.text()).pagination);
+    }
     
     // 搜索功能
     let searchTimeout;
@@ -52,6 +61,10 @@ $(document).ready(function() {
         bootstrap.Modal.getInstance(document.getElementById('deleteModal')).hide();
     });
     
+    // 出版社、作者输入联想
+    bindFilterSuggest('#filterPublisher', '#publisherSuggestions', 'publisher');
+    bindFilterSuggest('#filterAuthor', '#authorSuggestions', 'author');
+    
     // CSV文件选择
     $('#csvFile').on('change', function() {
         const file = this.files[0];
@@ -61,7 +74,8 @@ $(document).ready(function() {
     });
 });
 
-// 加载统计数据
+// 加载统计数据和图表
+// 服务端返回 ETag，数据未变化时浏览器收到 304 并直接使用缓存内容
 function loadStatistics() {
     $.ajax({
         url: '/api/statistics',
@@ -73,6 +87,8 @@ function loadStatistics() {
                 $('#avgPrice').text('¥' + data.avg_price.toFixed(2));
                 $('#totalBorrows').text(data.total_borrows);
                 $('#popularBook').text(data.popular_book + ' (' + data.popular_borrows + '次)');
+                drawPriceChart(data);
+                drawPublisherChart(data.publishers);
             }
         },
         error: function() {
@@ -81,21 +97,6 @@ function loadStatistics() {
     });
 }
 
-// 加载图表
-function loadCharts() {
-    $.ajax({
-        url: '/api/statistics',
-        type: 'GET',
-        success: function(response) {
-            if (response.success) {
-                const data = response.data;
-                drawPriceChart(data);
-                drawPublisherChart(data.publishers);
-            }
-        }
-    });
-}
-
 // 绘制价格分布图
 function drawPriceChart(data) {
     const ctx = document.getElementById('priceChart');
@@ -197,7 +198,7 @@ function loadBooks() {
         success: function(response) {
             if (response.success) {
                 renderBooks(response.data);
-                renderPagination(response.pagination);
+                updatePaging(response.pagination);
             } else {
                 showToast('加载图书列表失败', 'error');
             }
@@ -237,12 +238,14 @@ function renderBooks(books) {
     updateBatchActions();
 }
 
-// 渲染卡片视图
-function renderCardView(books) {
+// 渲染卡片视图（append 为 true 时追加到现有列表之后）
+function renderCardView(books, append = false) {
     const grid = $('#booksGrid');
-    grid.empty();
+    if (!append) {
+        grid.empty();
+    }
     
-    if (books.length === 0) {
+    if (books.length === 0 && !append) {
         grid.html(`
             <div class="col-12">
                 <div class="text-center py-5">
@@ -315,12 +318,14 @@ function renderCardView(books) {
     });
 }
 
-// 渲染表格视图
-function renderTableView(books) {
+// 渲染表格视图（append 为 true 时追加到现有列表之后）
+function renderTableView(books, append = false) {
     const tbody = $('#booksTable tbody');
-    tbody.empty();
+    if (!append) {
+        tbody.empty();
+    }
     
-    if (books.length === 0) {
+    if (books.length === 0 && !append) {
         tbody.html(`
             <tr>
                 <td colspan="9" class="text-center py-5">
@@ -427,6 +432,101 @@ function renderPagination(pagination) {
     `);
 }
 
+// 更新分页状态：分页模式渲染页码，连续滚动模式显示加载哨兵
+function updatePaging(pagination) {
+    listVersion++;
+    nextCursor = pagination.next_cursor;
+    if (infiniteScroll) {
+        $('#paginationNav').hide();
+        updateScrollSentinel();
+    } else {
+        renderPagination(pagination);
+    }
+}
+
+// 切换连续滚动模式（从第一页重新加载）
+function toggleInfiniteScroll() {
+    infiniteScroll = !infiniteScroll;
+    $('#viewScroll').toggleClass('active', infiniteScroll);
+    if (!infiniteScroll) {
+        $('#scrollSentinel').hide();
+    }
+    currentPage = 1;
+    if (isAdvancedFilterActive) {
+        loadFilteredBooks(currentFilters);
+    } else {
+        loadBooks();
+    }
+}
+
+function updateScrollSentinel() {
+    const sentinel = document.getElementById('scrollSentinel');
+    if (!infiniteScroll || !nextCursor) {
+        $(sentinel).hide();
+        return;
+    }
+    $(sentinel).show();
+    if (!scrollObserver) {
+        scrollObserver = new IntersectionObserver(entries => {
+            if (entries.some(entry => entry.isIntersecting)) {
+                loadMoreBooks();
+            }
+        }, { rootMargin: '200px' });
+    }
+    // 重新观察会立即回调一次：加载后哨兵仍在可视区域内时继续加载
+    scrollObserver.unobserve(sentinel);
+    scrollObserver.observe(sentinel);
+}
+
+// 按游标加载下一页并追加
+function loadMoreBooks() {
+    if (!infiniteScroll || !nextCursor || loadingMore) return;
+    loadingMore = true;
+    const version = listVersion;
+    const params = {
+        per_page: $('#perPage').val(),
+        sort_by: $('#sortBy').val(),
+        sort_order: $('#sortOrder').val(),
+        cursor: nextCursor
+    };
+    const request = isAdvancedFilterActive ? {
+        url: '/api/books/filter',
+        type: 'POST',
+        contentType: 'application/json',
+        data: JSON.stringify(Object.assign({ filters: currentFilters }, params))
+    } : {
+        url: '/api/books/paginated',
+        type: 'GET',
+        data: Object.assign({ search: $('#searchInput').val().trim() }, params)
+    };
+    
+    $.ajax(Object.assign(request, {
+        success: function(response) {
+            // 加载期间列表已被重新加载（搜索、排序等），丢弃过期结果
+            if (version !== listVersion) return;
+            if (response.success) {
+                if (currentView === 'card') {
+                    renderCardView(response.data, true);
+                } else {
+                    renderTableView(response.data, true);
+                }
+                updateBatchActions();
+                nextCursor = response.pagination.next_cursor;
+                loadingMore = false;
+                updateScrollSentinel();
+            } else {
+                showToast('加载更多图书失败', 'error');
+            }
+        },
+        error: function() {
+            showToast('加载更多图书失败', 'error');
+        },
+        complete: function() {
+            loadingMore = false;
+        }
+    }));
+}
+
 // 跳转页面
 function goToPage(page) {
     currentPage = page;
@@ -493,7 +593,6 @@ function deleteBookRequest(bookId) {
                 // 重新加载数据
                 loadBooks();
                 loadStatistics();
-                loadCharts();
             } else {
                 showToast('删除失败: ' + response.message, 'error');
             }
@@ -600,7 +699,6 @@ function batchDelete() {
                 // 重新加载数据
                 loadBooks();
                 loadStatistics();
-                loadCharts();
                 updateBatchActions();
             } else {
                 showToast('批量删除失败: ' + response.message, 'error');
@@ -629,6 +727,37 @@ function toggleAdvancedFilter() {
     }
 }
 
+// 输入时按前缀获取联想（只取前10个，不下载完整的出版社/作者列表）
+function bindFilterSuggest(inputSelector, listSelector, field) {
+    let suggestTimeout;
+    let lastPrefix = null;
+    $(inputSelector).on('input', function() {
+        clearTimeout(suggestTimeout);
+        const prefix = $(this).val().trim();
+        suggestTimeout = setTimeout(() => {
+            if (prefix === lastPrefix) return;
+            lastPrefix = prefix;
+            const list = $(listSelector);
+            if (!prefix) {
+                list.empty();
+                return;
+            }
+            $.ajax({
+                url: '/api/filter/suggest',
+                type: 'GET',
+                data: { field: field, q: prefix, limit: 10 },
+                success: function(response) {
+                    if (!response.success || prefix !== lastPrefix) return;
+                    list.empty();
+                    response.data.forEach(item => {
+                        list.append($('<option>').attr('value', item.value).text(`${item.count} 本`));
+                    });
+                }
+            });
+        }, 250);
+    });
+}
+
 function applyAdvancedFilter() {
     const filters = {};
     
@@ -696,7 +825,7 @@ function loadFilteredBooks(filters) {
         success: function(response) {
             if (response.success) {
                 renderBooks(response.data);
-                renderPagination(response.pagination);
+                updatePaging(response.pagination);
                 showToast(`找到 ${response.pagination.total} 本图书`, 'success');
             } else {
                 showToast('筛选失败: ' + response.message, 'error');
@@ -916,6 +1045,9 @@ function previewCSV(file) {
     }
 }
 
+let importJobId = null;
+let importPollTimer = null;
+
 function importCSV() {
     const fileInput = document.getElementById('csvFile');
     const file = fileInput.files[0];
@@ -939,43 +1071,133 @@ function importCSV() {
         contentType: false,
         success: function(response) {
             if (response.success) {
-                const result = response.data;
-                let resultHtml = `
-                    <div class="alert alert-success">
-                        <h6><i class="bi bi-check-circle"></i> 导入完成</h6>
-                        <p>成功导入: <strong>${result.success_count}</strong> 本图书</p>
-                        ${result.error_count > 0 ? `<p>失败: <strong>${result.error_count}</strong> 条记录</p>` : ''}
-                    </div>
-                `;
-                
-                if (result.errors && result.errors.length > 0) {
-                    resultHtml += '<div class="alert alert-warning"><h6>错误详情：</h6><ul class="mb-0">';
-                    result.errors.slice(0, 10).forEach(error => {
-                        resultHtml += `<li>${error}</li>`;
-                    });
-                    if (result.errors.length > 10) {
-                        resultHtml += `<li>...还有 ${result.errors.length - 10} 个错误</li>`;
-                    }
-                    resultHtml += '</ul></div>';
-                }
-                
-                $('#importResult').html(resultHtml).show();
-                showToast(response.message, 'success');
-                
-                // 刷新列表
-                setTimeout(() => {
-                    location.reload();
-                }, 2000);
+                // 导入在后台执行，轮询任务进度
+                clearTimeout(importPollTimer);
+                importJobId = response.data.job_id;
+                renderImportProgress(response.data);
+                pollImportJob();
             } else {
                 showToast('导入失败: ' + response.message, 'error');
-                importBtn.prop('disabled', false).html('<i class="bi bi-upload"></i> 开始导入');
+                resetImportButton();
             }
         },
         error: function(xhr) {
             const response = xhr.responseJSON || {};
             showToast('导入失败: ' + (response.message || '服务器错误'), 'error');
-            importBtn.prop('disabled', false).html('<i class="bi bi-upload"></i> 开始导入');
+            resetImportButton();
         }
     });
 }
 
+function pollImportJob() {
+    if (!importJobId) return;
+    
+    $.ajax({
+        url: `/api/import/jobs/${importJobId}`,
+        type: 'GET',
+        success: function(response) {
+            const job = response.data;
+            if (job.status === 'pending' || job.status === 'running') {
+                renderImportProgress(job);
+                importPollTimer = setTimeout(pollImportJob, 1000);
+            } else {
+                finishImportJob(job);
+            }
+        },
+        error: function(xhr) {
+            const response = xhr.responseJSON || {};
+            showToast('查询导入进度失败: ' + (response.message || '服务器错误'), 'error');
+            importJobId = null;
+            resetImportButton();
+        }
+    });
+}
+
+function cancelImportJob() {
+    if (!importJobId) return;
+    
+    $('#cancelImportBtn').prop('disabled', true).text('正在取消...');
+    $.ajax({
+        url: `/api/import/jobs/${importJobId}/cancel`,
+        type: 'POST',
+        error: function(xhr) {
+            const response = xhr.responseJSON || {};
+            showToast('取消失败: ' + (response.message || '服务器错误'), 'error');
+        }
+    });
+}
+
+function renderImportProgress(job) {
+    const progress = job.progress || {};
+    const speed = progress.rows_per_second ? `，${progress.rows_per_second} 行/秒` : '';
+    $('#importResult').html(`
+        <div class="alert alert-info">
+            <h6><span class="spinner-border spinner-border-sm me-2"></span>${job.status === 'pending' ? '排队中...' : '正在导入...'}</h6>
+            <p class="mb-1">已解析: <strong>${progress.rows_parsed || 0}</strong> 行，
+               成功: <strong>${progress.inserted || 0}</strong>，
+               失败: <strong>${progress.failed || 0}</strong>${speed}</p>
+            <p class="mb-2 text-muted small">已用时 ${job.elapsed} 秒</p>
+            <button type="button" class="btn btn-sm btn-outline-danger" id="cancelImportBtn"
+                    onclick="cancelImportJob()" ${job.cancel_requested ? 'disabled' : ''}>
+                ${job.cancel_requested ? '正在取消...' : '取消导入'}
+            </button>
+        </div>
+    `).show();
+}
+
+function finishImportJob(job) {
+    importJobId = null;
+    
+    if (job.status === 'failed') {
+        $('#importResult').hide();
+        showToast('导入失败: ' + job.message, 'error');
+        resetImportButton();
+        return;
+    }
+    
+    const result = job.result || {};
+    if (!result.total_rows && job.status === 'completed') {
+        showImportErrors('<div class="alert alert-warning"><h6><i class="bi bi-exclamation-triangle"></i> 没有有效数据</h6></div>', result);
+        showToast('导入失败: 没有有效数据', 'error');
+        resetImportButton();
+        return;
+    }
+    
+    const cancelled = job.status === 'cancelled';
+    let resultHtml = `
+        <div class="alert ${cancelled ? 'alert-warning' : 'alert-success'}">
+            <h6><i class="bi ${cancelled ? 'bi-exclamation-circle' : 'bi-check-circle'}"></i> ${cancelled ? '导入已取消（已导入的数据保留）' : '导入完成'}</h6>
+            <p>成功导入: <strong>${result.success_count || 0}</strong> 本图书</p>
+            ${result.error_count > 0 ? `<p>失败: <strong>${result.error_count}</strong> 条记录</p>` : ''}
+            ${result.rows_per_second ? `<p class="mb-0 text-muted small">耗时 ${result.elapsed} 秒，${result.rows_per_second} 行/秒</p>` : ''}
+        </div>
+    `;
+    showImportErrors(resultHtml, result);
+    showToast(cancelled ? '导入已取消' : `成功导入 ${result.success_count} 本图书`, cancelled ? 'warning' : 'success');
+    
+    // 刷新列表
+    setTimeout(() => {
+        location.reload();
+    }, 2000);
+}
+
+function showImportErrors(resultHtml, result) {
+    if (result.errors && result.errors.length > 0) {
+        resultHtml += '<div class="alert alert-warning"><h6>错误详情：</h6><ul class="mb-0">';
+        result.errors.slice(0, 10).forEach(error => {
+            resultHtml += `<li>${error}</li>`;
+        });
+        // 服务端只返回部分错误信息，总数以计数为准
+        const totalErrors = Math.max(result.errors.length, (result.error_count || 0) + (result.parse_error_count || 0));
+        if (totalErrors > 10) {
+            resultHtml += `<li>...还有 ${totalErrors - 10} 个错误</li>`;
+        }
+        resultHtml += '</ul></div>';
+    }
+    $('#importResult').html(resultHtml).show();
+}
+
+function resetImportButton() {
+    $('#importBtn').prop('disabled', false).html('<i class="bi bi-upload"></i> 开始导入');
+}
+
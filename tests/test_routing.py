@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+"""
+读写分离测试：主库和两个只读副本都是 SQLite 数据库文件，各放入不同数量的图书，
+由 get_books_count() 的结果判断读取落在哪个库上。
+
+    python -m pytest tests
+    python -m unittest discover tests
+"""
+
+import contextvars
+import copy
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from config import DB_CONFIG
+from models.db import BookDB, DatabaseError
+
+# 各库中的图书数量（用于识别读取落在哪个库）
+PRIMARY_BOOKS = 3
+REPLICA_BOOKS = {'r1': 1, 'r2': 2}
+
+
+def _config(path, replicas=(), **routing):
+    config = copy.deepcopy(DB_CONFIG)
+    config['backend'] = 'sqlite'
+    config['sqlite'] = dict(config.get('sqlite', {}), path=path, fts=False)
+    config['pool'] = dict(config.get('pool', {}), min_size=0, max_size=2, timeout=1)
+    config['search'] = {'engine': 'like'}
+    config['statistics'] = {'incremental': False, 'cache_ttl': 0}
+    config['related'] = {'engine': 'sql'}
+    config['filter_options'] = {'engine': 'sql'}
+    config['replicas'] = list(replicas)
+    config['routing'] = dict({'read_your_writes': 5, 'failure_threshold': 2, 'retry_interval': 30}, **routing)
+    return config
+
+
+def _book(book_id):
+    return {
+        'book_id': book_id,
+        'book_name': f'测试图书{book_id}',
+        'book_isbn': f'978-{book_id}',
+        'book_author': '测试作者',
+        'book_publisher': '测试出版社',
+        'book_price': 10.0,
+        'interview_times': 0,
+    }
+
+
+def _fill(path, count):
+    db = BookDB(_config(path))
+    for i in range(count):
+        db.create_book(_book(f'T{i:07d}'))
+    db.close_connections()
+
+
+def _in_new_context(func, *args):
+    """在新的上下文中执行（相当于一次新的请求，没有之前写入留下的主库固定）"""
+    return contextvars.Context().run(func, *args)
+
+
+class ReplicaRoutingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='jy_routing_')
+        self.primary = os.path.join(self.directory, 'primary.db')
+        self.replicas = {name: os.path.join(self.directory, f'{name}.db') for name in REPLICA_BOOKS}
+        _fill(self.primary, PRIMARY_BOOKS)
+        for name, count in REPLICA_BOOKS.items():
+            _fill(self.replicas[name], count)
+        random.seed(20240601)
+    
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+    
+    def _db(self, replicas=None, **routing):
+        if replicas is None:
+            replicas = [{'name': name, 'path': path} for name, path in self.replicas.items()]
+        db = BookDB(_config(self.primary, replicas, **routing))
+        self.addCleanup(db.close_connections)
+        return db
+    
+    def _read(self, db):
+        """新请求中读取一次，返回服务该读取的库（'primary'、'r1' 或 'r2'）"""
+        count = _in_new_context(db.get_books_count)
+        if count == PRIMARY_BOOKS:
+            return 'primary'
+        return {value: name for name, value in REPLICA_BOOKS.items()}[count]
+    
+    def _replica(self, db, name):
+        return next(replica for replica in db.router.replicas if replica.name == name)
+    
+    def test_reads_spread_over_healthy_replicas(self):
+        db = self._db()
+        served = [self._read(db) for _ in range(40)]
+        self.assertNotIn('primary', served)
+        self.assertGreater(served.count('r1'), 0)
+        self.assertGreater(served.count('r2'), 0)
+        status = db.get_replica_status()
+        self.assertEqual(sum(replica['reads'] for replica in status['replicas']), 40)
+    
+    def test_selection_follows_weight(self):
+        db = self._db([
+            {'name': 'r1', 'path': self.replicas['r1'], 'weight': 10},
+            {'name': 'r2', 'path': self.replicas['r2'], 'weight': 0.1},
+        ])
+        served = [self._read(db) for _ in range(100)]
+        self.assertGreater(served.count('r1'), served.count('r2') * 5)
+    
+    def test_replica_with_all_connections_in_use_is_skipped(self):
+        db = self._db()
+        pool = self._replica(db, 'r1').pool
+        held = [pool.acquire() for _ in range(pool.stats()['max_size'])]
+        try:
+            served = {self._read(db) for _ in range(20)}
+        finally:
+            for conn in held:
+                conn.close()
+        self.assertEqual(served, {'r2'})
+    
+    def test_writes_pin_reads_to_primary(self):
+        db = self._db()
+        
+        def write_then_read():
+            db.create_book(_book('W0000001'))
+            return db.get_books_count()
+        
+        self.assertEqual(_in_new_context(write_then_read), PRIMARY_BOOKS + 1)
+        # 没有写入的新请求仍读副本
+        self.assertNotEqual(self._read(db), 'primary')
+    
+    def test_primary_until_cookie_pins_later_requests(self):
+        db = self._db()
+        
+        def read_with_cookie(until):
+            token = db.router.pin_primary(until)
+            try:
+                return db.get_books_count()
+            finally:
+                db.router.reset(token)
+        
+        self.assertEqual(_in_new_context(read_with_cookie, time.time() + 5), PRIMARY_BOOKS)
+        self.assertNotEqual(_in_new_context(read_with_cookie, time.time() - 1), PRIMARY_BOOKS)
+        self.assertEqual(db.get_replica_status()['primary_reads'], 1)
+    
+    def test_failing_replica_is_ejected_after_threshold(self):
+        missing = os.path.join(self.directory, 'missing', 'r3.db')
+        db = self._db([{'name': 'r3', 'path': missing}, {'name': 'r2', 'path': self.replicas['r2']}],
+                      failure_threshold=2, retry_interval=30)
+        r3 = self._replica(db, 'r3')
+        for _ in range(30):
+            self.assertEqual(self._read(db), 'r2')
+            if not r3.healthy:
+                break
+        self.assertFalse(r3.healthy)
+        self.assertEqual(r3.errors, 2)
+        # 暂停期间不再尝试连接
+        for _ in range(10):
+            self.assertEqual(self._read(db), 'r2')
+        self.assertEqual(r3.errors, 2)
+    
+    def test_ejected_replica_recovers_after_retry_interval(self):
+        directory = os.path.join(self.directory, 'later')
+        path = os.path.join(directory, 'r3.db')
+        db = self._db([{'name': 'r3', 'path': path}], failure_threshold=1, retry_interval=0.2)
+        r3 = self._replica(db, 'r3')
+        self.assertEqual(self._read(db), 'primary')
+        self.assertFalse(r3.healthy)
+        
+        os.makedirs(directory)
+        shutil.copy(self.replicas['r1'], path)
+        self.assertEqual(self._read(db), 'primary')
+        time.sleep(0.25)
+        self.assertEqual(self._read(db), 'r1')
+        self.assertTrue(r3.healthy)
+        self.assertEqual(r3.failures, 0)
+    
+    def test_falls_back_to_primary_when_all_replicas_down(self):
+        db = self._db([
+            {'name': 'r3', 'path': os.path.join(self.directory, 'missing', 'r3.db')},
+            {'name': 'r4', 'path': os.path.join(self.directory, 'missing', 'r4.db')},
+        ], failure_threshold=1)
+        served = [self._read(db) for _ in range(5)]
+        self.assertEqual(served, ['primary'] * 5)
+        status = db.get_replica_status()
+        self.assertTrue(all(not replica['healthy'] for replica in status['replicas']))
+        self.assertEqual(status['fallbacks'], 5)
+    
+    def test_query_error_on_replica_is_retried_on_primary(self):
+        db = self._db([{'name': 'r1', 'path': self.replicas['r1']}], failure_threshold=2)
+        self.assertEqual(self._read(db), 'r1')
+        # 连接已建立后副本出错：查询中途抛出 OperationalError
+        with sqlite3.connect(self.replicas['r1']) as conn:
+            conn.execute('DROP TABLE book')
+        r1 = self._replica(db, 'r1')
+        
+        self.assertEqual(self._read(db), 'primary')
+        self.assertEqual(r1.failures, 1)
+        self.assertEqual(self._read(db), 'primary')
+        self.assertFalse(r1.healthy)
+        self.assertEqual(db.get_replica_status()['failovers'], 2)
+        # 暂停使用后直接读主库，不再经过故障转移
+        self.assertEqual(self._read(db), 'primary')
+        self.assertEqual(db.get_replica_status()['failovers'], 2)
+    
+    def test_primary_errors_are_not_retried(self):
+        db = self._db()
+        self.assertEqual(db.get_all_books(read_only=False)[0]['book_id'].rstrip(), 'T0000000')
+        with sqlite3.connect(self.primary) as conn:
+            conn.execute('DROP TABLE book')
+        
+        def read_primary():
+            db.router.record_write()
+            return db.get_books_count()
+        
+        with self.assertRaises(DatabaseError):
+            _in_new_context(read_primary)
+        self.assertEqual(db.get_replica_status()['failovers'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()